@@ -0,0 +1,89 @@
+"""Benchmark per-file conversion overhead for small text files.
+
+Converts a batch of small txt/md/csv files, where converter setup rather than
+the conversion itself dominates, in four ways:
+
+- ``fresh``: a new ``MarkItDown()`` per file (the previous behaviour)
+- ``shared``: the reused converter of ``file_helper.process_file``
+- ``pool-cold``: a new conversion pool without preloading, startup included
+- ``pool-warm``: a preloaded conversion pool that is already running
+
+Usage (from the service directory):
+    python -m benchmarks.conversion_overhead [--files 200] [--workers 2]
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from markitdown import MarkItDown
+
+from src.utils.conversion_pool import ConversionPool
+from src.utils.file_helper import process_file
+
+
+def build_files(root: Path, num_files: int) -> list:
+    files = []
+    for i in range(num_files):
+        ext = ("txt", "md", "csv")[i % 3]
+        path = root / f"note_{i:04d}.{ext}"
+        if ext == "csv":
+            rows = [f"{j},item {j},{j * 1.5}" for j in range(20)]
+            path.write_text("id,name,price\n" + "\n".join(rows), encoding="utf-8")
+        else:
+            path.write_text(f"# Note {i}\n\n" + "Some short text. " * 30, encoding="utf-8")
+        files.append(path)
+    return files
+
+
+def run_pool(pool: ConversionPool, files: list) -> None:
+    for path, _, error in pool.convert((path, False) for path in files):
+        if error is not None:
+            raise RuntimeError(f"{path.name}: {error}")
+
+
+def report(label: str, elapsed: float, num_files: int) -> None:
+    print(
+        f"{label:<10} files={num_files} total={elapsed:7.2f}s "
+        f"per_file={elapsed / num_files * 1000:7.2f}ms"
+    )
+
+
+def main(num_files: int, workers: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        files = build_files(Path(tmp), num_files)
+
+        start = time.perf_counter()
+        for path in files:
+            MarkItDown().convert(str(path))
+        report("fresh", time.perf_counter() - start, num_files)
+
+        process_file(str(files[0]))
+        start = time.perf_counter()
+        for path in files:
+            process_file(str(path))
+        report("shared", time.perf_counter() - start, num_files)
+
+        pool = ConversionPool(workers=workers, preload=False)
+        start = time.perf_counter()
+        run_pool(pool, files)
+        report("pool-cold", time.perf_counter() - start, num_files)
+        pool.close()
+
+        pool = ConversionPool(workers=workers, preload=True)
+        start = time.perf_counter()
+        pool._get_executor()
+        print(f"{'':<10} pool startup with preload: {time.perf_counter() - start:.2f}s")
+        start = time.perf_counter()
+        run_pool(pool, files)
+        report("pool-warm", time.perf_counter() - start, num_files)
+        pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=2)
+    cli_args = parser.parse_args()
+    main(cli_args.files, cli_args.workers)
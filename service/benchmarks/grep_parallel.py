@@ -0,0 +1,93 @@
+"""Benchmark multi-file grep: sequential vs. worker pool, cold vs. warm no-match memo.
+
+Builds a synthetic corpus of markdown files in a temporary directory and runs
+the grep file scan (the path taken when the search index cannot narrow the
+pattern) with different worker counts and pool types.
+
+Usage (from the service directory):
+    python -m benchmarks.grep_parallel [--files 10000] [--workers 8]
+"""
+
+import argparse
+import random
+import re
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from src.utils import tools
+
+WORDS = (
+    "helix agent search index markdown upload transcript repository summary "
+    "kubernetes python latency cache token stream vector chunk document"
+).split()
+
+PATTERNS = {
+    # Rare: only a handful of files match, so every file must be scanned
+    "rare": r"\b\d{4}-\d{2}-\d{2}\b",
+    # Common: matches almost everywhere, so early termination dominates
+    "common": r"lat\w+ \w+",
+}
+
+
+def build_corpus(root: Path, num_files: int) -> list:
+    rng = random.Random(0)
+    files = []
+    for i in range(num_files):
+        lines = [" ".join(rng.choices(WORDS, k=12)) for _ in range(60)]
+        if i % 1000 == 0:
+            lines.append(f"released on 2024-0{1 + i % 9}-15")
+        path = root / f"doc_{i:05d}.md"
+        path.write_text("\n".join(lines), encoding="utf-8")
+        files.append((path, path.name))
+    return files
+
+
+def run(files: list, pattern: str, workers: int, warm_memo: bool, repeats: int) -> list:
+    regex = re.compile(pattern)
+    samples = []
+    for _ in range(repeats):
+        if not warm_memo:
+            tools._no_match_memo.clear()
+        start = time.perf_counter()
+        tools._search_files(files, regex, 100, workers)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main(num_files: int, workers: int, repeats: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        files = build_corpus(Path(tmp), num_files)
+        print(f"corpus: {num_files} files")
+        for name, pattern in PATTERNS.items():
+            configs = [
+                ("sequential", "thread", 1, False),
+                (f"{workers} threads", "thread", workers, False),
+                (f"{workers} processes", "process", workers, False),
+                (f"{workers} processes+memo", "process", workers, True),
+            ]
+            for label, pool, count, warm in configs:
+                if tools._grep_executor is not None:
+                    tools._grep_executor.shutdown()
+                tools.GREP_POOL = pool
+                tools.GREP_WORKERS = count
+                tools._grep_executor = None
+                if warm:
+                    # Prime the memo once; only later runs benefit from it
+                    run(files, pattern, count, True, 1)
+                samples = run(files, pattern, count, warm, repeats)
+                print(
+                    f"{name:<7} {label:<22} "
+                    f"mean={statistics.mean(samples) * 1000:9.1f}ms "
+                    f"min={min(samples) * 1000:9.1f}ms"
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=tools.GREP_WORKERS)
+    parser.add_argument("--repeats", type=int, default=3)
+    cli_args = parser.parse_args()
+    main(cli_args.files, max(2, cli_args.workers), cli_args.repeats)
@@ -0,0 +1,54 @@
+"""Benchmark process status updates: direct Firestore calls vs. the write-behind buffer.
+
+Replays the status traffic of one ingestion batch (a status message and a
+rename per file, then completion) against the in-memory process store, with a
+simulated round-trip latency, once calling the store directly and once through
+``StatusBuffer``.
+
+Usage (from the service directory):
+    python -m benchmarks.status_updates [--files 200] [--latency 0.02]
+"""
+
+import argparse
+import time
+
+from src.utils.db import InMemoryProcessStore
+from src.utils.status_buffer import StatusBuffer
+
+
+def replay(db, process_id: str, names: list) -> None:
+    db.create_process_document(process_id, names, "bench")
+    for name in names:
+        db.update_process_document(process_id, "processing", f"Analyzing the file {name}")
+        db.update_tuple_with_new_name(process_id, name, f"docs/{name}.meta")
+    db.finish_process(process_id)
+
+
+def main(num_files: int, latency: float) -> None:
+    names = [f"file_{i:04d}.pdf" for i in range(num_files)]
+    results = {}
+    for label in ("direct", "buffered"):
+        store = InMemoryProcessStore(latency=latency)
+        db = StatusBuffer(store) if label == "buffered" else store
+        start = time.perf_counter()
+        replay(db, "bench", names)
+        elapsed = time.perf_counter() - start
+        if label == "buffered":
+            db.close()
+        results[label] = store.documents["bench"]
+        print(
+            f"{label:<9} files={num_files} round_trips={store.round_trips:5d} "
+            f"time={elapsed * 1000:9.1f}ms"
+        )
+    same = all(
+        results["direct"][key] == results["buffered"][key] for key in ("files", "status")
+    )
+    print(f"final documents match: {same}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.02)
+    cli_args = parser.parse_args()
+    main(cli_args.files, cli_args.latency)
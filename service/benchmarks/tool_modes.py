@@ -0,0 +1,91 @@
+"""Compare per-tool-call latency of the subprocess and in-process tool modes.
+
+Creates a throwaway user under uploads/ with a synthetic corpus, runs the same
+sequence of tool calls through both executors and prints latency percentiles.
+
+Usage (from the service directory):
+    python -m benchmarks.tool_modes [--files 200] [--calls 200]
+"""
+
+import argparse
+import asyncio
+import random
+import shutil
+import statistics
+import time
+import uuid
+
+from src.utils import tools
+from src.utils.tool_executor import tool_executor, close_tool_executors
+
+WORDS = (
+    "helix agent search index markdown upload transcript repository summary "
+    "kubernetes python latency cache token stream vector chunk document"
+).split()
+
+
+def build_corpus(user_id: str, num_files: int) -> None:
+    docs_dir = tools.BASE_DIR / user_id / "processed" / "docs"
+    docs_dir.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(0)
+    for i in range(num_files):
+        lines = [" ".join(rng.choices(WORDS, k=12)) for _ in range(200)]
+        (docs_dir / f"doc_{i}.md").write_text("\n".join(lines), encoding="utf-8")
+
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def run_mode(mode: str, user_id: str, calls: list) -> dict:
+    scope = {"user_id": user_id, "subdirectory": "docs"}
+    samples: dict = {}
+    async with tool_executor(mode) as executor:
+        # One warm-up call so index creation and imports are not measured
+        await executor.call_tool("list_file", dict(scope))
+        for name, args in calls:
+            start = time.perf_counter()
+            await executor.call_tool(name, {**args, **scope})
+            samples.setdefault(name, []).append(time.perf_counter() - start)
+    return samples
+
+
+def report(mode: str, samples: dict) -> None:
+    for name, values in sorted(samples.items()):
+        print(
+            f"{mode:<11} {name:<10} n={len(values):<5} "
+            f"mean={statistics.mean(values) * 1000:8.2f}ms "
+            f"p50={percentile(values, 0.5) * 1000:8.2f}ms "
+            f"p95={percentile(values, 0.95) * 1000:8.2f}ms"
+        )
+
+
+async def main(num_files: int, num_calls: int) -> None:
+    user_id = f"_bench_{uuid.uuid4().hex[:8]}"
+    build_corpus(user_id, num_files)
+    rng = random.Random(1)
+    calls = []
+    for _ in range(num_calls):
+        choice = rng.choice(["read_file", "list_file", "grep"])
+        if choice == "read_file":
+            calls.append((choice, {"file_path": f"doc_{rng.randrange(num_files)}.md"}))
+        elif choice == "list_file":
+            calls.append((choice, {}))
+        else:
+            calls.append((choice, {"pattern": rng.choice(WORDS)}))
+
+    try:
+        for mode in ("subprocess", "inprocess"):
+            report(mode, await run_mode(mode, user_id, calls))
+    finally:
+        await close_tool_executors()
+        shutil.rmtree(tools.BASE_DIR / user_id, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--calls", type=int, default=200)
+    cli_args = parser.parse_args()
+    asyncio.run(main(cli_args.files, cli_args.calls))
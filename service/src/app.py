@@ -1,13 +1,40 @@
-from fastapi import FastAPI, UploadFile, File, BackgroundTasks, HTTPException, Depends
-from fastapi.responses import FileResponse
+from fastapi import (
+    FastAPI,
+    UploadFile,
+    File,
+    HTTPException,
+    Depends,
+    Query,
+)
+from fastapi.responses import FileResponse, StreamingResponse
 import os
 import json
+import asyncio
 import uuid
 import logging
-import glob
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Literal, Optional
 from .utils import FirestoreHelper, ProcessHelper, ClerkHelper
-from .utils.agent import helix
+from .utils.ai import get_analysis_cache
+from .utils.catalog import Catalog
+from .utils.content_store import get_content_store
+from .utils.rate_limiter import get_host_scheduler
+from .utils.search_index import SearchIndex
+from .utils.vector_index import VectorIndex
+from .utils.search_cache import (
+    SearchCache,
+    bump_corpus_version,
+    get_corpus_version,
+)
+from .utils.agent import helix_result, helix_stream
+from .utils.tool_executor import start_tool_executors, close_tool_executors
+from .utils.llm import start_llm_clients, close_llm_clients
+from .utils.conversion_pool import close_conversion_pool
+from .utils.url_fetcher import close_url_fetcher
+from .utils.job_queue import get_job_queue
+from .utils.status_buffer import StatusBuffer
+from .utils.job_worker import start_job_workers, notify_job_workers, close_job_workers
 from .schema import (
     ProcessUrlRequest,
     DownloadFileRequest,
@@ -26,9 +53,26 @@ def get_uploads_base_dir() -> Path:
     return base_dir / "uploads"
 
 
-app = FastAPI()
-db = FirestoreHelper()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the tool executors so the first searches skip process startup
+    await start_tool_executors()
+    start_llm_clients()
+    start_job_workers(db)
+    yield
+    await close_job_workers()
+    db.close()
+    await close_tool_executors()
+    await close_llm_clients()
+    close_conversion_pool()
+    await close_url_fetcher()
+
+
+app = FastAPI(lifespan=lifespan)
+# Status updates from the embedded workers are coalesced and batched
+db = StatusBuffer(FirestoreHelper())
 clerk = ClerkHelper()
+search_cache = SearchCache()
 
 
 origins = ["*"]
@@ -54,9 +98,19 @@ def health():
     return {"health": "ok"}
 
 
+@app.get("/metrics")
+def metrics():
+    return {
+        "search_cache": search_cache.stats(),
+        "analysis_cache": get_analysis_cache().stats(),
+        "content_store": get_content_store().stats(),
+        "job_queue": get_job_queue().stats(),
+        "rate_limits": get_host_scheduler().stats(),
+    }
+
+
 @app.post("/upload")
 async def upload(
-    background_tasks: BackgroundTasks,
     files: list[UploadFile] = File(..., max_items=10),
     current_user: str = Depends(clerk.get_clerk_payload),
 ):
@@ -74,20 +128,21 @@ async def upload(
         extra={"process_id": process_id},
     )
 
-    process_helper = ProcessHelper(db)
-    background_tasks.add_task(
-        process_helper.process_files_background, process_id, current_user, files
+    # Uploads do not outlive the request, so they are saved before queuing
+    items = await asyncio.to_thread(
+        ProcessHelper(db).save_uploads, process_id, current_user, files
     )
-    logger.info(
-        f"Background task scheduled {process_id}", extra={"process_id": process_id}
+    await asyncio.to_thread(
+        get_job_queue().enqueue, process_id, "files", current_user, items
     )
+    notify_job_workers()
+    logger.info(f"Ingestion job queued {process_id}", extra={"process_id": process_id})
 
     return {"message": "saved!", "process_id": process_id}
 
 
 @app.post("/process-urls")
 async def process_urls(
-    background_tasks: BackgroundTasks,
     request: ProcessUrlRequest,
     current_user: str = Depends(clerk.get_clerk_payload),
 ):
@@ -103,12 +158,16 @@ async def process_urls(
         extra={"process_id": process_id},
     )
 
-    process_helper = ProcessHelper(db)
-    background_tasks.add_task(
-        process_helper.process_links_background, process_id, current_user, request.urls
+    await asyncio.to_thread(
+        get_job_queue().enqueue,
+        process_id,
+        "links",
+        current_user,
+        [{"url": url} for url in request.urls],
     )
+    notify_job_workers()
     logger.info(
-        f"Background URL processing scheduled {process_id}",
+        f"URL ingestion job queued {process_id}",
         extra={"process_id": process_id},
     )
 
@@ -117,7 +176,6 @@ async def process_urls(
 
 @app.post("/upload-single-link")
 async def upload_single_link(
-    background_tasks: BackgroundTasks,
     request: SingleLinkUploadRequest,
 ):
     """
@@ -141,15 +199,16 @@ async def upload_single_link(
         extra={"process_id": process_id},
     )
 
-    process_helper = ProcessHelper(db)
-    background_tasks.add_task(
-        process_helper.process_links_background,
+    await asyncio.to_thread(
+        get_job_queue().enqueue,
         process_id,
+        "links",
         request.username,
-        [request.link],
+        [{"url": request.link}],
     )
+    notify_job_workers()
     logger.info(
-        f"Background single link processing scheduled {process_id}",
+        f"Single link ingestion job queued {process_id}",
         extra={"process_id": process_id},
     )
 
@@ -163,32 +222,35 @@ def get_recent_processes(current_user: str = Depends(clerk.get_clerk_payload)):
 
 
 @app.get("/files/processed")
-def get_processed_files(current_user: str = Depends(clerk.get_clerk_payload)):
-    base_dir = get_uploads_base_dir() / current_user / "processed"
+def get_processed_files(
+    category: Optional[Literal["docs", "links", "media"]] = None,
+    tag: Optional[str] = None,
+    limit: Optional[int] = Query(default=None, ge=1, le=500),
+    cursor: Optional[int] = None,
+    current_user: str = Depends(clerk.get_clerk_payload),
+):
+    """
+    List the user's processed files, newest first, grouped by category.
+    Optional query parameters:
+    - category: only list this category
+    - tag: only list files carrying this tag
+    - limit: page size; the response then includes `next_cursor`
+    - cursor: `next_cursor` from the previous page
+    """
+    entries, next_cursor = Catalog(get_uploads_base_dir() / current_user).list_entries(
+        category=category, tag=tag, limit=limit, cursor=cursor
+    )
 
     categories = {
         "docs": [],
         "links": [],
         "media": [],
     }
+    for entry in entries:
+        categories[entry["category"]].append(entry)
 
-    for category in categories.keys():
-        category_dir = base_dir / category
-        if not category_dir.is_dir():
-            continue
-        try:
-            for entry in category_dir.iterdir():
-                if entry.name.endswith(".meta"):
-                    try:
-                        with open(entry, "r") as f:
-                            data = json.load(f)
-                            categories[category].append(data)
-                    except Exception:
-                        # Skip unreadable/bad JSON meta files
-                        continue
-        except FileNotFoundError:
-            continue
-
+    if limit is not None:
+        categories["next_cursor"] = next_cursor
     return categories
 
 
@@ -200,65 +262,28 @@ async def download_file(
     Download a file by name and type.
     Request body should contain:
     - file_name: name of the file without extension
-    - file_type: either "docs" or "media"
+    - file_type: either "docs" or "media"; other values are rejected by
+      request validation with 422
     """
     uploads_base_dir = get_uploads_base_dir() / current_user
 
-    # Check metadata in processed directory
-    processed_dir = uploads_base_dir / "processed"
-    # Get actual files from original directory
-    original_dir = uploads_base_dir / "original"
-
-    # Validate file type
-    if request.file_type not in ["docs", "media"]:
-        raise HTTPException(
-            status_code=400, detail="file_type must be either 'docs' or 'media'"
-        )
-
-    # Check if metadata exists in processed directory
-    processed_search_dir = processed_dir / request.file_type
-    if not processed_search_dir.is_dir():
-        raise HTTPException(
-            status_code=404, detail=f"No {request.file_type} directory found"
-        )
-
-    # Look for metadata file to confirm the file exists
-    meta_pattern = processed_search_dir / f"{request.file_name}.meta"
-    if not meta_pattern.exists():
-        raise HTTPException(
-            status_code=404,
-            detail=f"No file found with name '{request.file_name}' in {request.file_type} directory",
-        )
-
-    # Now look for the actual file in original directory
-    original_search_dir = original_dir / request.file_type
-    if not original_search_dir.is_dir():
-        raise HTTPException(
-            status_code=404,
-            detail=f"No {request.file_type} directory found in original folder",
-        )
-
-    # Search for files with the given name (without extension) in original directory
-    pattern = str(original_search_dir / f"{request.file_name}.*")
-    matching_files = glob.glob(pattern)
-
-    if not matching_files:
+    entry = Catalog(uploads_base_dir).get(request.file_type, request.file_name)
+    file_path = (
+        uploads_base_dir / entry["original_path"]
+        if entry and entry["original_path"]
+        else None
+    )
+    if file_path is None or not file_path.is_file():
         raise HTTPException(
             status_code=404,
             detail=f"No file found with name '{request.file_name}' in {request.file_type} directory",
         )
 
-    # If multiple files match, take the first one
-    file_path = matching_files[0]
-
-    # Get the original filename for the download
-    original_filename = Path(file_path).name
-
     logger.info(f"Downloading file: {file_path}")
 
     return FileResponse(
-        path=file_path,
-        filename=original_filename,
+        path=str(file_path),
+        filename=file_path.name,
         media_type="application/octet-stream",
     )
 
@@ -279,85 +304,12 @@ async def delete_file(
             f"Delete file request received for user: {current_user}, file: {request.file_name}"
         )
 
-        # Get base directories
         base_dir = get_uploads_base_dir() / current_user
         processed_dir = base_dir / "processed"
-        original_dir = base_dir / "original"
+        catalog = Catalog(base_dir)
 
-        logger.info(f"Base directory: {base_dir}")
-        logger.info(f"Processed directory exists: {processed_dir.exists()}")
-        logger.info(f"Original directory exists: {original_dir.exists()}")
-
-        deleted_files = []
-        found_any = False
-
-        # Categories to search in
-        categories = ["docs", "media", "links"]
-        logger.info(f"Searching in categories: {categories}")
-
-        # Search in processed directories for .meta and .md files
-        for category in categories:
-            category_processed_dir = processed_dir / category
-            logger.info(
-                f"Checking processed category '{category}': {category_processed_dir}"
-            )
-            logger.info(f"Category directory exists: {category_processed_dir.exists()}")
-
-            if category_processed_dir.exists():
-                # Look for .meta file
-                meta_file = category_processed_dir / f"{request.file_name}.meta"
-                logger.info(f"Looking for meta file: {meta_file}")
-                logger.info(f"Meta file exists: {meta_file.exists()}")
-
-                if meta_file.exists():
-                    meta_file.unlink()
-                    deleted_files.append(str(meta_file))
-                    found_any = True
-                    logger.info(f"Deleted meta file: {meta_file}")
-
-                # Look for .md file
-                md_file = category_processed_dir / f"{request.file_name}.md"
-                logger.info(f"Looking for markdown file: {md_file}")
-                logger.info(f"Markdown file exists: {md_file.exists()}")
-
-                if md_file.exists():
-                    md_file.unlink()
-                    deleted_files.append(str(md_file))
-                    found_any = True
-                    logger.info(f"Deleted markdown file: {md_file}")
-
-        # Search in original directories for the actual file
-        for category in categories:
-            category_original_dir = original_dir / category
-            logger.info(
-                f"Checking original category '{category}': {category_original_dir}"
-            )
-            logger.info(
-                f"Original category directory exists: {category_original_dir.exists()}"
-            )
-
-            if category_original_dir.exists():
-                # Look for files with the given name and any extension
-                pattern = f"{request.file_name}.*"
-                logger.info(
-                    f"Searching for pattern: {pattern} in {category_original_dir}"
-                )
-                matching_files = list(category_original_dir.glob(pattern))
-                logger.info(
-                    f"Found {len(matching_files)} matching files: {matching_files}"
-                )
-
-                for file_path in matching_files:
-                    logger.info(f"Deleting original file: {file_path}")
-                    file_path.unlink()
-                    deleted_files.append(str(file_path))
-                    found_any = True
-                    logger.info(f"Successfully deleted original file: {file_path}")
-
-        logger.info(f"Total files found and deleted: {len(deleted_files)}")
-        logger.info(f"Found any files: {found_any}")
-
-        if not found_any:
+        entries = catalog.find(request.file_name)
+        if not entries:
             logger.warning(
                 f"No files found with name '{request.file_name}' for user '{current_user}'"
             )
@@ -366,10 +318,40 @@ async def delete_file(
                 detail=f"No file found with name '{request.file_name}' for user '{current_user}'",
             )
 
+        deleted_files = []
+        for entry in entries:
+            category = entry["category"]
+            catalog.remove(category, request.file_name)
+
+            paths = [
+                processed_dir / category / f"{request.file_name}.meta",
+                processed_dir / category / f"{request.file_name}.md",
+            ]
+            if entry["original_path"]:
+                paths.append(base_dir / entry["original_path"])
+            for path in paths:
+                if path.exists():
+                    path.unlink()
+                    deleted_files.append(str(path))
+                    logger.info(f"Deleted file: {path}")
+            # Frees the shared markdown blob once no other file links it
+            get_content_store().release(entry["markdown_sha256"])
+
+            try:
+                SearchIndex.for_category(base_dir, category).remove_files(
+                    [f"{request.file_name}.meta", f"{request.file_name}.md"]
+                )
+                VectorIndex.for_category(base_dir, category).remove_files(
+                    [f"{request.file_name}.md"]
+                )
+            except Exception as e:
+                logger.warning(f"Failed to update search indexes: {str(e)}")
+
+        bump_corpus_version(base_dir)
+
         logger.info(
-            f"Successfully deleted {len(deleted_files)} files for user {current_user}"
+            f"Successfully deleted {len(deleted_files)} files for user {current_user}: {deleted_files}"
         )
-        logger.info(f"Deleted files list: {deleted_files}")
 
         return {
             "message": f"Successfully deleted file '{request.file_name}'",
@@ -394,6 +376,9 @@ async def search(
     Search across user's processed files using multi-agent system.
     Request body should contain:
     - query: The search query string
+    - budget (optional): deadline_seconds, max_turns, max_tokens, turn_timeout;
+      agents still running at the deadline are cancelled and the answer is
+      built from the rest
     """
     user_id = request.user_id
     try:
@@ -405,9 +390,91 @@ async def search(
             dir_path.mkdir(parents=True, exist_ok=True)
             logger.info(f"Ensured directory exists: {dir_path}")
 
-        result = await helix(user_id, request.query)
+        cache_key = SearchCache.make_key(
+            user_id,
+            request.query,
+            get_corpus_version(base_dir.parent),
+            request.budget.model_dump() if request.budget else None,
+        )
+        cached = search_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Search cache hit for user: {user_id}")
+            return SearchResponse(query=request.query, result=cached)
+
+        result, failed_agents, truncated_agents, synthesis_failed = (
+            await helix_result(user_id, request.query, budget=request.budget)
+        )
+        # Partial answers (failed, timed out or budget-truncated agents, or
+        # the unsummarized fallback) are not cached
+        if (
+            not result.startswith("Error:")
+            and not failed_agents
+            and not truncated_agents
+            and not synthesis_failed
+        ):
+            search_cache.set(cache_key, result)
 
         return SearchResponse(query=request.query, result=result)
     except Exception as e:
         logger.error(f"Error processing search request for user {user_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/search/stream")
+async def search_stream(
+    request: SearchRequest,
+):
+    """
+    Streaming variant of /search using Server-Sent Events.
+    Emits an `agent` event per agent as it completes, then `token` events with
+    the synthesized answer, and a final `done` (or `error`) event.
+    Request body is the same as /search.
+    """
+    user_id = request.user_id
+    logger.info(f"Streaming search request received from user: {user_id}")
+
+    base_dir = get_uploads_base_dir() / user_id / "processed"
+    for subdirectory in ["links", "docs", "media"]:
+        (base_dir / subdirectory).mkdir(parents=True, exist_ok=True)
+
+    cache_key = SearchCache.make_key(
+        user_id,
+        request.query,
+        get_corpus_version(base_dir.parent),
+        request.budget.model_dump() if request.budget else None,
+    )
+    cached = search_cache.get(cache_key)
+
+    async def event_stream():
+        if cached is not None:
+            logger.info(f"Search cache hit for user: {user_id}")
+            yield f"event: token\ndata: {json.dumps({'text': cached})}\n\n"
+            yield f"event: done\ndata: {json.dumps({'failed_agents': [], 'truncated_agents': [], 'synthesis_failed': False, 'cached': True})}\n\n"
+            return
+
+        tokens = []
+        try:
+            async for event, data in helix_stream(
+                user_id, request.query, budget=request.budget
+            ):
+                if event == "token":
+                    tokens.append(data["text"])
+                elif (
+                    event == "done"
+                    and not data["failed_agents"]
+                    and not data["truncated_agents"]
+                    and not data["synthesis_failed"]
+                ):
+                    search_cache.set(cache_key, "".join(tokens))
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        except Exception as e:
+            logger.error(
+                f"Error streaming search request for user {user_id}: {str(e)}"
+            )
+            yield f"event: error\ndata: {json.dumps({'message': str(e)})}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
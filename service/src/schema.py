@@ -1,5 +1,5 @@
-from typing import List, Literal
-from pydantic import BaseModel
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field
 
 
 class ProcessUrlRequest(BaseModel):
@@ -11,9 +11,20 @@ class DownloadFileRequest(BaseModel):
     file_type: Literal["docs", "media"]
 
 
+class SearchBudget(BaseModel):
+    # Soft deadline: synthesis runs on the agents finished by then
+    deadline_seconds: Optional[float] = Field(default=None, gt=0)
+    # Per-agent limits on model calls and completion tokens
+    max_turns: Optional[int] = Field(default=None, ge=1)
+    max_tokens: Optional[int] = Field(default=None, ge=1)
+    # Per-agent limit on a single model call
+    turn_timeout: Optional[float] = Field(default=None, gt=0)
+
+
 class SearchRequest(BaseModel):
     query: str
     user_id: str
+    budget: Optional[SearchBudget] = None
 
 
 class SearchResponse(BaseModel):
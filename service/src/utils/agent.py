@@ -2,13 +2,14 @@ import json
 import os
 import logging
 import asyncio
-from pathlib import Path
-from openai import OpenAI
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
+from typing import AsyncIterator, Optional
 import mcp.types as mcp_types
 from dotenv import load_dotenv
-from cerebras.cloud.sdk import Cerebras
+
+from ..schema import SearchBudget
+from .llm import get_cerebras_client, get_openrouter_client
+from .router import route_query
+from .tool_executor import tool_executor
 
 load_dotenv()
 
@@ -25,20 +26,82 @@ DOCS_AGENT_PROMPT = os.environ.get("DOCS_AGENT_PROMPT", "")
 MEDIA_AGENT_PROMPT = os.environ.get("MEDIA_AGENT_PROMPT", "")
 SYNTHESIS_AGENT_PROMPT = os.environ.get("SYNTHESIS_AGENT_PROMPT", "")
 
+# Tool calls requested in one model turn run concurrently, at most this many
+# at a time, and each is abandoned after TOOL_CALL_TIMEOUT seconds
+TOOL_CALL_CONCURRENCY = int(os.getenv("TOOL_CALL_CONCURRENCY", "4"))
+TOOL_CALL_TIMEOUT = float(os.getenv("TOOL_CALL_TIMEOUT", "60"))
+
+# Defaults for requests without a budget: model calls per agent and the time
+# allowed for a single model call
+AGENT_MAX_TURNS = int(os.getenv("AGENT_MAX_TURNS", "8"))
+AGENT_TURN_TIMEOUT = float(os.getenv("AGENT_TURN_TIMEOUT", "120"))
+
+# Tool arguments that scope a call to one user's subdirectory. They are filled
+# in by the agent and hidden from the model so it cannot widen its own scope.
+SCOPE_ARGUMENTS = ("user_id", "subdirectory")
+
 
 def mcp_tool_to_openrouter(t: mcp_types.Tool) -> dict:
     """Convert MCP tool definition to OpenRouter/OpenAI function format."""
+    parameters = dict(t.inputSchema or {"type": "object"})
+    if "properties" in parameters:
+        parameters["properties"] = {
+            k: v
+            for k, v in parameters["properties"].items()
+            if k not in SCOPE_ARGUMENTS
+        }
+    if "required" in parameters:
+        parameters["required"] = [
+            k for k in parameters["required"] if k not in SCOPE_ARGUMENTS
+        ]
     return {
         "type": "function",
         "function": {
             "name": t.name,
             "description": t.description or "",
-            "parameters": t.inputSchema or {"type": "object"},
+            "parameters": parameters,
         },
     }
 
 
-async def agent(user_id: str, user_query: str, subdirectory: str, system_prompt: str) -> dict:
+async def _run_tool_call(
+    executor, call, scope: dict, semaphore: asyncio.Semaphore, subdirectory: str
+) -> str:
+    """Execute one model-requested tool call, returning the text for the model.
+
+    Bad arguments and timeouts are reported back to the model as the tool's
+    result so the rest of the turn still completes; other errors propagate.
+    """
+    name = call.function.name
+    try:
+        args = json.loads(call.function.arguments or "{}")
+    except json.JSONDecodeError as e:
+        return f"Error: invalid arguments for tool {name}: {str(e)}"
+
+    async with semaphore:
+        logger.info(f"{subdirectory} agent - Executing tool: {name} with args: {args}")
+        try:
+            payload = await asyncio.wait_for(
+                executor.call_tool(name, {**args, **scope}), timeout=TOOL_CALL_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"{subdirectory} agent - Tool {name} timed out after {TOOL_CALL_TIMEOUT}s")
+            # The server keeps running the call, so it is not handed out again
+            executor.retire()
+            return f"Error: tool {name} timed out after {TOOL_CALL_TIMEOUT:g} seconds"
+
+    logger.info(f"{subdirectory} agent - Tool {name} result: {payload}")
+    return payload
+
+
+async def agent(
+    user_id: str,
+    user_query: str,
+    subdirectory: str,
+    system_prompt: str,
+    budget: Optional[SearchBudget] = None,
+    deadline: Optional[float] = None,
+) -> dict:
     """
     Run a single agent for a specific subdirectory.
     
@@ -47,139 +110,168 @@ async def agent(user_id: str, user_query: str, subdirectory: str, system_prompt:
         user_query: The user's search query
         subdirectory: The subdirectory to search (links/docs/media)
         system_prompt: The system prompt for this specific agent
+        budget: Optional limits on model turns, completion tokens and time per turn
+        deadline: Event loop time by which every model call must have returned
         
     Returns:
-        Dict with agent results: {"subdirectory": str, "result": str, "error": str | None}
+        Dict with agent results: {"subdirectory": str, "result": str, "error": str | None,
+        "truncated": bool}, where `truncated` means the budget cut the agent off
+        before it finished (turn limit reached or answer hit the token limit)
     """
     logger.info(f"Starting {subdirectory} agent for user {user_id}")
-    
+
+    budget = budget or SearchBudget()
+    max_turns = budget.max_turns or AGENT_MAX_TURNS
+    turn_timeout = budget.turn_timeout or AGENT_TURN_TIMEOUT
+    tokens_left = budget.max_tokens
+    turns = 0
+    truncated = False
+    loop = asyncio.get_running_loop()
+
     try:
-        mcp_server_path = Path(__file__).parent / "tools.py"
-        
-        server = StdioServerParameters(
-            command="python",
-            args=[str(mcp_server_path)],
-            env={"USER_ID": user_id, "SUBDIRECTORY": subdirectory}
-        )
-        
-        async with stdio_client(server) as (read, write):
-            async with ClientSession(read, write) as session:
-                await session.initialize()
+        scope = {"user_id": user_id, "subdirectory": subdirectory}
 
-                tools_resp = await session.list_tools()
-                logger.info(f"{subdirectory} agent - Available tools: {[t.name for t in tools_resp.tools]}")
-                tools_for_model = [mcp_tool_to_openrouter(t) for t in tools_resp.tools]
+        async with tool_executor() as executor:
+            logger.info(f"{subdirectory} agent - Available tools: {[t.name for t in executor.tools]}")
+            tools_for_model = [mcp_tool_to_openrouter(t) for t in executor.tools]
 
-                client = OpenAI(
-                    base_url="https://openrouter.ai/api/v1",
-                    api_key=os.environ.get("OPENROUTER_API_KEY")
-                )
+            client = get_openrouter_client()
+
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_query},
+            ]
 
-                messages = [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_query},
-                ]
-                
-                logger.info(f"{subdirectory} agent - Processing query: {user_query}")
-
-                response = client.chat.completions.create(
-                    model=MODEL,
-                    messages=messages,
-                    tools=tools_for_model,
+            async def complete(**kwargs):
+                nonlocal tokens_left, turns, truncated
+                timeout = turn_timeout
+                if deadline is not None:
+                    timeout = min(timeout, deadline - loop.time())
+                if timeout <= 0:
+                    raise asyncio.TimeoutError
+                if tokens_left is not None:
+                    kwargs["max_tokens"] = tokens_left
+                response = await asyncio.wait_for(
+                    client.chat.completions.create(
+                        model=MODEL, messages=messages, **kwargs
+                    ),
+                    timeout=timeout,
                 )
-                
-                msg = response.choices[0].message
-                logger.info(f"{subdirectory} agent - Initial response: {msg.model_dump()}")
-
-                while msg.tool_calls:
-                    logger.info(f"{subdirectory} agent - Tool calls requested: {len(msg.tool_calls)}")
-                    messages.append(msg.model_dump())
-
-                    for call in msg.tool_calls:
-                        name = call.function.name
-                        args = json.loads(call.function.arguments or "{}")
-                        
-                        logger.info(f"{subdirectory} agent - Executing tool: {name} with args: {args}")
-
-                        result = await session.call_tool(name, args)
-
-                        payload = None
-                        if getattr(result, "structuredContent", None):
-                            payload = json.dumps(result.structuredContent)
-                        else:
-                            parts = []
-                            for c in result.content:
-                                if isinstance(c, mcp_types.TextContent):
-                                    parts.append(c.text)
-                            payload = "\n".join(parts) if parts else ""
-                        
-                        logger.info(f"{subdirectory} agent - Tool {name} result: {payload}")
-
-                        messages.append({
-                            "role": "tool",
-                            "tool_call_id": call.id,
-                            "content": payload,
-                        })
-
-                    follow = client.chat.completions.create(
-                        model=MODEL,
-                        messages=messages,
+                turns += 1
+                usage = getattr(response, "usage", None)
+                if tokens_left is not None and usage is not None:
+                    tokens_left -= usage.completion_tokens or 0
+                # Only the last call's answer is returned
+                truncated = response.choices[0].finish_reason == "length"
+                return response.choices[0].message
+            
+            logger.info(f"{subdirectory} agent - Processing query: {user_query}")
+
+            msg = await complete(tools=tools_for_model)
+            logger.info(f"{subdirectory} agent - Initial response: {msg.model_dump()}")
+
+            while msg.tool_calls:
+                if turns >= max_turns or (tokens_left is not None and tokens_left <= 0):
+                    logger.warning(
+                        f"{subdirectory} agent - Budget exhausted after {turns} turns"
                     )
-                    msg = follow.choices[0].message
-                    logger.info(f"{subdirectory} agent - Follow-up response: {msg.model_dump()}")
+                    truncated = True
+                    break
+
+                logger.info(f"{subdirectory} agent - Tool calls requested: {len(msg.tool_calls)}")
+                messages.append(msg.model_dump())
+
+                semaphore = asyncio.Semaphore(TOOL_CALL_CONCURRENCY)
+                payloads = await asyncio.gather(
+                    *[
+                        _run_tool_call(executor, call, scope, semaphore, subdirectory)
+                        for call in msg.tool_calls
+                    ],
+                    return_exceptions=True,
+                )
+                for payload in payloads:
+                    if isinstance(payload, BaseException):
+                        raise payload
+
+                # Tool messages follow the order of the model's tool calls
+                for call, payload in zip(msg.tool_calls, payloads):
+                    messages.append({
+                        "role": "tool",
+                        "tool_call_id": call.id,
+                        "content": payload,
+                    })
 
-                logger.info(f"{subdirectory} agent - Final response: {msg.content}")
+                msg = await complete()
+                logger.info(f"{subdirectory} agent - Follow-up response: {msg.model_dump()}")
+
+            if msg.tool_calls and not msg.content:
                 return {
                     "subdirectory": subdirectory,
-                    "result": msg.content or "",
-                    "error": None
+                    "result": "",
+                    "error": f"budget exhausted after {turns} turns",
+                    "truncated": True,
                 }
-                
+
+            logger.info(f"{subdirectory} agent - Final response: {msg.content}")
+            return {
+                "subdirectory": subdirectory,
+                "result": msg.content or "",
+                "error": None,
+                "truncated": truncated,
+            }
+
+    except asyncio.TimeoutError:
+        logger.error(f"{subdirectory} agent - Model call timed out after {turns} turns")
+        return {
+            "subdirectory": subdirectory,
+            "result": "",
+            "error": "timed out",
+            "truncated": False,
+        }
     except Exception as e:
         logger.error(f"{subdirectory} agent - Error: {str(e)}")
         return {
             "subdirectory": subdirectory,
             "result": "",
-            "error": str(e)
+            "error": str(e),
+            "truncated": False,
         }
 
 
-async def helix(user_id: str, user_query: str, timeout: int = 600) -> str:
-    """
-    Process a user request using multiple agents.
-    
-    Args:
-        user_id: Unique identifier for the user
-        user_query: The user's search query
-        timeout: Timeout in seconds for each agent (default: 600)
+AGENTS = [
+    ("links", LINKS_AGENT_PROMPT),
+    ("docs", DOCS_AGENT_PROMPT),
+    ("media", MEDIA_AGENT_PROMPT),
+]
 
-    Returns:
-        Summarized and structured response from all the agents
-    """
-    logger.info(f"Processing multi-agent request for user: {user_id}")
-    
-    agents = [
-        ("links", LINKS_AGENT_PROMPT),
-        ("docs", DOCS_AGENT_PROMPT),
-        ("media", MEDIA_AGENT_PROMPT),
-    ]
-    
+SYNTHESIS_MODEL = "llama3.3-70b"
+
+NO_CONTENT_MESSAGE = "No content has been added yet, so there is nothing to search."
+
+
+async def _routed_agents(
+    user_id: str, user_query: str
+) -> tuple[list[tuple[str, str]], dict]:
+    """Pick the (subdirectory, prompt) agents to run, falling back to all on error."""
     try:
-        results = await asyncio.wait_for(
-            asyncio.gather(
-                *[agent(user_id, user_query, subdir, prompt) 
-                  for subdir, prompt in agents],
-                return_exceptions=True
-            ),
-            timeout=timeout
-        )
-    except asyncio.TimeoutError:
-        logger.error(f"Multi-agent request timed out after {timeout}s for user {user_id}")
-        return "Error: Search request timed out. Please try again with a more specific query."
-    
+        # Loads (or rebuilds) the catalog and logs the decision: file I/O
+        decision = await asyncio.to_thread(route_query, user_id, user_query)
+    except Exception as e:
+        logger.error(f"Routing failed, running all agents: {str(e)}")
+        return AGENTS, {"agents": [subdir for subdir, _ in AGENTS], "fallback": True}
+    return [(subdir, prompt) for subdir, prompt in AGENTS if subdir in decision["agents"]], decision
+
+
+def _collect_results(results: list) -> tuple[list[str], list[str], list[str]]:
+    """Split agent results into formatted successes and failure descriptions.
+
+    Also returns the subdirectories whose (successful) result was cut off by
+    the budget.
+    """
     successful_results = []
     failed_agents = []
-    
+    truncated_agents = []
+
     for result in results:
         if isinstance(result, Exception):
             logger.error(f"Agent exception: {str(result)}")
@@ -189,44 +281,280 @@ async def helix(user_id: str, user_query: str, timeout: int = 600) -> str:
             failed_agents.append(f"{result['subdirectory']}: {result['error']}")
         elif result.get("result"):
             successful_results.append(f"=== {result['subdirectory'].upper()} RESULTS ===\n{result['result']}")
+            if result.get("truncated"):
+                truncated_agents.append(result["subdirectory"])
+
+    return successful_results, failed_agents, truncated_agents
+
+
+def _failure_note(failed_agents: list[str]) -> str:
+    if not failed_agents:
+        return ""
+    return f"\n\nNote: Some search locations were unavailable: {', '.join([f.split(':')[0] for f in failed_agents])}"
+
+
+def _synthesis_messages(user_query: str, concatenated_results: str) -> list[dict]:
+    prompt = f"""
+            User Query: {user_query}
+            Search Results:
+            {concatenated_results}
+            Please provide a well-structured summary that directly addresses the user's query.
+            """
+    return [
+        {"role": "system", "content": SYNTHESIS_AGENT_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+
+TIMEOUT_MESSAGE = "Search request timed out. Please try again with a more specific query."
+
+
+def _start_agents(
+    user_id: str,
+    user_query: str,
+    agents: list[tuple[str, str]],
+    budget: Optional[SearchBudget],
+    deadline: float,
+) -> dict:
+    """Start one task per agent; returns a task -> subdirectory map."""
+    return {
+        asyncio.create_task(
+            agent(user_id, user_query, subdir, prompt, budget, deadline)
+        ): subdir
+        for subdir, prompt in agents
+    }
+
+
+def _task_result(task: asyncio.Task, subdirectory: str):
+    """Agent result for a finished task, or a timeout error if it was cancelled."""
+    if task.cancelled():
+        return {
+            "subdirectory": subdirectory,
+            "result": "",
+            "error": "timed out",
+            "truncated": False,
+        }
+    return task.exception() or task.result()
+
+
+async def _cancel(tasks) -> None:
+    """Cancel stragglers and wait for them so tool servers are released cleanly."""
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _deadline(timeout: float, budget: Optional[SearchBudget]) -> float:
+    seconds = budget.deadline_seconds if budget and budget.deadline_seconds else timeout
+    return asyncio.get_running_loop().time() + seconds
+
+
+async def helix_result(
+    user_id: str,
+    user_query: str,
+    timeout: int = 600,
+    budget: Optional[SearchBudget] = None,
+) -> tuple[str, list[str], list[str], bool]:
+    """
+    Process a user request using multiple agents.
+
+    Agents that have not finished by the deadline (the budget's
+    `deadline_seconds`, else `timeout`) are cancelled and the answer is
+    synthesized from the ones that did.
+    
+    Args:
+        user_id: Unique identifier for the user
+        user_query: The user's search query
+        timeout: Deadline in seconds when the budget sets none (default: 600)
+        budget: Optional latency and size budget for the agents
+
+    Returns:
+        Tuple of the response, the subdirectories whose agent failed or timed
+        out, the subdirectories whose agent the budget cut off, and whether
+        synthesis failed (the response is then the raw agent results)
+    """
+    logger.info(f"Processing multi-agent request for user: {user_id}")
+
+    agents, _ = await _routed_agents(user_id, user_query)
+    if not agents:
+        return NO_CONTENT_MESSAGE, [], [], False
+
+    deadline = _deadline(timeout, budget)
+    tasks = _start_agents(user_id, user_query, agents, budget, deadline)
+    try:
+        _, pending = await asyncio.wait(
+            tasks, timeout=max(0.0, deadline - asyncio.get_running_loop().time())
+        )
+    finally:
+        await _cancel([task for task in tasks if not task.done()])
+    if pending:
+        logger.warning(
+            f"Deadline reached for user {user_id}; cancelled agents: "
+            f"{[tasks[task] for task in pending]}"
+        )
+    results = [_task_result(task, subdir) for task, subdir in tasks.items()]
+
+    successful_results, failed_agents, truncated_agents = _collect_results(results)
+    failed_names = [f.split(":")[0] for f in failed_agents]
     
     if not successful_results:
+        if pending and len(pending) == len(tasks):
+            logger.error(f"Multi-agent request timed out for user {user_id}")
+            return f"Error: {TIMEOUT_MESSAGE}", failed_names, [], False
         error_summary = "\n".join(failed_agents) if failed_agents else "All agents failed to return results"
         logger.error(f"All agents failed for user {user_id}: {error_summary}")
-        return f"Error: Unable to search any directories. Details:\n{error_summary}"
+        return f"Error: Unable to search any directories. Details:\n{error_summary}", failed_names, [], False
     
     concatenated_results = "\n\n".join(successful_results)
     
     logger.info(f"Concatenated results length: {len(concatenated_results)} characters")
     
-    failure_note = ""
-    if failed_agents:
-        failure_note = f"\n\nNote: Some search locations were unavailable: {', '.join([f.split(':')[0] for f in failed_agents])}"
+    failure_note = _failure_note(failed_agents)
     
     try:
         logger.info("Calling Cerebras for synthesis")
-        cerebras_client = Cerebras(api_key=os.environ["CEREBRAS_API_KEY"])
-        prompt = f"""
-                User Query: {user_query}
-                Search Results:
-                {concatenated_results}
-                Please provide a well-structured summary that directly addresses the user's query.
-                """
-        summary_response = cerebras_client.chat.completions.create(
-            model="llama3.3-70b",
-            messages=[
-                {"role": "system", "content": SYNTHESIS_AGENT_PROMPT},
-                {"role": "user", "content": prompt}
-            ],
+        cerebras_client = get_cerebras_client()
+        summary_response = await cerebras_client.chat.completions.create(
+            model=SYNTHESIS_MODEL,
+            messages=_synthesis_messages(user_query, concatenated_results),
             temperature=0.3,
             max_tokens=2048,
         )
         summary = summary_response.choices[0].message.content
         logger.info(f"Summarization complete for user {user_id}")
         
-        return summary + failure_note
+        return summary + failure_note, failed_names, truncated_agents, False
         
     except Exception as e:
         logger.error(f"Summarization failed: {str(e)}")
         logger.info("Falling back to concatenated results")
-        return f"Search Results (summarization unavailable):\n\n{concatenated_results}{failure_note}"
+        return (
+            f"Search Results (summarization unavailable):\n\n{concatenated_results}{failure_note}",
+            failed_names,
+            truncated_agents,
+            True,
+        )
+
+
+async def helix(
+    user_id: str,
+    user_query: str,
+    timeout: int = 600,
+    budget: Optional[SearchBudget] = None,
+) -> str:
+    """Like `helix_result`, returning only the response text."""
+    result, _, _, _ = await helix_result(user_id, user_query, timeout, budget)
+    return result
+
+
+async def helix_stream(
+    user_id: str,
+    user_query: str,
+    timeout: int = 600,
+    budget: Optional[SearchBudget] = None,
+) -> AsyncIterator[tuple[str, dict]]:
+    """
+    Streaming variant of `helix`.
+
+    Yields `(event, data)` pairs: a `routing` event naming the agents that
+    will run, one `agent` event per agent as soon as it
+    finishes (or is cancelled at the deadline), then `token` events carrying
+    synthesis text as it is generated, and finally a `done` event, whose
+    `synthesis_failed` tells whether the tokens are the raw agent results (or
+    a cut-off answer) because synthesis failed and whose `truncated_agents`
+    lists the agents the budget cut off. An `error`
+    event replaces the synthesis when no agent produced results.
+    """
+    logger.info(f"Processing streaming multi-agent request for user: {user_id}")
+
+    agents, decision = await _routed_agents(user_id, user_query)
+    yield "routing", decision
+    if not agents:
+        yield "token", {"text": NO_CONTENT_MESSAGE}
+        yield "done", {
+            "failed_agents": [],
+            "truncated_agents": [],
+            "synthesis_failed": False,
+        }
+        return
+
+    loop = asyncio.get_running_loop()
+    deadline = _deadline(timeout, budget)
+    tasks = _start_agents(user_id, user_query, agents, budget, deadline)
+    pending = set(tasks)
+    results = []
+    try:
+        while pending:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(
+                pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                result = _task_result(task, tasks[task])
+                results.append(result)
+                if isinstance(result, BaseException):
+                    yield "agent", {"subdirectory": tasks[task], "result": "", "error": str(result)}
+                else:
+                    yield "agent", result
+        if pending:
+            logger.warning(
+                f"Deadline reached for user {user_id}; cancelled agents: "
+                f"{[tasks[task] for task in pending]}"
+            )
+            await _cancel(pending)
+            for task in pending:
+                result = _task_result(task, tasks[task])
+                results.append(result)
+                yield "agent", result
+    finally:
+        await _cancel([task for task in tasks if not task.done()])
+
+    successful_results, failed_agents, truncated_agents = _collect_results(results)
+
+    if not successful_results:
+        if pending and len(pending) == len(tasks):
+            logger.error(f"Streaming multi-agent request timed out for user {user_id}")
+            yield "error", {"message": TIMEOUT_MESSAGE}
+            return
+        error_summary = "\n".join(failed_agents) if failed_agents else "All agents failed to return results"
+        logger.error(f"All agents failed for user {user_id}: {error_summary}")
+        yield "error", {"message": f"Unable to search any directories. Details:\n{error_summary}"}
+        return
+
+    concatenated_results = "\n\n".join(successful_results)
+    failure_note = _failure_note(failed_agents)
+    streamed_any = False
+    synthesis_failed = False
+
+    try:
+        logger.info("Streaming Cerebras synthesis")
+        stream = await get_cerebras_client().chat.completions.create(
+            model=SYNTHESIS_MODEL,
+            messages=_synthesis_messages(user_query, concatenated_results),
+            temperature=0.3,
+            max_tokens=2048,
+            stream=True,
+        )
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content
+            if text:
+                streamed_any = True
+                yield "token", {"text": text}
+        logger.info(f"Streaming summarization complete for user {user_id}")
+    except Exception as e:
+        logger.error(f"Streaming summarization failed: {str(e)}")
+        synthesis_failed = True
+        if not streamed_any:
+            yield "token", {"text": f"Search Results (summarization unavailable):\n\n{concatenated_results}"}
+
+    if failure_note:
+        yield "token", {"text": failure_note}
+    yield "done", {
+        "failed_agents": [f.split(":")[0] for f in failed_agents],
+        "truncated_agents": truncated_agents,
+        "synthesis_failed": synthesis_failed,
+    }
@@ -1,11 +1,32 @@
-from typing import List, Tuple
-from cerebras.cloud.sdk import Cerebras
+import hashlib
+import json
+import logging
 import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from cerebras.cloud.sdk import Cerebras
 from dotenv import load_dotenv, find_dotenv
-import json
 
 load_dotenv(find_dotenv())
 
+logger = logging.getLogger(__name__)
+
+ANALYSIS_MODEL = "llama-4-scout-17b-16e-instruct"
+# Documents packed into one analysis request
+AI_BATCH_SIZE = int(os.getenv("AI_BATCH_SIZE", "8"))
+# Characters of documents packed into one analysis request
+AI_BATCH_MAX_CHARS = int(os.getenv("AI_BATCH_MAX_CHARS", "24000"))
+# Batch requests in flight at once
+AI_BATCH_CONCURRENCY = int(os.getenv("AI_BATCH_CONCURRENCY", "4"))
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "4096"))
+
+# (name, summary, tags)
+Analysis = Tuple[str, str, List[str]]
+
 json_format = """
 {
     "name": "string",
@@ -14,21 +35,217 @@ json_format = """
 }
 """
 
+_GUIDELINES = "Make sure that the name is very descriptive and only contains alphanumeric characters and underscores. Do not include extensions either. Make sure you include at least 3 tags for the files, however feel free to include more if the file is related to multiple topics."
+
+SYSTEM_PROMPT = f"You are a helpful assistant that is given a file and you need to generate a name and summary for the file. You are only allowed to reply with the specified json format. The json format is as follows: {json_format}. Don't include any other text or comments. {_GUIDELINES}"
+
+BATCH_SYSTEM_PROMPT = f"""You are a helpful assistant that is given several files and you need to generate a name and summary for each file. Each file is wrapped in <file id="N"> and </file> tags. You are only allowed to reply with a json array containing one object per file, each in the following format, plus the "id" of the file it describes: {json_format}. Don't include any other text or comments. Analyze every file on its own, never mixing content of different files. {_GUIDELINES}"""
+
+_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+
+
+class AnalysisCache:
+    """LRU cache of file analyses keyed by a hash of the analyzed content."""
+
+    def __init__(self, max_entries: int = AI_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Analysis]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(content: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(ANALYSIS_MODEL.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(content.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Analysis]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        name, summary, tags = entry
+        return name, summary, list(tags)
+
+    def set(self, key: str, value: Analysis) -> None:
+        if self.max_entries <= 0:
+            return
+        name, summary, tags = value
+        with self._lock:
+            self._entries[key] = (name, summary, list(tags))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_analysis_cache = AnalysisCache()
+
+
+def get_analysis_cache() -> AnalysisCache:
+    """Return the analysis cache shared by every `AIHelper` in this process."""
+    return _analysis_cache
+
+
+def _parse_json(text: str):
+    return json.loads(_FENCE_RE.sub("", text or ""))
+
+
+def _to_analysis(response) -> Analysis:
+    """Validate one analysis object from the model."""
+    name, summary, tags = response["name"], response["summary"], response["tags"]
+    if not isinstance(name, str) or not name.strip() or not isinstance(summary, str):
+        raise ValueError(f"Invalid analysis: {response!r}")
+    if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+        raise ValueError(f"Invalid tags in analysis: {response!r}")
+    return name, summary, tags
+
 
 class AIHelper:
     def __init__(self):
         self.client = Cerebras(api_key=os.getenv("CEREBRAS_API_KEY"))
+        self.cache = get_analysis_cache()
 
-    def get_analyzed_file_data(self, content: str) -> Tuple[str, str, List[str]]:
+    def _complete(self, system_prompt: str, content: str) -> str:
         chat_completion = self.client.chat.completions.create(
             messages=[
-                {
-                    "role": "system",
-                    "content": "You are a helpful assistant that is given a file and you need to generate a name and summary for the file. You are only allowed to reply with the specified json format. The json format is as follows: {json_format}. Don't include any other text or comments. Make sure that the name is very descriptive and only contains alphanumeric characters and underscores. Do not include extensions either. Make sure you include at least 3 tags for the files, however feel free to include more if the file is related to multiple topics.",
-                },
+                {"role": "system", "content": system_prompt},
                 {"role": "user", "content": content},
             ],
-            model="llama-4-scout-17b-16e-instruct",
+            model=ANALYSIS_MODEL,
         )
-        response = json.loads(chat_completion.choices[0].message.content)
-        return response["name"], response["summary"], response["tags"]
+        return chat_completion.choices[0].message.content
+
+    def _analyze(self, content: str) -> Analysis:
+        return _to_analysis(_parse_json(self._complete(SYSTEM_PROMPT, content)))
+
+    def get_analyzed_file_data(self, content: str) -> Analysis:
+        key = self.cache.make_key(content)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        analysis = self._analyze(content)
+        self.cache.set(key, analysis)
+        return analysis
+
+    def get_analyzed_files_data(
+        self, contents: Sequence[str]
+    ) -> List[Union[Analysis, Exception]]:
+        """Analyze several documents, packing them into as few requests as possible.
+
+        Cached documents are answered from the cache, and identical ones are
+        analyzed once. The rest are packed into requests of up to
+        `AI_BATCH_SIZE` documents and `AI_BATCH_MAX_CHARS` characters, and up
+        to `AI_BATCH_CONCURRENCY` of those requests run at a time. A document
+        missing from a batch reply, or whose reply can't be parsed, is
+        analyzed again on its own.
+
+        Args:
+            contents: The (already truncated) documents to analyze
+
+        Returns:
+            The `(name, summary, tags)` of each document, in order, or the
+            exception that made its analysis fail
+        """
+        results: List[Union[Analysis, Exception, None]] = [None] * len(contents)
+        pending: Dict[str, List[int]] = {}
+        for index, content in enumerate(contents):
+            key = self.cache.make_key(content)
+            cached = self.cache.get(key) if key not in pending else None
+            if cached is not None:
+                results[index] = cached
+            else:
+                pending.setdefault(key, []).append(index)
+        if not pending:
+            return results
+
+        keys = list(pending)
+        documents = [contents[pending[key][0]] for key in keys]
+        batches = self._pack(documents)
+        workers = max(1, min(AI_BATCH_CONCURRENCY, len(batches)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            outcomes = executor.map(
+                lambda batch: self._analyze_batch([documents[i] for i in batch]),
+                batches,
+            )
+            for batch, outcome in zip(batches, outcomes):
+                for position, result in zip(batch, outcome):
+                    if not isinstance(result, Exception):
+                        self.cache.set(keys[position], result)
+                    for index in pending[keys[position]]:
+                        results[index] = result
+        return results
+
+    def _pack(self, documents: List[str]) -> List[List[int]]:
+        """Group document positions into batches bounded by count and size."""
+        batches: List[List[int]] = []
+        size = 0
+        for position, document in enumerate(documents):
+            if (
+                not batches
+                or len(batches[-1]) >= max(1, AI_BATCH_SIZE)
+                or size + len(document) > AI_BATCH_MAX_CHARS
+            ):
+                batches.append([])
+                size = 0
+            batches[-1].append(position)
+            size += len(document)
+        return batches
+
+    def _analyze_single(self, content: str) -> Union[Analysis, Exception]:
+        try:
+            return self._analyze(content)
+        except Exception as e:
+            logger.warning(f"File analysis failed: {e!r}")
+            return e
+
+    def _analyze_batch(self, documents: List[str]) -> List[Union[Analysis, Exception]]:
+        if len(documents) == 1:
+            return [self._analyze_single(documents[0])]
+
+        parsed: Dict[int, Analysis] = {}
+        try:
+            prompt = "\n\n".join(
+                f'<file id="{i}">\n{document}\n</file>'
+                for i, document in enumerate(documents, start=1)
+            )
+            reply = _parse_json(self._complete(BATCH_SYSTEM_PROMPT, prompt))
+            if isinstance(reply, dict):
+                # Some models wrap the array in an object
+                reply = next((v for v in reply.values() if isinstance(v, list)), [])
+            for item in reply:
+                try:
+                    file_id = int(item["id"])
+                    if 1 <= file_id <= len(documents) and file_id not in parsed:
+                        parsed[file_id] = _to_analysis(item)
+                except (KeyError, TypeError, ValueError):
+                    continue
+        except Exception as e:
+            logger.warning(f"Batch analysis of {len(documents)} files failed: {e!r}")
+
+        missing = len(documents) - len(parsed)
+        if missing:
+            logger.warning(
+                f"Batch analysis had no valid result for {missing} of "
+                f"{len(documents)} files; analyzing them one by one"
+            )
+        return [
+            parsed[i] if i in parsed else self._analyze_single(document)
+            for i, document in enumerate(documents, start=1)
+        ]
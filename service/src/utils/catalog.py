@@ -0,0 +1,396 @@
+"""Per-user catalog of processed files.
+
+``uploads/<user_id>/catalog.sqlite3`` holds one row per processed file with
+its name, original name, category, summary, tags, sizes, content hashes and
+timestamps. ``ProcessHelper`` writes a row in the same step as the ``.meta``
+and ``.md`` files, and the file endpoints and query router read it instead of
+listing the ``processed/`` directories and parsing every ``.meta`` file.
+
+The ``.meta`` files stay the source of truth: a missing catalog is rebuilt
+from them on first use, and existing deployments can rebuild explicitly with::
+
+    python -m src.utils.catalog [user_id ...]
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Uploads directory is one level up from project root (adjacent to project)
+UPLOADS_DIR = (
+    Path(__file__).resolve().parents[3] / "uploads"
+)  # Go up 3 levels from src/utils/catalog.py
+
+CATALOG_DB = "catalog.sqlite3"
+CATEGORIES = ("docs", "links", "media")
+
+_HASH_BLOCK = 1 << 20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    category TEXT NOT NULL,
+    name TEXT NOT NULL,
+    old_name TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    tags TEXT NOT NULL,
+    original_path TEXT,
+    original_size INTEGER,
+    original_sha256 TEXT,
+    markdown_size INTEGER,
+    markdown_sha256 TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    UNIQUE (category, name)
+);
+CREATE INDEX IF NOT EXISTS entries_name ON entries (name);
+CREATE INDEX IF NOT EXISTS entries_category ON entries (category, id);
+CREATE TABLE IF NOT EXISTS entry_tags (
+    tag TEXT NOT NULL,
+    entry_id INTEGER NOT NULL,
+    PRIMARY KEY (tag, entry_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entry_tags_entry ON entry_tags (entry_id);
+"""
+
+# Columns returned to API callers; id and original_path stay internal
+_PUBLIC_COLUMNS = (
+    "category",
+    "name",
+    "old_name",
+    "summary",
+    "tags",
+    "original_size",
+    "original_sha256",
+    "markdown_size",
+    "markdown_sha256",
+    "created_at",
+    "updated_at",
+)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _file_stats(path: Optional[Path]) -> Tuple[Optional[int], Optional[str]]:
+    """Return ``(size, sha256)`` of a file, or ``(None, None)`` if it is missing."""
+    if path is None:
+        return None, None
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(_HASH_BLOCK), b""):
+                digest.update(block)
+        return path.stat().st_size, digest.hexdigest()
+    except OSError:
+        return None, None
+
+
+def _normalize_tag(tag: str) -> str:
+    return str(tag).strip().lower()
+
+
+class Catalog:
+    """SQLite catalog of one user's processed files."""
+
+    def __init__(self, user_dir: Path):
+        self.user_dir = Path(user_dir)
+        self.path = self.user_dir / CATALOG_DB
+
+    @classmethod
+    def for_user(cls, user_id: str) -> "Catalog":
+        return cls(UPLOADS_DIR / user_id)
+
+    def _connect(self) -> sqlite3.Connection:
+        self.user_dir.mkdir(parents=True, exist_ok=True)
+        fresh = not self.path.exists()
+        conn = sqlite3.connect(str(self.path), timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        if fresh:
+            # First use on an existing deployment: import the .meta files
+            with conn:
+                count = self._import_from_disk(conn)
+            if count:
+                logger.info(f"Built catalog for {self.user_dir.name} with {count} entries")
+        return conn
+
+    def _upsert(
+        self,
+        conn: sqlite3.Connection,
+        category: str,
+        meta: dict,
+        markdown_path: Optional[Path],
+        original_path: Optional[Path],
+        timestamp: str,
+    ) -> None:
+        tags = [str(tag) for tag in meta.get("tags") or []]
+        original_size, original_sha256 = _file_stats(original_path)
+        markdown_size, markdown_sha256 = _file_stats(markdown_path)
+        original_rel = (
+            original_path.relative_to(self.user_dir).as_posix()
+            if original_path is not None and original_size is not None
+            else None
+        )
+        conn.execute(
+            """
+            INSERT INTO entries (
+                category, name, old_name, summary, tags, original_path,
+                original_size, original_sha256, markdown_size, markdown_sha256,
+                created_at, updated_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (category, name) DO UPDATE SET
+                old_name = excluded.old_name,
+                summary = excluded.summary,
+                tags = excluded.tags,
+                original_path = excluded.original_path,
+                original_size = excluded.original_size,
+                original_sha256 = excluded.original_sha256,
+                markdown_size = excluded.markdown_size,
+                markdown_sha256 = excluded.markdown_sha256,
+                updated_at = excluded.updated_at
+            """,
+            (
+                category,
+                meta["name"],
+                meta.get("old_name") or "",
+                meta.get("summary") or "",
+                json.dumps(tags, ensure_ascii=False),
+                original_rel,
+                original_size,
+                original_sha256,
+                markdown_size,
+                markdown_sha256,
+                timestamp,
+                timestamp,
+            ),
+        )
+        row = conn.execute(
+            "SELECT id FROM entries WHERE category = ? AND name = ?",
+            (category, meta["name"]),
+        ).fetchone()
+        conn.execute("DELETE FROM entry_tags WHERE entry_id = ?", (row["id"],))
+        conn.executemany(
+            "INSERT OR IGNORE INTO entry_tags (tag, entry_id) VALUES (?, ?)",
+            [(_normalize_tag(tag), row["id"]) for tag in tags if _normalize_tag(tag)],
+        )
+
+    def _import_from_disk(self, conn: sqlite3.Connection) -> int:
+        """Insert a row for every readable ``.meta`` file; returns the count."""
+        count = 0
+        for category in CATEGORIES:
+            category_dir = self.user_dir / "processed" / category
+            if not category_dir.is_dir():
+                continue
+            original_dir = self.user_dir / "original" / category
+            for meta_path in sorted(category_dir.glob("*.meta")):
+                try:
+                    with open(meta_path, "r", encoding="utf-8") as f:
+                        meta = json.load(f)
+                    # Endpoints look entries up by file name
+                    meta = {**meta, "name": meta_path.stem}
+                    timestamp = datetime.fromtimestamp(
+                        meta_path.stat().st_mtime, timezone.utc
+                    ).isoformat()
+                except (OSError, json.JSONDecodeError):
+                    logger.warning(f"Skipping unreadable meta file {meta_path}")
+                    continue
+                originals = (
+                    sorted(original_dir.glob(f"{meta_path.stem}.*"))
+                    if original_dir.is_dir()
+                    else []
+                )
+                markdown_path = meta_path.with_suffix(".md")
+                self._upsert(
+                    conn,
+                    category,
+                    meta,
+                    markdown_path if markdown_path.exists() else None,
+                    originals[0] if originals else None,
+                    timestamp,
+                )
+                count += 1
+        return count
+
+    def record(
+        self,
+        category: str,
+        meta: dict,
+        markdown_path: Optional[Path] = None,
+        original_path: Optional[Path] = None,
+    ) -> None:
+        """Insert or update the entry for a processed file in one transaction.
+
+        Args:
+            category: One of docs, links or media
+            meta: The `.meta` payload (`name`, `old_name`, `summary`, `tags`)
+            markdown_path: The converted markdown, if it was written
+            original_path: The stored original file (None for links)
+        """
+        conn = self._connect()
+        try:
+            with conn:
+                self._upsert(
+                    conn, category, meta, markdown_path, original_path, _now()
+                )
+        finally:
+            conn.close()
+
+    def remove(self, category: str, name: str) -> bool:
+        """Delete an entry; returns whether it existed."""
+        conn = self._connect()
+        try:
+            with conn:
+                row = conn.execute(
+                    "SELECT id FROM entries WHERE category = ? AND name = ?",
+                    (category, name),
+                ).fetchone()
+                if row is None:
+                    return False
+                conn.execute("DELETE FROM entry_tags WHERE entry_id = ?", (row["id"],))
+                conn.execute("DELETE FROM entries WHERE id = ?", (row["id"],))
+                return True
+        finally:
+            conn.close()
+
+    def _to_dict(self, row: sqlite3.Row) -> dict:
+        entry = {column: row[column] for column in _PUBLIC_COLUMNS}
+        entry["tags"] = json.loads(entry["tags"])
+        return entry
+
+    def get(self, category: str, name: str) -> Optional[dict]:
+        """Return an entry, including its `original_path` (relative to the user dir)."""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT * FROM entries WHERE category = ? AND name = ?",
+                (category, name),
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        return {**self._to_dict(row), "original_path": row["original_path"]}
+
+    def find(self, name: str) -> List[dict]:
+        """Return entries with this name in any category (see `get`)."""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT * FROM entries WHERE name = ? ORDER BY category", (name,)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [
+            {**self._to_dict(row), "original_path": row["original_path"]}
+            for row in rows
+        ]
+
+    def list_entries(
+        self,
+        category: Optional[str] = None,
+        tag: Optional[str] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[int] = None,
+    ) -> Tuple[List[dict], Optional[int]]:
+        """List entries newest first, optionally filtered by category and tag.
+
+        Pagination is keyset based, so a page costs O(limit) regardless of how
+        deep it is.
+
+        Args:
+            category: Only entries in this category
+            tag: Only entries carrying this tag (case-insensitive)
+            limit: Page size; None returns every matching entry
+            cursor: The `next_cursor` returned with the previous page
+
+        Returns:
+            Tuple of the entries and the cursor for the next page (None on the last page)
+        """
+        sql = "SELECT e.* FROM entries e"
+        params: list = []
+        if tag:
+            sql += " JOIN entry_tags t ON t.entry_id = e.id AND t.tag = ?"
+            params.append(_normalize_tag(tag))
+        sql += " WHERE 1 = 1"
+        if category:
+            sql += " AND e.category = ?"
+            params.append(category)
+        if cursor is not None:
+            sql += " AND e.id < ?"
+            params.append(cursor)
+        sql += " ORDER BY e.id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit + 1)
+
+        conn = self._connect()
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1]["id"]
+        return [self._to_dict(row) for row in rows], next_cursor
+
+    def counts(self) -> dict:
+        """Return the number of entries per category."""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT category, COUNT(*) AS n FROM entries GROUP BY category"
+            ).fetchall()
+        finally:
+            conn.close()
+        counts = {category: 0 for category in CATEGORIES}
+        counts.update({row["category"]: row["n"] for row in rows})
+        return counts
+
+    def rebuild(self) -> int:
+        """Replace the catalog with the `.meta` files on disk; returns the entry count."""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM entry_tags")
+                conn.execute("DELETE FROM entries")
+                return self._import_from_disk(conn)
+        finally:
+            conn.close()
+
+
+def rebuild_catalogs(user_ids: Iterable[str] = ()) -> dict:
+    """Rebuild the catalogs of the given users (all users when empty)."""
+    user_ids = list(user_ids)
+    if not user_ids and UPLOADS_DIR.is_dir():
+        # Dot directories (e.g. the shared content store) are not users
+        user_ids = sorted(
+            entry.name
+            for entry in UPLOADS_DIR.iterdir()
+            if entry.is_dir() and not entry.name.startswith(".")
+        )
+    return {user_id: Catalog.for_user(user_id).rebuild() for user_id in user_ids}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(
+        description="Rebuild per-user file catalogs from the .meta files on disk."
+    )
+    parser.add_argument("user_ids", nargs="*", help="Users to rebuild (default: all)")
+    cli_args = parser.parse_args()
+    for user_id, count in rebuild_catalogs(cli_args.user_ids).items():
+        print(f"{user_id}: {count} entries")
@@ -0,0 +1,146 @@
+"""Heading and paragraph aware chunking of the markdown written by ProcessHelper."""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional
+
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+
+# Target chunk size in characters; paragraphs are never merged past this
+DEFAULT_MAX_CHARS = 1500
+
+
+@dataclass(frozen=True)
+class Chunk:
+    """A contiguous slice of a markdown file.
+
+    Lines are 1-based and inclusive; offsets are character offsets into the
+    file's text, end-exclusive.
+    """
+
+    text: str
+    heading: str
+    start_line: int
+    end_line: int
+    start_offset: int
+    end_offset: int
+
+
+def _blocks(lines: Iterable[str], max_chars: int):
+    """Yield `(heading_path, lines, continued, gap)` blocks.
+
+    A block is a paragraph (lines up to a blank line) or a single heading line,
+    given as `(line_no, offset, line)` entries; the heading path is the chain
+    of enclosing headings joined with " > " and `gap` holds the blank lines
+    before the block. A paragraph longer than `max_chars` is yielded in
+    pieces, the later ones with `continued` set, so it is never held in
+    memory as a whole.
+    """
+    headings: List[str] = []
+    block: list = []
+    block_size = 0
+    block_gap = ""
+    continued = False
+    gap: List[str] = []
+    offset = 0
+    for line_no, line in enumerate(lines, 1):
+        stripped = line.strip()
+        match = HEADING_RE.match(stripped)
+        if match or not stripped:
+            if block:
+                yield " > ".join(headings), block, continued, block_gap
+                block = []
+                block_size = 0
+            continued = False
+        if match:
+            level = len(match.group(1))
+            headings = headings[: level - 1] + [match.group(2)]
+            yield " > ".join(headings), [(line_no, offset, line)], False, "".join(gap)
+            gap = []
+        elif stripped:
+            if not block:
+                block_gap = "".join(gap)
+                gap = []
+            block.append((line_no, offset, line))
+            block_size += len(line)
+            if block_size > max_chars:
+                yield " > ".join(headings), block, continued, block_gap
+                block = []
+                block_size = 0
+                continued = True
+        else:
+            gap.append(line)
+        offset += len(line)
+    if block:
+        yield " > ".join(headings), block, continued, block_gap
+
+
+def iter_chunks(
+    lines: Iterable[str], max_chars: int = DEFAULT_MAX_CHARS
+) -> Iterator[Chunk]:
+    """Chunk markdown given as lines (with their line endings) as it is read.
+
+    Consecutive paragraphs under the same heading are packed together up to
+    `max_chars`; a new heading always starts a new chunk, and a paragraph that
+    alone exceeds `max_chars` is split on line boundaries. Only the chunk
+    being built is held in memory, so a file object can be passed directly.
+    """
+    current: list = []
+    # The chunk's text, including blank lines between its paragraphs
+    current_text: List[str] = []
+    current_heading = ""
+    current_size = 0
+
+    def flush() -> Optional[Chunk]:
+        nonlocal current, current_text, current_size
+        chunk = None
+        if current:
+            first_line, first_offset, _ = current[0]
+            last_line, last_offset, last = current[-1]
+            chunk = Chunk(
+                text="".join(current_text).strip(),
+                heading=current_heading,
+                start_line=first_line,
+                end_line=last_line,
+                start_offset=first_offset,
+                end_offset=last_offset + len(last),
+            )
+        current = []
+        current_text = []
+        current_size = 0
+        return chunk
+
+    for heading, lines, continued, gap in _blocks(lines, max_chars):
+        is_heading = len(lines) == 1 and HEADING_RE.match(lines[0][2].strip())
+        block_size = sum(len(line) for _, _, line in lines)
+        chunk = None
+        if is_heading or heading != current_heading:
+            chunk = flush()
+            current_heading = heading
+        elif not continued and current_size + block_size > max_chars:
+            chunk = flush()
+        if chunk:
+            yield chunk
+
+        for i, entry in enumerate(lines):
+            if current and current_size + len(entry[2]) > max_chars:
+                yield flush()
+            if current and not i:
+                current_text.append(gap)
+            current.append(entry)
+            current_text.append(entry[2])
+            current_size += len(entry[2])
+
+    chunk = flush()
+    if chunk:
+        yield chunk
+
+
+def chunk_markdown(text: str, max_chars: int = DEFAULT_MAX_CHARS) -> List[Chunk]:
+    """Split markdown into chunks that respect heading and paragraph boundaries.
+
+    See `iter_chunks`, which this applies to the lines of `text`.
+    """
+    return list(iter_chunks(text.splitlines(keepends=True), max_chars))
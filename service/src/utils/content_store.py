@@ -0,0 +1,427 @@
+"""Content-addressed cache of converted markdown and its AI analysis.
+
+Re-uploading the same file or re-saving the same page used to rerun the
+conversion (or transcription) and the Cerebras analysis every time. Sources
+are now keyed by content:
+
+- uploads by the SHA-256 of their bytes
+- links by the SHA-256 of the canonicalized URL plus the fetched markdown
+
+A hit returns the markdown together with the name, summary and tags from the
+first analysis, so a duplicate is materialized without converting or calling
+the model.
+
+Markdown is stored once as a blob named by its own hash, under
+``uploads/.content/blobs/``. Every user's ``processed/<category>/<name>.md``
+is a hard link to that blob (falling back to a copy when linking is not
+possible), so identical markdown takes the disk space of one copy. These
+files must therefore never be rewritten in place. A blob is removed once the
+last linked copy is deleted.
+
+Very large markdown (from streaming conversion) is handed around as a
+``MarkdownFile``, never as a string. Such a file is moved into the store as
+its blob, and large blobs come back from a lookup the same way.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import BinaryIO, Optional, Tuple, Union
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+logger = logging.getLogger(__name__)
+
+# Uploads directory is one level up from project root (adjacent to project)
+CONTENT_DIR = (
+    Path(__file__).resolve().parents[3] / "uploads" / ".content"
+)  # Go up 3 levels from src/utils/content_store.py
+
+_HASH_BLOCK = 1 << 20
+# Cached markdown larger than this is returned as a MarkdownFile, not read
+_INLINE_MARKDOWN_BYTES = 8 * 1024 * 1024
+# Characters read from a large blob for its prefix
+_PREFIX_CHARS = 4096
+
+# Query parameters that only track where a link was shared from
+_TRACKING_PARAMS = {"fbclid", "gclid", "igshid", "mc_cid", "mc_eid", "ref", "ref_src", "si"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    markdown_sha256 TEXT NOT NULL,
+    name TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    tags TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sources_markdown ON sources (markdown_sha256);
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 TEXT PRIMARY KEY,
+    size INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class MarkdownFile:
+    """Markdown on disk, passed around in place of its text.
+
+    Attributes:
+        path: Where the markdown is; a temporary file until the store adopts it
+        sha256: SHA-256 of the UTF-8 markdown
+        size: Size in bytes
+        prefix: The first few thousand characters, enough for the analysis
+        temporary: Whether `path` is a temporary file to move or delete
+    """
+
+    def __init__(
+        self, path: Path, sha256: str, size: int, prefix: str, temporary: bool = True
+    ):
+        self.path = Path(path)
+        self.sha256 = sha256
+        self.size = size
+        self.prefix = prefix
+        self.temporary = temporary
+
+    def __bool__(self) -> bool:
+        return self.size > 0
+
+    def __repr__(self) -> str:
+        return f"MarkdownFile({str(self.path)!r}, size={self.size})"
+
+    def discard(self) -> None:
+        """Delete the file unless the store adopted it."""
+        if self.temporary:
+            self.path.unlink(missing_ok=True)
+
+
+Markdown = Union[str, MarkdownFile]
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def hash_stream(src: BinaryIO, dst: Optional[BinaryIO] = None) -> str:
+    """SHA-256 of a stream, optionally copying it to `dst` in the same pass."""
+    digest = hashlib.sha256()
+    for block in iter(lambda: src.read(_HASH_BLOCK), b""):
+        digest.update(block)
+        if dst is not None:
+            dst.write(block)
+    return digest.hexdigest()
+
+
+def canonicalize_url(url: str) -> str:
+    """Normalize a URL so trivially different forms of one page share a key.
+
+    Lowercases the scheme and host, drops `www.`, default ports, the fragment,
+    trailing slashes and tracking parameters (`utm_*`, `fbclid`, ...), and
+    sorts the remaining query parameters.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    port = parts.port
+    if port and (scheme, port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{port}"
+    path = parts.path.rstrip("/") or "/"
+    query = urlencode(
+        sorted(
+            (key, value)
+            for key, value in parse_qsl(parts.query, keep_blank_values=True)
+            if not key.lower().startswith("utm_") and key.lower() not in _TRACKING_PARAMS
+        )
+    )
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+def file_key(sha256: str) -> str:
+    return f"file:{sha256}"
+
+
+def url_key(url: str, markdown: str) -> str:
+    digest = hashlib.sha256()
+    digest.update(canonicalize_url(url).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(markdown.encode("utf-8"))
+    return f"url:{digest.hexdigest()}"
+
+
+class ContentStore:
+    """Shared blob store plus a cache from source key to markdown and analysis."""
+
+    def __init__(self, root: Path = CONTENT_DIR):
+        self.root = Path(root)
+        self.blob_dir = self.root / "blobs"
+        self.path = self.root / "index.sqlite3"
+
+    def _connect(self) -> sqlite3.Connection:
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.path), timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        return conn
+
+    @staticmethod
+    def _count(conn: sqlite3.Connection, name: str, amount: int = 1) -> None:
+        conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value",
+            (name, amount),
+        )
+
+    def _blob_path(self, sha256: str) -> Path:
+        return self.blob_dir / sha256[:2] / f"{sha256}.md"
+
+    def _ensure_blob(self, sha256: str, data: bytes) -> Path:
+        blob = self._blob_path(sha256)
+        if not blob.exists():
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = blob.with_name(f"{blob.name}.{uuid.uuid4().hex}.tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, blob)
+        return blob
+
+    def _adopt(self, markdown: MarkdownFile) -> Path:
+        """Make a markdown file the blob of its content and point it there."""
+        blob = self._blob_path(markdown.sha256)
+        if markdown.path == blob:
+            return blob
+        if blob.exists():
+            markdown.discard()
+        elif markdown.temporary:
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            # Same filesystem as the uploads, so this is a rename
+            shutil.move(str(markdown.path), str(blob))
+        else:
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = blob.with_name(f"{blob.name}.{uuid.uuid4().hex}.tmp")
+            shutil.copyfile(markdown.path, tmp_path)
+            os.replace(tmp_path, blob)
+        markdown.path = blob
+        markdown.temporary = False
+        return blob
+
+    def _store_blob(self, markdown: Markdown) -> Tuple[str, int, Path]:
+        """Store markdown as a blob if needed; return its hash, size and blob path."""
+        if isinstance(markdown, MarkdownFile):
+            return markdown.sha256, markdown.size, self._adopt(markdown)
+        data = markdown.encode("utf-8")
+        sha256 = hashlib.sha256(data).hexdigest()
+        return sha256, len(data), self._ensure_blob(sha256, data)
+
+    def _read_blob(self, sha256: str) -> Markdown:
+        blob = self._blob_path(sha256)
+        size = blob.stat().st_size
+        if size <= _INLINE_MARKDOWN_BYTES:
+            return blob.read_text(encoding="utf-8")
+        with blob.open(encoding="utf-8") as f:
+            prefix = f.read(_PREFIX_CHARS)
+        return MarkdownFile(blob, sha256, size, prefix, temporary=False)
+
+    def lookup(self, key: str) -> Optional[dict]:
+        """Return the cached `markdown`, `name`, `summary` and `tags` for a source.
+
+        The markdown is a `MarkdownFile` when it is large. Every call counts
+        as a lookup for the dedup ratio, and a hit as a duplicate.
+        """
+        kind = key.split(":", 1)[0]
+        conn = self._connect()
+        try:
+            with conn:
+                row = conn.execute(
+                    "SELECT * FROM sources WHERE key = ?", (key,)
+                ).fetchone()
+                markdown = None
+                if row is not None:
+                    try:
+                        markdown = self._read_blob(row["markdown_sha256"])
+                    except OSError:
+                        # Blob released since; the source is converted again
+                        conn.execute("DELETE FROM sources WHERE key = ?", (key,))
+                self._count(conn, f"{kind}_lookups")
+                if markdown is not None:
+                    self._count(conn, f"{kind}_hits")
+        finally:
+            conn.close()
+        if markdown is None:
+            return None
+        return {
+            "markdown": markdown,
+            "name": row["name"],
+            "summary": row["summary"],
+            "tags": json.loads(row["tags"]),
+        }
+
+    def remember(
+        self, key: str, markdown: Markdown, name: str, summary: str, tags: list
+    ) -> None:
+        """Cache the analysis of a converted source.
+
+        Args:
+            key: `file_key(...)` or `url_key(...)` of the source
+            markdown: The converted markdown; nothing is cached when it is empty
+            name: Name chosen by the analysis
+            summary: Summary from the analysis
+            tags: Tags from the analysis
+        """
+        if not markdown:
+            return
+        conn = self._connect()
+        try:
+            with conn:
+                sha256, size, _ = self._store_blob(markdown)
+                conn.execute(
+                    "INSERT OR IGNORE INTO blobs (sha256, size) VALUES (?, ?)",
+                    (sha256, size),
+                )
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO sources (
+                        key, kind, markdown_sha256, name, summary, tags, created_at
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        key,
+                        key.split(":", 1)[0],
+                        sha256,
+                        name or "",
+                        summary or "",
+                        json.dumps(list(tags or []), ensure_ascii=False),
+                        _now(),
+                    ),
+                )
+        finally:
+            conn.close()
+
+    def write_markdown(self, dest: Path, markdown: Markdown) -> None:
+        """Write `markdown` to `dest` as a link to its shared blob.
+
+        A file already at `dest` is replaced rather than overwritten, so other
+        users' links to the blob are never modified. A temporary
+        `MarkdownFile` is moved into the store as the blob.
+        """
+        dest.unlink(missing_ok=True)
+        conn = self._connect()
+        try:
+            with conn:
+                for attempt in range(2):
+                    sha256, size, blob = self._store_blob(markdown)
+                    try:
+                        os.link(blob, dest)
+                        break
+                    except FileNotFoundError:
+                        # Released by a concurrent delete; write it again
+                        if attempt:
+                            raise
+                    except OSError:
+                        # No hard links here (e.g. another filesystem)
+                        shutil.copyfile(blob, dest)
+                        break
+                conn.execute(
+                    "INSERT OR IGNORE INTO blobs (sha256, size) VALUES (?, ?)",
+                    (sha256, size),
+                )
+                self._count(conn, "markdown_files")
+                self._count(conn, "markdown_bytes", size)
+        finally:
+            conn.close()
+
+    def release(self, sha256: Optional[str]) -> None:
+        """Account for a deleted user markdown file whose hash was `sha256`.
+
+        The blob, and the sources cached on it, are dropped once no user file
+        links it any more.
+        """
+        if not sha256:
+            return
+        blob = self._blob_path(sha256)
+        conn = self._connect()
+        try:
+            with conn:
+                row = conn.execute(
+                    "SELECT size FROM blobs WHERE sha256 = ?", (sha256,)
+                ).fetchone()
+                if row is None:
+                    # Written before the store existed
+                    return
+                self._count(conn, "markdown_files", -1)
+                self._count(conn, "markdown_bytes", -row["size"])
+                try:
+                    if blob.stat().st_nlink > 1:
+                        return
+                    blob.unlink()
+                except FileNotFoundError:
+                    pass
+                conn.execute("DELETE FROM sources WHERE markdown_sha256 = ?", (sha256,))
+                conn.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+        finally:
+            conn.close()
+
+    def stats(self) -> dict:
+        """Lookup/hit counts and the dedup ratio, overall and for storage."""
+        conn = self._connect()
+        try:
+            counters = {
+                row["name"]: row["value"]
+                for row in conn.execute("SELECT name, value FROM counters")
+            }
+            blobs = conn.execute(
+                "SELECT COUNT(*) AS n, COALESCE(SUM(size), 0) AS bytes FROM blobs"
+            ).fetchone()
+        finally:
+            conn.close()
+
+        stats = {}
+        for kind in ("file", "url"):
+            stats[f"{kind}_lookups"] = counters.get(f"{kind}_lookups", 0)
+            stats[f"{kind}_hits"] = counters.get(f"{kind}_hits", 0)
+        lookups = stats["file_lookups"] + stats["url_lookups"]
+        hits = stats["file_hits"] + stats["url_hits"]
+        markdown_bytes = counters.get("markdown_bytes", 0)
+        stats.update(
+            {
+                "dedup_ratio": round(hits / lookups, 4) if lookups else 0.0,
+                "markdown_files": counters.get("markdown_files", 0),
+                "markdown_bytes": markdown_bytes,
+                "blobs": blobs["n"],
+                "blob_bytes": blobs["bytes"],
+                # Share of the users' markdown bytes that share storage
+                "storage_dedup_ratio": (
+                    round(max(0.0, 1 - blobs["bytes"] / markdown_bytes), 4)
+                    if markdown_bytes
+                    else 0.0
+                ),
+            }
+        )
+        return stats
+
+
+_store: Optional[ContentStore] = None
+_store_lock = threading.Lock()
+
+
+def get_content_store() -> ContentStore:
+    """Return the process-wide content store."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ContentStore()
+        return _store
@@ -0,0 +1,299 @@
+"""Process pool that converts uploaded files to markdown outside the API process.
+
+MarkItDown conversion is CPU-bound, so running it on the request worker both
+serializes uploads and competes with the event loop. Files are instead
+converted on a bounded ``ProcessPoolExecutor`` whose workers run under an
+address-space limit, and each file gets a wall-clock timeout. A long
+recording is transcribed in rounds of concurrent segments and gets the
+timeout once per round. Workers stay up
+across files and import the converters when they start, so a file only pays
+for its own conversion.
+
+A running task cannot be cancelled inside a ``ProcessPoolExecutor``, so a
+timeout kills the pool's workers and starts a fresh pool; conversions that
+were running next to the stuck one are requeued. A worker that dies (for
+example by exceeding the memory limit) breaks the pool the same way, and the
+files it may have been converting are retried once.
+"""
+
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from .content_store import Markdown
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - non-POSIX
+    resource = None
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CONVERSION_WORKERS = int(
+    os.getenv("CONVERSION_WORKERS", str(min(4, os.cpu_count() or 1)))
+)
+# Seconds a single file may take to convert or transcribe (per round of
+# concurrent segments for long recordings)
+CONVERSION_TIMEOUT = float(os.getenv("CONVERSION_TIMEOUT", "600"))
+# Address-space limit per worker process (0 disables it)
+CONVERSION_MEMORY_LIMIT_MB = int(os.getenv("CONVERSION_MEMORY_LIMIT_MB", "4096"))
+# Import the converters when a worker starts instead of on its first file
+CONVERSION_PRELOAD = os.getenv("CONVERSION_PRELOAD", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+# Times a file is resubmitted after its worker died
+_MAX_RETRIES = 1
+
+
+def _init_worker(memory_limit_bytes: int, preload: bool = True) -> None:
+    if memory_limit_bytes and resource is not None:
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        limit = (
+            memory_limit_bytes
+            if hard == resource.RLIM_INFINITY
+            else min(hard, memory_limit_bytes)
+        )
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    if preload:
+        _preload()
+
+
+def _preload() -> None:
+    """Import the converters and build the MarkItDown instance up front.
+
+    Workers are long-lived, so this is paid once per worker at pool start
+    rather than on the first file each worker converts.
+    """
+    try:
+        from . import media_helper  # noqa: F401
+        from .file_helper import get_converter
+
+        get_converter()
+    except Exception:
+        # The file that needs the failing import reports the error itself
+        logger.warning("Failed to preload converters", exc_info=True)
+
+
+def _warm() -> None:
+    """No-op task that makes the pool start a worker process."""
+
+
+def _convert(path: str, media: bool) -> Markdown:
+    """Worker entry point: transcribe media or convert a document to markdown.
+
+    Very large documents are streamed to a markdown file next to the input,
+    and a `MarkdownFile` for it is returned instead of the text.
+    """
+    if media:
+        from .media_helper import transcribe_media
+
+        return transcribe_media(path)
+    from .stream_convert import should_stream, stream_to_markdown
+
+    if should_stream(Path(path)):
+        return stream_to_markdown(path)
+    from .file_helper import process_file
+
+    return process_file(path)
+
+
+class ConversionPool:
+    """Bounded process pool with per-file timeouts and memory-limited workers."""
+
+    def __init__(
+        self,
+        workers: int = CONVERSION_WORKERS,
+        timeout: float = CONVERSION_TIMEOUT,
+        memory_limit_mb: int = CONVERSION_MEMORY_LIMIT_MB,
+        preload: bool = CONVERSION_PRELOAD,
+    ):
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.memory_limit_bytes = max(0, memory_limit_mb) * 1024 * 1024
+        self.preload = preload
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._generation = 0
+        # Shared by every caller so a submitted file starts right away and its
+        # timeout measures conversion time rather than time spent queued
+        self._slots = threading.Semaphore(self.workers)
+
+    def _get_executor(self) -> Tuple[ProcessPoolExecutor, int]:
+        with self._lock:
+            if self._executor is None:
+                executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    # Forking a threaded server process is unsafe
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.memory_limit_bytes, self.preload),
+                )
+                # Start every worker up front so process startup and preloading
+                # are not counted against the first files' timeouts
+                wait([executor.submit(_warm) for _ in range(self.workers)])
+                self._executor = executor
+                self._generation += 1
+            return self._executor, self._generation
+
+    def _restart(self, generation: int) -> None:
+        """Kill the pool's workers if it is still the given generation."""
+        with self._lock:
+            if self._executor is None or generation != self._generation:
+                return
+            executor, self._executor = self._executor, None
+        logger.warning("Restarting conversion pool")
+        for process in list((getattr(executor, "_processes", None) or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _timeout_for(self, path: Path, media: bool) -> float:
+        if not media:
+            return self.timeout
+        from .media_helper import transcription_rounds
+
+        return self.timeout * transcription_rounds(str(path))
+
+    def convert(
+        self, items: Iterable[Tuple[Path, bool]]
+    ) -> Iterator[Tuple[Path, Optional[Markdown], Optional[BaseException]]]:
+        """Convert files concurrently, yielding results as each one finishes.
+
+        Args:
+            items: `(path, is_media)` pairs; media files are transcribed
+
+        Yields:
+            `(path, markdown, error)` in order of completion; exactly one of
+            markdown and error is None. The markdown of a streamed document
+            is a `MarkdownFile`.
+        """
+        queue = deque((Path(path), media, 0) for path, media in items)
+        # future -> (path, media, retries, timeout, deadline, pool generation);
+        # each entry holds one slot, released when the entry is dropped
+        running: dict = {}
+
+        def drop(future):
+            self._slots.release()
+            return running.pop(future)
+
+        while queue or running:
+            while queue and self._slots.acquire(blocking=not running):
+                path, media, retries = queue.popleft()
+                # Long recordings get the timeout once per round of segments
+                timeout = self._timeout_for(path, media)
+                generation = None
+                try:
+                    executor, generation = self._get_executor()
+                    future = executor.submit(_convert, str(path), media)
+                except (BrokenProcessPool, RuntimeError) as e:
+                    # The pool broke before the file started (e.g. workers
+                    # failing to start)
+                    self._slots.release()
+                    if generation is not None:
+                        self._restart(generation)
+                    else:
+                        self.close()
+                    if retries < _MAX_RETRIES:
+                        queue.appendleft((path, media, retries + 1))
+                    else:
+                        yield path, None, e
+                    continue
+                running[future] = (
+                    path,
+                    media,
+                    retries,
+                    timeout,
+                    time.monotonic() + timeout,
+                    generation,
+                )
+            if not running:
+                continue
+
+            next_deadline = min(info[4] for info in running.values())
+            done, _ = wait(
+                running,
+                timeout=max(0.0, next_deadline - time.monotonic()),
+                return_when=FIRST_COMPLETED,
+            )
+            for future in done:
+                path, media, retries, _, _, generation = drop(future)
+                try:
+                    yield path, future.result(), None
+                except BrokenProcessPool as e:
+                    self._restart(generation)
+                    if retries < _MAX_RETRIES:
+                        logger.warning(f"Conversion worker died; retrying {path.name}")
+                        queue.append((path, media, retries + 1))
+                    else:
+                        yield path, None, e
+                except Exception as e:
+                    yield path, None, e
+
+            now = time.monotonic()
+            expired = [
+                future
+                for future, info in running.items()
+                if info[4] <= now and not future.done()
+            ]
+            if not expired:
+                continue
+            killed = set()
+            for future in expired:
+                path, _, _, timeout, _, generation = drop(future)
+                killed.add(generation)
+                logger.error(f"Conversion of {path.name} timed out after {timeout:g}s")
+                yield path, None, TimeoutError(
+                    f"Conversion timed out after {timeout:g} seconds"
+                )
+            for generation in killed:
+                self._restart(generation)
+            # Innocent conversions on the killed pool start over without
+            # using up a retry
+            for future, (path, media, retries, _, _, generation) in list(
+                running.items()
+            ):
+                if generation in killed:
+                    drop(future)
+                    queue.appendleft((path, media, retries))
+
+    def close(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool: Optional[ConversionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_conversion_pool() -> ConversionPool:
+    """Return the process-wide conversion pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConversionPool()
+        return _pool
+
+
+def close_conversion_pool() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
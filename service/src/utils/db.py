@@ -1,7 +1,13 @@
+import copy
+import threading
+import time
 from google.cloud import firestore
-from typing import List
+from typing import Dict, List, Optional
 from datetime import datetime
 
+# Firestore accepts at most 500 writes per batch
+_MAX_BATCH_WRITES = 500
+
 
 class FirestoreHelper:
     def __init__(self):
@@ -76,3 +82,116 @@ class FirestoreHelper:
                 data["id"] = doc.id
             results.append(data)
         return results
+
+    def get_process_files(self, process_id: str) -> Optional[List[dict]]:
+        """Return the `files` array of a process, or None if it does not exist."""
+        doc = self.db.collection("processes").document(process_id).get()
+        if not doc.exists:
+            return None
+        return doc.to_dict().get("files", [])
+
+    def write_process_updates(self, updates: Dict[str, dict]) -> None:
+        """Apply field updates to several process documents in batched writes."""
+        items = list(updates.items())
+        for start in range(0, len(items), _MAX_BATCH_WRITES):
+            batch = self.db.batch()
+            for process_id, fields in items[start : start + _MAX_BATCH_WRITES]:
+                batch.update(self.db.collection("processes").document(process_id), fields)
+            batch.commit()
+
+
+class InMemoryProcessStore:
+    """Process store with the `FirestoreHelper` interface, kept in memory.
+
+    For tests and benchmarks. `latency` adds a delay to every call to mimic a
+    network round trip, and `round_trips` counts the calls.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.round_trips = 0
+        self.documents: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def _round_trip(self) -> None:
+        with self._lock:
+            self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def create_process_document(
+        self, process_id: str, files: List[str], user_id: str
+    ) -> None:
+        self._round_trip()
+        with self._lock:
+            self.documents[process_id] = {
+                "id": process_id,
+                "files": [{"old_name": file, "new_name": ""} for file in files],
+                "created_at": datetime.now(),
+                "updated_at": datetime.now(),
+                "finished_at": None,
+                "status": {"type": "processing", "message": ""},
+                "user_id": user_id,
+            }
+
+    def update_process_document(
+        self, process_id: str, status: str, message: str
+    ) -> None:
+        self.write_process_updates(
+            {
+                process_id: {
+                    "status": {"type": status, "message": message},
+                    "updated_at": datetime.now(),
+                }
+            }
+        )
+
+    def update_tuple_with_new_name(
+        self, process_id: str, old_name: str, new_name: str
+    ) -> None:
+        files = self.get_process_files(process_id)
+        if files is None:
+            return
+        files = [
+            {"old_name": old_name, "new_name": new_name}
+            if file.get("old_name") == old_name
+            else file
+            for file in files
+        ]
+        self.write_process_updates({process_id: {"files": files}})
+
+    def finish_process(self, process_id: str) -> None:
+        self.write_process_updates(
+            {
+                process_id: {
+                    "finished_at": datetime.now(),
+                    "status": {"type": "completed", "message": ""},
+                }
+            }
+        )
+
+    def get_latest_processes(self, user_id: str, limit: int = 5):
+        self._round_trip()
+        with self._lock:
+            documents = [
+                copy.deepcopy(doc)
+                for doc in self.documents.values()
+                if doc["user_id"] == user_id
+            ]
+        documents.sort(key=lambda doc: doc["created_at"], reverse=True)
+        return documents[:limit]
+
+    def get_process_files(self, process_id: str) -> Optional[List[dict]]:
+        self._round_trip()
+        with self._lock:
+            doc = self.documents.get(process_id)
+            return copy.deepcopy(doc["files"]) if doc is not None else None
+
+    def write_process_updates(self, updates: Dict[str, dict]) -> None:
+        self._round_trip()
+        with self._lock:
+            for process_id, fields in updates.items():
+                if process_id not in self.documents:
+                    # Firestore's update() fails on a missing document too
+                    raise KeyError(f"No process document {process_id}")
+                self.documents[process_id].update(copy.deepcopy(fields))
@@ -1,3 +1,4 @@
+import threading
 from pathlib import Path
 from typing import Optional, Set
 
@@ -17,6 +18,24 @@ ALLOWED_EXTENSIONS: Set[str] = {
 }
 
 
+_converter: Optional[MarkItDown] = None
+_converter_lock = threading.Lock()
+
+
+def get_converter() -> MarkItDown:
+    """Return the process-wide MarkItDown instance, creating it on first use.
+
+    Building a MarkItDown registers every converter (and probes their optional
+    dependencies), which costs more than converting a small file, so one
+    instance is reused for all conversions.
+    """
+    global _converter
+    with _converter_lock:
+        if _converter is None:
+            _converter = MarkItDown()
+        return _converter
+
+
 def _extract_markdown_from_result(result: object) -> Optional[str]:
     """Best-effort extraction of Markdown text from MarkItDown.convert result.
 
@@ -71,8 +90,7 @@ def process_file(file_path: str) -> str:
             f"Unsupported file type '.{ext}'. Supported: {', '.join(sorted(ALLOWED_EXTENSIONS))}"
         )
 
-    converter = MarkItDown()
-    conversion_result = converter.convert(str(path))
+    conversion_result = get_converter().convert(str(path))
 
     markdown = _extract_markdown_from_result(conversion_result)
     if not isinstance(markdown, str) or markdown.strip() == "":
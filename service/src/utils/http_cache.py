@@ -0,0 +1,332 @@
+"""Disk-backed HTTP cache for link fetching.
+
+Fetched pages are kept under ``uploads/.http_cache/`` with their ``ETag`` and
+``Last-Modified`` validators. A later fetch of the same URL is answered
+straight from disk while the response is still fresh according to
+``Cache-Control: max-age`` or ``Expires``. Otherwise it is sent as a
+conditional GET, so an unchanged page costs a 304 instead of a full download.
+
+The markdown converted from a cached page is stored next to it, which lets an
+unchanged page also skip the HTML-to-markdown conversion. Responses marked
+``no-store`` are not cached. The cache is bounded by ``HTTP_CACHE_MAX_MB`` and
+evicts least recently used pages first.
+
+The cache does not talk to the network itself: ``UrlFetcher.fetch`` (async)
+and ``url_helper.fetch_with_requests`` (sync) ask it for validators and hand
+back the responses.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Mapping, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Total size of cached pages and their markdown (0 disables the cache)
+HTTP_CACHE_MAX_MB = int(os.getenv("HTTP_CACHE_MAX_MB", "256"))
+
+# Uploads directory is one level up from project root (adjacent to project)
+HTTP_CACHE_DIR = (
+    Path(__file__).resolve().parents[3] / "uploads" / ".http_cache"
+)  # Go up 3 levels from src/utils/http_cache.py
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    fresh_until REAL,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access);
+"""
+
+
+def parse_cache_control(value: Optional[str]) -> dict:
+    """Parse a `Cache-Control` header into `{directive: value or True}`."""
+    directives = {}
+    for part in (value or "").split(","):
+        name, _, argument = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') if argument else True
+    return directives
+
+
+def _freshness_lifetime(headers: Mapping[str, str]) -> Optional[float]:
+    """Seconds the response may be served without revalidation, or None."""
+    directives = parse_cache_control(headers.get("cache-control"))
+    if "no-cache" in directives:
+        return 0.0
+    try:
+        age = float(headers.get("age") or 0)
+    except ValueError:
+        age = 0.0
+    if "max-age" in directives:
+        try:
+            return max(0.0, float(directives["max-age"]) - age)
+        except ValueError:
+            return 0.0
+    expires = headers.get("expires")
+    if expires:
+        try:
+            expires_at = parsedate_to_datetime(expires).timestamp()
+            date = headers.get("date")
+            now = parsedate_to_datetime(date).timestamp() if date else time.time()
+            return max(0.0, expires_at - now)
+        except (TypeError, ValueError):
+            # An invalid Expires means "already expired"
+            return 0.0
+    return None
+
+
+@dataclass
+class CacheEntry:
+    """Metadata of one cached page; the body is read with `HttpCache.read`."""
+
+    key: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fresh_until: Optional[float]
+
+    @property
+    def fresh(self) -> bool:
+        return self.fresh_until is not None and time.time() < self.fresh_until
+
+    def validators(self) -> dict:
+        """Headers that turn a re-fetch into a conditional GET."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class HttpCache:
+    """Size-bounded LRU cache of fetched pages and their converted markdown."""
+
+    def __init__(self, root: Path = HTTP_CACHE_DIR, max_mb: int = HTTP_CACHE_MAX_MB):
+        self.root = Path(root)
+        self.path = self.root / "index.sqlite3"
+        self.max_bytes = max(0, max_mb) * 1024 * 1024
+        self.enabled = self.max_bytes > 0
+
+    @staticmethod
+    def make_key(url: str, headers: Optional[Mapping[str, str]] = None) -> str:
+        """Key a request by URL and any per-request header overrides."""
+        digest = hashlib.sha256(url.encode("utf-8"))
+        if headers:
+            digest.update(json.dumps(sorted(headers.items())).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        self.root.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.path), timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def _body_path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.body"
+
+    def _markdown_path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.md"
+
+    @staticmethod
+    def _write(path: Path, text: str) -> int:
+        data = text.encode("utf-8")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        return len(data)
+
+    def lookup(
+        self, url: str, headers: Optional[Mapping[str, str]] = None
+    ) -> Optional[CacheEntry]:
+        """Return the cached entry for a request, marking it recently used."""
+        if not self.enabled:
+            return None
+        key = self.make_key(url, headers)
+        conn = self._connect()
+        try:
+            with conn:
+                row = conn.execute(
+                    "SELECT * FROM entries WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                conn.execute(
+                    "UPDATE entries SET last_access = ? WHERE key = ?",
+                    (time.time(), key),
+                )
+        finally:
+            conn.close()
+        return CacheEntry(key, row["etag"], row["last_modified"], row["fresh_until"])
+
+    def read(self, entry: CacheEntry) -> Optional[str]:
+        """Return the cached body, or None if it was evicted meanwhile."""
+        try:
+            return self._body_path(entry.key).read_text(encoding="utf-8")
+        except OSError:
+            return None
+
+    def store(
+        self,
+        url: str,
+        headers: Optional[Mapping[str, str]],
+        response_headers: Mapping[str, str],
+        body: str,
+    ) -> Optional[str]:
+        """Cache a 200 response; returns its key, or None if it was not cacheable.
+
+        Args:
+            url: The requested URL
+            headers: Per-request header overrides the request was sent with
+            response_headers: Response headers (case-insensitive mapping)
+            body: The decoded response body
+        """
+        if not self.enabled:
+            return None
+        directives = parse_cache_control(response_headers.get("cache-control"))
+        etag = response_headers.get("etag")
+        last_modified = response_headers.get("last-modified")
+        lifetime = _freshness_lifetime(response_headers)
+        if "no-store" in directives or not (etag or last_modified or lifetime):
+            # Nothing to revalidate with and no freshness: never reusable
+            return None
+
+        key = self.make_key(url, headers)
+        size = self._write(self._body_path(key), body)
+        # Markdown converted from an older version of the page
+        self._markdown_path(key).unlink(missing_ok=True)
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO entries (
+                        key, url, etag, last_modified, fresh_until, size,
+                        stored_at, last_access
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        key,
+                        url,
+                        etag,
+                        last_modified,
+                        now + lifetime if lifetime is not None else None,
+                        size,
+                        now,
+                        now,
+                    ),
+                )
+                self._evict(conn)
+        finally:
+            conn.close()
+        return key
+
+    def refresh(self, entry: CacheEntry, response_headers: Mapping[str, str]) -> None:
+        """Apply the headers of a 304 to a cached entry."""
+        if not self.enabled:
+            return
+        lifetime = _freshness_lifetime(response_headers)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    """
+                    UPDATE entries SET
+                        etag = COALESCE(?, etag),
+                        last_modified = COALESCE(?, last_modified),
+                        fresh_until = ?,
+                        last_access = ?
+                    WHERE key = ?
+                    """,
+                    (
+                        response_headers.get("etag"),
+                        response_headers.get("last-modified"),
+                        time.time() + lifetime if lifetime is not None else None,
+                        time.time(),
+                        entry.key,
+                    ),
+                )
+        finally:
+            conn.close()
+
+    def get_markdown(self, key: Optional[str]) -> Optional[str]:
+        """Markdown previously converted from the cached page `key`."""
+        if not key or not self.enabled:
+            return None
+        try:
+            return self._markdown_path(key).read_text(encoding="utf-8")
+        except OSError:
+            return None
+
+    def put_markdown(self, key: Optional[str], markdown: str) -> None:
+        """Store the markdown converted from the cached page `key`."""
+        if not key or not self.enabled:
+            return
+        conn = self._connect()
+        try:
+            with conn:
+                row = conn.execute(
+                    "SELECT size FROM entries WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return
+                body_path = self._body_path(key)
+                size = body_path.stat().st_size if body_path.exists() else 0
+                size += self._write(self._markdown_path(key), markdown)
+                conn.execute("UPDATE entries SET size = ? WHERE key = ?", (size, key))
+                self._evict(conn)
+        finally:
+            conn.close()
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """Drop least recently used entries until the cache fits its bound."""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for row in conn.execute(
+            "SELECT key, size FROM entries ORDER BY last_access"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM entries WHERE key = ?", (row["key"],))
+            self._body_path(row["key"]).unlink(missing_ok=True)
+            self._markdown_path(row["key"]).unlink(missing_ok=True)
+            total -= row["size"]
+
+
+_cache: Optional[HttpCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_http_cache() -> HttpCache:
+    """Return the process-wide HTTP cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = HttpCache()
+        return _cache
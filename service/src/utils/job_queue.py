@@ -0,0 +1,413 @@
+"""Persistent queue of ingestion jobs.
+
+``/upload``, ``/process-urls`` and ``/upload-single-link`` enqueue a job per
+process instead of running the work in the request process. Each job holds
+one item per uploaded file or URL. Workers (see ``job_worker.py``) claim a
+job together with its due items under a lease, and record each item's outcome
+as soon as it is known.
+
+- Completed items are never run again, so a job interrupted by a restart or a
+  crash resumes with only the items that were not finished. Its lease
+  expires and another worker claims it.
+- A failed item is retried with exponential backoff until it has been
+  attempted ``JOB_MAX_ATTEMPTS`` times. Attempts are counted when an item is
+  claimed, so an item that keeps crashing its worker also runs out.
+
+The backend is chosen with ``JOB_QUEUE_BACKEND``. The local ``sqlite``
+backend keeps the queue in ``uploads/.jobs/queue.sqlite3``. Another backend
+needs the methods of ``SqliteJobQueue``: ``enqueue``, ``claim``,
+``heartbeat``, ``complete_item``, ``fail_item``, ``release`` and ``stats``.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE_BACKEND", "sqlite")
+# Times an item is attempted before it is given up on
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Delay before the first retry, doubled for each further one (seconds)
+JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", "30"))
+JOB_RETRY_BACKOFF_MAX = float(os.getenv("JOB_RETRY_BACKOFF_MAX", "900"))
+# A job whose worker stops renewing its lease is resumed by another worker
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+
+# Uploads directory is one level up from project root (adjacent to project)
+JOBS_DIR = (
+    Path(__file__).resolve().parents[3] / "uploads" / ".jobs"
+)  # Go up 3 levels from src/utils/job_queue.py
+
+JOB_KINDS = ("files", "links")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    process_id TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+CREATE TABLE IF NOT EXISTS items (
+    job_id INTEGER NOT NULL,
+    idx INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    PRIMARY KEY (job_id, idx)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS items_due ON items (status, next_attempt_at);
+"""
+
+
+@dataclass
+class JobItem:
+    index: int
+    payload: dict
+    # Including the attempt that is starting now
+    attempts: int
+
+    @property
+    def last_attempt(self) -> bool:
+        return self.attempts >= JOB_MAX_ATTEMPTS
+
+
+@dataclass
+class Job:
+    id: int
+    process_id: str
+    kind: str
+    user_id: str
+    # Only the items due now; completed and waiting ones are left out. Empty
+    # when nothing is left to run and the job only needs finishing.
+    items: List[JobItem] = field(default_factory=list)
+
+
+def retry_delay(attempts: int) -> float:
+    """Backoff before the next attempt after `attempts` failed ones (with jitter)."""
+    delay = min(JOB_RETRY_BACKOFF * 2 ** max(0, attempts - 1), JOB_RETRY_BACKOFF_MAX)
+    return delay * random.uniform(0.9, 1.1)
+
+
+class SqliteJobQueue:
+    """Job queue in a local SQLite database shared by the API and workers."""
+
+    def __init__(
+        self,
+        path: Path = JOBS_DIR / "queue.sqlite3",
+        max_attempts: int = JOB_MAX_ATTEMPTS,
+        lease_seconds: float = JOB_LEASE_SECONDS,
+    ):
+        self.path = Path(path)
+        self.max_attempts = max(1, max_attempts)
+        self.lease_seconds = lease_seconds
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Transactions are managed explicitly so claims can take the write
+        # lock up front
+        conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def _write(self, fn):
+        """Run `fn(conn)` in an immediate transaction and return its result."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(conn)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            return result
+        finally:
+            conn.close()
+
+    def enqueue(self, process_id: str, kind: str, user_id: str, items: List[dict]) -> None:
+        """Add a job with one item per file or URL.
+
+        Enqueuing a process id that is already queued does nothing.
+
+        Args:
+            process_id: The Firestore process the job reports to
+            kind: "files" or "links"
+            user_id: Owner of the content
+            items: JSON-serializable payload of each item
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind '{kind}'. Expected one of {JOB_KINDS}")
+
+        def insert(conn):
+            now = time.time()
+            cursor = conn.execute(
+                """
+                INSERT OR IGNORE INTO jobs (
+                    process_id, kind, user_id, status, created_at, updated_at
+                ) VALUES (?, ?, ?, 'queued', ?, ?)
+                """,
+                (process_id, kind, user_id, now, now),
+            )
+            if not cursor.rowcount:
+                return
+            conn.executemany(
+                """
+                INSERT INTO items (job_id, idx, payload, status, next_attempt_at)
+                VALUES (?, ?, ?, 'pending', ?)
+                """,
+                [
+                    (cursor.lastrowid, idx, json.dumps(payload), now)
+                    for idx, payload in enumerate(items)
+                ],
+            )
+
+        self._write(insert)
+
+    def claim(self, owner: str) -> Optional[Job]:
+        """Lease the oldest job with due items to `owner`.
+
+        Jobs that are queued, or whose previous worker's lease ran out, are
+        eligible. Items that have used up their attempts are failed here. If
+        that leaves nothing to run or wait for, or the previous worker stopped
+        after the last item but before releasing the job, the job is still
+        returned, with no items, so the worker finishes the process.
+        """
+
+        def claim(conn):
+            now = time.time()
+            while True:
+                row = conn.execute(
+                    """
+                    SELECT j.* FROM jobs j
+                    WHERE (j.status = 'queued'
+                           OR (j.status = 'running' AND j.lease_expires < ?))
+                      AND (
+                          EXISTS (
+                              SELECT 1 FROM items i
+                              WHERE i.job_id = j.id AND i.status = 'pending'
+                                AND i.next_attempt_at <= ?
+                          )
+                          -- Its worker stopped after the last item, before
+                          -- finishing the process
+                          OR NOT EXISTS (
+                              SELECT 1 FROM items i
+                              WHERE i.job_id = j.id AND i.status = 'pending'
+                          )
+                      )
+                    ORDER BY j.id
+                    LIMIT 1
+                    """,
+                    (now, now),
+                ).fetchone()
+                if row is None:
+                    return None
+                conn.execute(
+                    """
+                    UPDATE items SET status = 'failed',
+                        last_error = COALESCE(last_error, 'Worker stopped during the last attempt')
+                    WHERE job_id = ? AND status = 'pending' AND attempts >= ?
+                    """,
+                    (row["id"], self.max_attempts),
+                )
+                items = conn.execute(
+                    """
+                    SELECT idx, payload, attempts FROM items
+                    WHERE job_id = ? AND status = 'pending' AND next_attempt_at <= ?
+                    ORDER BY idx
+                    """,
+                    (row["id"], now),
+                ).fetchall()
+                if not items and conn.execute(
+                    "SELECT 1 FROM items WHERE job_id = ? AND status = 'pending'",
+                    (row["id"],),
+                ).fetchone():
+                    # Only items waiting for a retry are left
+                    self._settle(conn, row["id"])
+                    continue
+                conn.execute(
+                    "UPDATE items SET attempts = attempts + 1 "
+                    "WHERE job_id = ? AND status = 'pending' AND next_attempt_at <= ?",
+                    (row["id"], now),
+                )
+                conn.execute(
+                    """
+                    UPDATE jobs SET status = 'running', lease_owner = ?,
+                        lease_expires = ?, updated_at = ?
+                    WHERE id = ?
+                    """,
+                    (owner, now + self.lease_seconds, now, row["id"]),
+                )
+                return Job(
+                    row["id"],
+                    row["process_id"],
+                    row["kind"],
+                    row["user_id"],
+                    [
+                        JobItem(item["idx"], json.loads(item["payload"]), item["attempts"] + 1)
+                        for item in items
+                    ],
+                )
+
+        return self._write(claim)
+
+    def heartbeat(self, job_id: int, owner: str) -> bool:
+        """Extend a lease; returns False if `owner` no longer holds it."""
+
+        def renew(conn):
+            cursor = conn.execute(
+                """
+                UPDATE jobs SET lease_expires = ?
+                WHERE id = ? AND lease_owner = ? AND status = 'running'
+                """,
+                (time.time() + self.lease_seconds, job_id, owner),
+            )
+            return cursor.rowcount == 1
+
+        return self._write(renew)
+
+    def complete_item(self, job_id: int, index: int) -> None:
+        self._write(
+            lambda conn: conn.execute(
+                "UPDATE items SET status = 'done', last_error = NULL "
+                "WHERE job_id = ? AND idx = ?",
+                (job_id, index),
+            )
+        )
+
+    def fail_item(self, job_id: int, index: int, error: str) -> bool:
+        """Record a failed attempt; returns whether the item will be retried."""
+
+        def fail(conn):
+            row = conn.execute(
+                "SELECT attempts FROM items WHERE job_id = ? AND idx = ?",
+                (job_id, index),
+            ).fetchone()
+            if row is None:
+                return False
+            retry = row["attempts"] < self.max_attempts
+            conn.execute(
+                """
+                UPDATE items SET status = ?, last_error = ?, next_attempt_at = ?
+                WHERE job_id = ? AND idx = ?
+                """,
+                (
+                    "pending" if retry else "failed",
+                    error,
+                    time.time() + retry_delay(row["attempts"]),
+                    job_id,
+                    index,
+                ),
+            )
+            return retry
+
+        return self._write(fail)
+
+    def _settle(self, conn: sqlite3.Connection, job_id: int) -> bool:
+        """Mark a job done if no items are pending, else queue it again."""
+        pending = conn.execute(
+            "SELECT COUNT(*) FROM items WHERE job_id = ? AND status = 'pending'",
+            (job_id,),
+        ).fetchone()[0]
+        conn.execute(
+            """
+            UPDATE jobs SET status = ?, lease_owner = NULL, lease_expires = NULL,
+                updated_at = ?
+            WHERE id = ?
+            """,
+            ("queued" if pending else "done", time.time(), job_id),
+        )
+        return not pending
+
+    def release(self, job_id: int, owner: str) -> bool:
+        """Give up the lease after a run; returns True once the job is done."""
+
+        def release(conn):
+            row = conn.execute(
+                "SELECT lease_owner FROM jobs WHERE id = ? AND status = 'running'",
+                (job_id,),
+            ).fetchone()
+            if row is None or row["lease_owner"] != owner:
+                # The lease expired and another worker took over
+                return False
+            return self._settle(conn, job_id)
+
+        return self._write(release)
+
+    def stats(self) -> dict:
+        """Queue depth: jobs and items per status, and the oldest waiting job."""
+        conn = self._connect()
+        try:
+            jobs = {
+                row["status"]: row["n"]
+                for row in conn.execute(
+                    "SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"
+                )
+            }
+            items = {
+                row["status"]: row["n"]
+                for row in conn.execute(
+                    "SELECT status, COUNT(*) AS n FROM items GROUP BY status"
+                )
+            }
+            due = conn.execute(
+                "SELECT COUNT(*) FROM items WHERE status = 'pending' AND next_attempt_at <= ?",
+                (time.time(),),
+            ).fetchone()[0]
+            oldest = conn.execute(
+                "SELECT MIN(created_at) FROM jobs WHERE status IN ('queued', 'running')"
+            ).fetchone()[0]
+        finally:
+            conn.close()
+        return {
+            "jobs": {status: jobs.get(status, 0) for status in ("queued", "running", "done")},
+            "items": {
+                status: items.get(status, 0) for status in ("pending", "done", "failed")
+            },
+            "items_due": due,
+            "oldest_active_job_age": round(time.time() - oldest, 1) if oldest else 0.0,
+        }
+
+
+_BACKENDS = {"sqlite": SqliteJobQueue}
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Return the process-wide job queue for `JOB_QUEUE_BACKEND`."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            backend = _BACKENDS.get(JOB_QUEUE_BACKEND)
+            if backend is None:
+                raise ValueError(
+                    f"Unknown JOB_QUEUE_BACKEND '{JOB_QUEUE_BACKEND}'. "
+                    f"Expected one of {sorted(_BACKENDS)}"
+                )
+            _queue = backend()
+        return _queue
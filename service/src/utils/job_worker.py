@@ -0,0 +1,207 @@
+"""Workers that run queued ingestion jobs.
+
+By default the API process runs ``JOB_WORKERS`` embedded workers
+(``JOB_EMBEDDED_WORKERS=true``). Set it to false to run the workers in
+separate processes instead, started with ``python -m src.worker`` from the
+``service`` directory. Any number of processes can share the queue.
+
+A worker leases a job and processes its due items. While the job runs, the
+worker renews the lease. Each item's outcome is recorded as soon as the batch
+returns. Once no items are left the Firestore process is marked finished. If
+the worker stops mid-job, the lease lapses and another worker resumes the job
+with the unfinished items.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from .db import FirestoreHelper
+from .job_queue import Job, get_job_queue
+from .media_helper import clear_segment_caches
+from .process_helper import ProcessHelper
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Jobs run concurrently by one worker process
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_EMBEDDED_WORKERS = os.getenv("JOB_EMBEDDED_WORKERS", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+# Seconds between queue polls when idle
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "2"))
+
+
+class JobWorker:
+    """Claims jobs from the queue and runs up to `concurrency` of them at a time."""
+
+    def __init__(
+        self,
+        db: FirestoreHelper,
+        concurrency: int = JOB_WORKERS,
+        poll_interval: float = JOB_POLL_INTERVAL,
+    ):
+        self.queue = get_job_queue()
+        self.helper = ProcessHelper(db)
+        self.db = db
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._tasks: set = set()
+
+    def notify(self) -> None:
+        """Wake the worker because a job was just enqueued."""
+        self._wake.set()
+
+    async def run(self) -> None:
+        slots = asyncio.Semaphore(self.concurrency)
+        logger.info(f"Job worker {self.owner} started with {self.concurrency} slots")
+        while not self._stopping:
+            await slots.acquire()
+            if self._stopping:
+                break
+            # Cleared before claiming so a job enqueued meanwhile is not missed
+            self._wake.clear()
+            try:
+                job = await asyncio.to_thread(self.queue.claim, self.owner)
+            except Exception:
+                logger.exception("Failed to claim a job")
+                job = None
+            if job is None:
+                slots.release()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            task = asyncio.create_task(self._process(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            task.add_done_callback(lambda _: slots.release())
+
+    async def _heartbeat(self, job: Job) -> None:
+        while True:
+            await asyncio.sleep(self.queue.lease_seconds / 3)
+            if not await asyncio.to_thread(self.queue.heartbeat, job.id, self.owner):
+                logger.warning(f"Lost the lease on job {job.process_id}")
+                return
+
+    async def _process(self, job: Job) -> None:
+        extra = {"process_id": job.process_id, "user_id": job.user_id}
+        logger.info(
+            f"Running {job.kind} job {job.process_id} with {len(job.items)} items",
+            extra=extra,
+        )
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            if not job.items:
+                # Nothing left to run; only finish the process
+                outcomes, keys = {}, []
+            elif job.kind == "files":
+                payloads = [item.payload for item in job.items]
+                outcomes = await asyncio.to_thread(
+                    self.helper.process_files, job.process_id, job.user_id, payloads
+                )
+                keys = [item.payload["path"] for item in job.items]
+            else:
+                urls = [item.payload["url"] for item in job.items]
+                outcomes = await self.helper.process_links(
+                    job.process_id,
+                    job.user_id,
+                    urls,
+                    retry_fetch_errors={
+                        item.payload["url"] for item in job.items if not item.last_attempt
+                    },
+                )
+                keys = urls
+            for item, key in zip(job.items, keys):
+                error = outcomes.get(key, "No result")
+                if error is None:
+                    await asyncio.to_thread(self.queue.complete_item, job.id, item.index)
+                elif await asyncio.to_thread(
+                    self.queue.fail_item, job.id, item.index, error
+                ):
+                    logger.warning(
+                        f"Item {item.index} of job {job.process_id} failed "
+                        f"(attempt {item.attempts}); will retry",
+                        extra=extra,
+                    )
+        except Exception as e:
+            # Failures of the whole batch count against every item
+            logger.exception(f"Job {job.process_id} failed", extra=extra)
+            for item in job.items:
+                await asyncio.to_thread(
+                    self.queue.fail_item, job.id, item.index, f"{type(e).__name__}: {e}"
+                )
+        finally:
+            heartbeat.cancel()
+
+        if await asyncio.to_thread(self.queue.release, job.id, self.owner):
+            await asyncio.to_thread(self.db.finish_process, job.process_id)
+            if job.kind == "files":
+                # Per-process upload dir, empty once every file was stored
+                processing_dir = (
+                    self.helper._get_user_directories(job.user_id)["processing_dir"]
+                    / job.process_id
+                )
+                # Recordings that never succeeded leave finished segments
+                clear_segment_caches(processing_dir)
+                try:
+                    processing_dir.rmdir()
+                except OSError:
+                    pass
+            logger.info(f"Job {job.process_id} completed", extra=extra)
+
+    async def stop(self) -> None:
+        """Stop claiming jobs and cancel running ones.
+
+        Cancelled jobs keep their lease until it lapses and are then resumed
+        by any worker, since a file batch may still be running in a thread.
+        """
+        self._stopping = True
+        self._wake.set()
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+_worker: Optional[JobWorker] = None
+_worker_task: Optional[asyncio.Task] = None
+
+
+def start_job_workers(db: FirestoreHelper) -> None:
+    """Run embedded workers in the API process unless disabled."""
+    global _worker, _worker_task
+    if not JOB_EMBEDDED_WORKERS or _worker is not None:
+        return
+    _worker = JobWorker(db)
+    _worker_task = asyncio.create_task(_worker.run())
+
+
+def notify_job_workers() -> None:
+    """Let the embedded workers pick up a new job without waiting for a poll."""
+    if _worker is not None:
+        _worker.notify()
+
+
+async def close_job_workers() -> None:
+    global _worker, _worker_task
+    if _worker is None:
+        return
+    worker, task, _worker, _worker_task = _worker, _worker_task, None, None
+    await worker.stop()
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
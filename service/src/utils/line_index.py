@@ -0,0 +1,113 @@
+"""Line-offset index for slicing large text files without reading them whole.
+
+The first ranged read of a file scans it once in binary to record the byte
+offset at which every line starts; later reads of any line range seek straight
+to it, so a slice costs O(slice) rather than O(file). Offsets are kept in a
+small in-memory LRU keyed by path, size and mtime, which lives as long as the
+(pooled) tool server process.
+"""
+
+from __future__ import annotations
+
+import threading
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Tuple
+
+LINE_INDEX_CACHE_SIZE = 256
+_READ_BLOCK = 1 << 20
+
+_cache: "OrderedDict[tuple, array]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_line_offsets(path: Path) -> array:
+    """Return byte offsets of each line start, plus the file size as a sentinel.
+
+    ``offsets[i]`` is where line ``i + 1`` starts and ``offsets[-1]`` is the
+    file size, so the file has ``len(offsets) - 1`` lines.
+    """
+    stat = path.stat()
+    key = (str(path), stat.st_size, stat.st_mtime_ns)
+    with _cache_lock:
+        offsets = _cache.get(key)
+        if offsets is not None:
+            _cache.move_to_end(key)
+            return offsets
+
+    offsets = array("q", [0])
+    position = 0
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(_READ_BLOCK)
+            if not block:
+                break
+            start = 0
+            while True:
+                newline = block.find(b"\n", start)
+                if newline == -1:
+                    break
+                offsets.append(position + newline + 1)
+                start = newline + 1
+            position += len(block)
+    if offsets[-1] != position:
+        # Last line has no trailing newline
+        offsets.append(position)
+
+    with _cache_lock:
+        _cache[key] = offsets
+        while len(_cache) > LINE_INDEX_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return offsets
+
+
+def read_lines(
+    path: Path, start_line: int, end_line: int, max_bytes: int
+) -> Tuple[bytes, int, int, int, int]:
+    """Read lines ``start_line..end_line`` (1-based, inclusive), capped at max_bytes.
+
+    The cap is applied on a line boundary unless a single line exceeds it.
+
+    Returns:
+        ``(data, first_line, last_line, total_lines, end_offset)`` where
+        ``last_line`` is the last complete line returned and ``end_offset`` is
+        the byte offset just past ``data``. When ``first_line`` alone exceeds
+        the cap, ``data`` holds its start and ``last_line`` is ``first_line - 1``.
+    """
+    offsets = get_line_offsets(path)
+    total_lines = len(offsets) - 1
+    first = max(1, start_line)
+    last = min(end_line, total_lines)
+    if first > last:
+        return b"", first, first - 1, total_lines, offsets[min(first, total_lines + 1) - 1]
+
+    begin = offsets[first - 1]
+    end = offsets[last]
+    if end - begin > max_bytes:
+        # Largest line index whose end still fits under the cap
+        limit = begin + max_bytes
+        lo, hi = first, last
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if offsets[mid] <= limit:
+                lo = mid
+            else:
+                hi = mid - 1
+        if offsets[lo] <= limit:
+            last, end = lo, offsets[lo]
+        else:
+            last, end = first - 1, limit
+
+    with open(path, "rb") as f:
+        f.seek(begin)
+        data = f.read(end - begin)
+    return data, first, last, total_lines, end
+
+
+def read_bytes(path: Path, offset: int, length: int) -> Tuple[bytes, int]:
+    """Read ``length`` bytes starting at ``offset``; returns ``(data, file_size)``."""
+    size = path.stat().st_size
+    with open(path, "rb") as f:
+        f.seek(max(0, offset))
+        return f.read(max(0, length)), size
@@ -0,0 +1,68 @@
+import os
+from typing import Optional
+
+import httpx
+from cerebras.cloud.sdk import AsyncCerebras
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+
+load_dotenv()
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
+# Connection pool shared by every request on this worker
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+
+_openrouter_client: Optional[AsyncOpenAI] = None
+_cerebras_client: Optional[AsyncCerebras] = None
+
+
+def _http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+        ),
+        timeout=httpx.Timeout(LLM_TIMEOUT, connect=10.0),
+    )
+
+
+def get_openrouter_client() -> AsyncOpenAI:
+    """Return the shared async OpenRouter client used by the search agents."""
+    global _openrouter_client
+    if _openrouter_client is None:
+        _openrouter_client = AsyncOpenAI(
+            base_url=OPENROUTER_BASE_URL,
+            api_key=os.environ.get("OPENROUTER_API_KEY"),
+            http_client=_http_client(),
+        )
+    return _openrouter_client
+
+
+def get_cerebras_client() -> AsyncCerebras:
+    """Return the shared async Cerebras client used for synthesis."""
+    global _cerebras_client
+    if _cerebras_client is None:
+        _cerebras_client = AsyncCerebras(
+            api_key=os.environ.get("CEREBRAS_API_KEY"),
+            http_client=_http_client(),
+        )
+    return _cerebras_client
+
+
+def start_llm_clients() -> None:
+    """Create the shared clients up front so the first search doesn't pay for it."""
+    get_openrouter_client()
+    get_cerebras_client()
+
+
+async def close_llm_clients() -> None:
+    global _openrouter_client, _cerebras_client
+    if _openrouter_client is not None:
+        await _openrouter_client.close()
+        _openrouter_client = None
+    if _cerebras_client is not None:
+        await _cerebras_client.close()
+        _cerebras_client = None
@@ -1,10 +1,270 @@
+"""Audio/video transcription.
+
+Short recordings are sent to the transcription model in a single request.
+Longer ones (over ``TRANSCRIBE_CHUNK_SECONDS``, or over the API's upload size
+limit) are handled in segments:
+
+- The recording is split into segments that overlap by
+  ``TRANSCRIBE_CHUNK_OVERLAP`` seconds. Each segment is decoded on its own,
+  as 16 kHz mono, so memory stays bounded however long the recording is.
+- Up to ``TRANSCRIBE_CONCURRENCY`` segments are transcribed at once, and a
+  failed segment is retried on its own.
+- Finished segments are kept next to the upload until the whole file
+  succeeds, so rerunning a failed file only transcribes the segments that
+  are missing. The job worker clears what a file that never succeeded left
+  behind (``clear_segment_caches``).
+- The texts are stitched with the words repeated in each overlap removed.
+  Every segment starts with its ``[HH:MM:SS]`` offset into the recording.
+
+``TRANSCRIBER=local`` swaps the API for ``LocalTranscriber``, which needs no
+network or API key, so the pipeline can be run offline.
+"""
+
+import logging
+import math
+import os
+import re
+import shutil
+import subprocess
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
 from pathlib import Path
-from openai import OpenAI
+from typing import List, Optional, Tuple
+
 from dotenv import load_dotenv
+from pydub import AudioSegment
+from pydub.utils import mediainfo
 
 load_dotenv()
 
-client = OpenAI()
+logger = logging.getLogger(__name__)
+
+# "openai" (gpt-4o-mini-transcribe) or "local" (offline stand-in)
+TRANSCRIBER = os.getenv("TRANSCRIBER", "openai")
+TRANSCRIBE_MODEL = os.getenv("TRANSCRIBE_MODEL", "gpt-4o-mini-transcribe")
+TRANSCRIBE_CHUNK_SECONDS = float(os.getenv("TRANSCRIBE_CHUNK_SECONDS", "600"))
+TRANSCRIBE_CHUNK_OVERLAP = float(os.getenv("TRANSCRIBE_CHUNK_OVERLAP", "5"))
+TRANSCRIBE_CONCURRENCY = int(os.getenv("TRANSCRIBE_CONCURRENCY", "4"))
+# Retries of a failed segment before the file fails
+TRANSCRIBE_MAX_RETRIES = int(os.getenv("TRANSCRIBE_MAX_RETRIES", "2"))
+
+# The transcription API rejects uploads above 25 MB
+_MAX_UPLOAD_BYTES = 25 * 1024 * 1024
+# Segments are decoded to 16 kHz mono and uploaded as 64 kbps mp3
+_SAMPLE_RATE = 16000
+_DECODE_PARAMETERS = ["-ac", "1", "-ar", str(_SAMPLE_RATE)]
+# Longest run of words looked for when stitching overlapping segments
+_MAX_OVERLAP_WORDS = 60
+
+
+class OpenAITranscriber:
+    """Transcribes through the OpenAI audio API."""
+
+    def __init__(self, model: str = TRANSCRIBE_MODEL):
+        from openai import OpenAI
+
+        self.model = model
+        self.client = OpenAI()
+
+    def transcribe_file(self, path: Path, response_format: str = "text") -> str:
+        with path.open("rb") as f:
+            resp = self.client.audio.transcriptions.create(
+                model=self.model, file=f, response_format=response_format
+            )
+        if isinstance(resp, str):
+            return resp
+        return getattr(resp, "text", str(resp))
+
+    def transcribe_segment(self, segment: AudioSegment, start: float = 0.0) -> str:
+        buffer = BytesIO()
+        segment.export(buffer, format="mp3", bitrate="64k")
+        buffer.name = "segment.mp3"
+        buffer.seek(0)
+        resp = self.client.audio.transcriptions.create(
+            model=self.model, file=buffer, response_format="text"
+        )
+        if isinstance(resp, str):
+            return resp
+        return getattr(resp, "text", str(resp))
+
+
+class LocalTranscriber:
+    """Offline stand-in that names the seconds of audio instead of transcribing them.
+
+    The text of a segment is one word per second of audio, named after the
+    absolute second, so overlapping segments share words exactly like real
+    transcripts of the same speech do.
+    """
+
+    def transcribe_file(self, path: Path, response_format: str = "text") -> str:
+        return self.transcribe_segment(AudioSegment.from_file(str(path)))
+
+    def transcribe_segment(self, segment: AudioSegment, start: float = 0.0) -> str:
+        first = int(round(start))
+        seconds = int(round(segment.duration_seconds))
+        return " ".join(f"second{first + i}" for i in range(seconds))
+
+
+def get_transcriber():
+    if TRANSCRIBER == "openai":
+        return OpenAITranscriber()
+    if TRANSCRIBER == "local":
+        return LocalTranscriber()
+    raise ValueError(f"Unknown TRANSCRIBER '{TRANSCRIBER}'. Expected 'openai' or 'local'")
+
+
+def _duration(path: Path) -> Optional[float]:
+    """Length of a recording in seconds, or None if it cannot be probed."""
+    try:
+        if path.suffix.lower() == ".wav":
+            with wave.open(str(path), "rb") as f:
+                return f.getnframes() / float(f.getframerate())
+        return float(mediainfo(str(path))["duration"])
+    except Exception:
+        # Needs ffprobe for anything but wav
+        logger.warning(f"Could not determine the duration of {path.name}", exc_info=True)
+        return None
+
+
+def _load_segment(path: Path, start: float, length: float) -> AudioSegment:
+    """Decode `length` seconds of a recording from `start`, as 16 kHz mono."""
+    if path.suffix.lower() == ".wav":
+        # pydub would decode the whole file and slice it, ignoring the
+        # parameters; only the segment's frames are read here
+        try:
+            with wave.open(str(path), "rb") as f:
+                rate = f.getframerate()
+                f.setpos(min(int(start * rate), f.getnframes()))
+                segment = AudioSegment(
+                    data=f.readframes(int(length * rate)),
+                    sample_width=f.getsampwidth(),
+                    frame_rate=rate,
+                    channels=f.getnchannels(),
+                )
+            return segment.set_channels(1).set_frame_rate(_SAMPLE_RATE)
+        except wave.Error:
+            # Not PCM (e.g. float samples): decode just the range with ffmpeg
+            command = [AudioSegment.converter, "-v", "error"]
+            command += ["-ss", str(start), "-t", str(length), "-i", str(path)]
+            command += _DECODE_PARAMETERS + ["-f", "s16le", "-"]
+            data = subprocess.run(command, capture_output=True, check=True).stdout
+            return AudioSegment(
+                data=data, sample_width=2, frame_rate=_SAMPLE_RATE, channels=1
+            )
+    return AudioSegment.from_file(
+        str(path), parameters=_DECODE_PARAMETERS, start_second=start, duration=length
+    )
+
+
+def _segments(duration: float, chunk: float, overlap: float) -> List[Tuple[float, float]]:
+    """`(start, length)` of overlapping segments covering `duration` seconds."""
+    step = max(1.0, chunk - overlap)
+    segments = []
+    start = 0.0
+    while True:
+        length = min(chunk, duration - start)
+        segments.append((start, length))
+        if start + length >= duration:
+            return segments
+        start += step
+
+
+def _timestamp(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def _words(text: str) -> List[str]:
+    return [re.sub(r"[^\w']", "", word).lower() for word in text.split()]
+
+
+def stitch(texts: List[str]) -> List[str]:
+    """Drop from each text the leading words repeated from the end of the previous one."""
+    stitched = []
+    previous: List[str] = []
+    for text in texts:
+        raw = text.split()
+        words = _words(text)
+        limit = min(len(previous), len(words), _MAX_OVERLAP_WORDS)
+        for k in range(limit, 0, -1):
+            if previous[-k:] == words[:k]:
+                raw = raw[k:]
+                break
+        stitched.append(" ".join(raw))
+        previous = words
+    return stitched
+
+
+def _segment_cache_dir(path: Path) -> Path:
+    return path.parent / f".{path.name}.segments"
+
+
+def clear_segment_caches(directory: Path) -> None:
+    """Remove the finished-segment caches of every recording in `directory`."""
+    for cache_dir in Path(directory).glob(".*.segments"):
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def transcription_rounds(path: str) -> int:
+    """How many times over a recording fills the segment concurrency.
+
+    Short recordings, and ones that cannot be probed, count as one.
+    """
+    duration = _duration(Path(path))
+    if duration is None or duration <= TRANSCRIBE_CHUNK_SECONDS:
+        return 1
+    segments = _segments(duration, TRANSCRIBE_CHUNK_SECONDS, TRANSCRIBE_CHUNK_OVERLAP)
+    return math.ceil(len(segments) / max(1, TRANSCRIBE_CONCURRENCY))
+
+
+def _transcribe_chunked(path: Path, duration: float, transcriber) -> str:
+    segments = _segments(duration, TRANSCRIBE_CHUNK_SECONDS, TRANSCRIBE_CHUNK_OVERLAP)
+    # Finished segments survive a failed run of the file
+    cache_dir = _segment_cache_dir(path)
+    cache_dir.mkdir(exist_ok=True)
+    logger.info(f"Transcribing {path.name} ({duration:.0f}s) in {len(segments)} segments")
+
+    def transcribe(index: int) -> str:
+        start, length = segments[index]
+        cached = cache_dir / f"{index}-{start:.0f}-{length:.0f}.txt"
+        if cached.exists():
+            return cached.read_text(encoding="utf-8")
+        for attempt in range(TRANSCRIBE_MAX_RETRIES + 1):
+            try:
+                segment = _load_segment(path, start, length)
+                text = transcriber.transcribe_segment(segment, start)
+                cached.write_text(text, encoding="utf-8")
+                return text
+            except Exception:
+                if attempt == TRANSCRIBE_MAX_RETRIES:
+                    raise
+                logger.warning(
+                    f"Segment {index} of {path.name} failed (attempt {attempt + 1}); retrying",
+                    exc_info=True,
+                )
+                time.sleep(2**attempt)
+
+    with ThreadPoolExecutor(max_workers=max(1, TRANSCRIBE_CONCURRENCY)) as executor:
+        futures = [executor.submit(transcribe, i) for i in range(len(segments))]
+    failed = [i for i, future in enumerate(futures) if future.exception() is not None]
+    if failed:
+        raise RuntimeError(
+            f"Transcription of {path.name} failed for segments {failed} "
+            f"of {len(segments)}: {futures[failed[0]].exception()}"
+        )
+
+    texts = stitch([future.result() for future in futures])
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    # Later segments begin where their overlap with the previous one ends
+    starts = [
+        start + (TRANSCRIBE_CHUNK_OVERLAP if i else 0)
+        for i, (start, _) in enumerate(segments)
+    ]
+    return "\n\n".join(
+        f"[{_timestamp(start)}] {text}" for start, text in zip(starts, texts) if text
+    )
 
 
 def transcribe_media(path: str, response_format: str = "text") -> str:
@@ -18,17 +278,23 @@ def transcribe_media(path: str, response_format: str = "text") -> str:
             - "text" returns plain text
 
     Returns:
-        str : the transcript text
+        str : the transcript text; long recordings get a `[HH:MM:SS]` offset
+        before each segment
     """
     p = Path(path)
     if not p.exists() or not p.is_file():
         raise FileNotFoundError(f"File not found: {path}")
 
-    with p.open("rb") as f:
-        resp = client.audio.transcriptions.create(
-            model="gpt-4o-mini-transcribe", file=f, response_format=response_format
+    transcriber = get_transcriber()
+    duration = _duration(p)
+    small = p.stat().st_size <= _MAX_UPLOAD_BYTES
+    if duration is None and small:
+        # Without ffprobe the file can still go up in one request
+        return transcriber.transcribe_file(p, response_format)
+    if duration is None:
+        raise RuntimeError(
+            f"{p.name} is too large for one request and could not be probed for segmenting"
         )
-
-    if isinstance(resp, str):
-        return resp
-    return getattr(resp, "text", str(resp))
+    if duration <= TRANSCRIBE_CHUNK_SECONDS and small:
+        return transcriber.transcribe_file(p, response_format)
+    return _transcribe_chunked(p, duration, transcriber)
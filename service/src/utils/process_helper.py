@@ -1,17 +1,33 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 import json
 import shutil
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import List
+from typing import Callable, Collection, Dict, List, Optional, Tuple
 
 from fastapi import UploadFile
 
-from .ai import AIHelper
+from .ai import AI_BATCH_CONCURRENCY, AI_BATCH_SIZE, AIHelper
+from .catalog import Catalog
+from .content_store import (
+    Markdown,
+    MarkdownFile,
+    file_key,
+    get_content_store,
+    hash_stream,
+    url_key,
+)
+from .conversion_pool import get_conversion_pool
 from .db import FirestoreHelper
-from . import transcribe_media, process_file as convert_file
-from .url_helper import url_to_markdown
+from .search_index import SearchIndex
+from .vector_index import VectorIndex
+from .router import build_catalog
+from .search_cache import bump_corpus_version
+from .url_helper import url_to_markdown_async
 
 
 logger = logging.getLogger(__name__)
@@ -22,6 +38,10 @@ if not logger.handlers:
 
 
 class ProcessHelper:
+    # Serializes picking a unique name and creating its .meta file, since
+    # links and files are stored concurrently
+    _store_lock = threading.Lock()
+
     def __init__(self, db: FirestoreHelper):
         self.db = db
         # Uploads directory is one level up from project root (adjacent to project)
@@ -31,8 +51,12 @@ class ProcessHelper:
         self._uploads_dir = base_dir / "uploads"
         self._media_extensions = {"mp4", "mp3"}
         self.ai_helper = AIHelper()
+        self.content_store = get_content_store()
 
-    def _truncate(self, text: str, limit: int = 2000) -> str:
+    def _truncate(self, text: Markdown, limit: int = 2000) -> str:
+        if isinstance(text, MarkdownFile):
+            # Large markdown stays on disk; its prefix is all the analysis needs
+            return text.prefix[:limit]
         if not isinstance(text, str):
             return ""
         return text[:limit]
@@ -87,6 +111,51 @@ class ProcessHelper:
         ).strip("_")
         return sanitized or "file"
 
+    def _create_meta(
+        self,
+        meta_dest_root: Path,
+        base_name: str,
+        old_name: str,
+        summary: str,
+        tags: List[str],
+        taken: Optional[Callable[[str], bool]] = None,
+    ) -> Tuple[str, dict]:
+        """Claim a unique name by exclusively creating its .meta file.
+
+        Args:
+            meta_dest_root: Directory the .meta file goes in
+            base_name: Sanitized name to start from; `-1`, `-2`, ... are
+                appended until one is free
+            old_name: Original file name or URL
+            summary: Summary from the analysis
+            tags: Tags from the analysis
+            taken: Extra check that a candidate name is in use
+
+        Returns:
+            The claimed name and the written .meta payload
+        """
+        candidate_base = base_name
+        counter = 1
+        with self._store_lock:
+            while True:
+                meta_dest = meta_dest_root / f"{candidate_base}.meta"
+                if not (taken and taken(candidate_base)):
+                    meta_payload = {
+                        "old_name": old_name,
+                        "name": candidate_base,
+                        "summary": summary,
+                        "tags": tags or [],
+                    }
+                    try:
+                        # Exclusive, so other worker processes can't claim it too
+                        with meta_dest.open("x", encoding="utf-8") as f:
+                            json.dump(meta_payload, f, ensure_ascii=False, indent=2)
+                        return candidate_base, meta_payload
+                    except FileExistsError:
+                        pass
+                candidate_base = f"{base_name}-{counter}"
+                counter += 1
+
     def _move_and_rename_with_meta(
         self,
         src_path: Path,
@@ -95,7 +164,7 @@ class ProcessHelper:
         summary: str,
         tags: List[str],
         user_dirs: dict,
-        markdown_content: str = None,
+        markdown_content: Markdown = None,
     ) -> str:
         # Ensure base name is sanitized and unique alongside .meta
         base_name = self._sanitize_base_name(base_name)
@@ -116,34 +185,35 @@ class ProcessHelper:
             else user_dirs["processed_docs_dir"]
         )
 
-        candidate_base = base_name
-        counter = 1
-        while True:
-            file_dest = original_dest_root / f"{candidate_base}{ext}"
-            meta_dest = meta_dest_root / f"{candidate_base}.meta"
-            if not file_dest.exists() and not meta_dest.exists():
-                break
-            candidate_base = f"{base_name}-{counter}"
-            counter += 1
+        candidate_base, meta_payload = self._create_meta(
+            meta_dest_root,
+            base_name,
+            original_name,
+            summary,
+            tags,
+            taken=lambda candidate: (original_dest_root / f"{candidate}{ext}").exists(),
+        )
+        file_dest = original_dest_root / f"{candidate_base}{ext}"
+        meta_dest = meta_dest_root / f"{candidate_base}.meta"
 
         # Move/rename the actual file to original directory
         shutil.move(str(src_path), str(file_dest))
 
-        # Write the .meta JSON file to processed directory
-        meta_payload = {
-            "old_name": original_name,
-            "name": candidate_base,
-            "summary": summary,
-            "tags": tags or [],
-        }
-        with meta_dest.open("w", encoding="utf-8") as f:
-            json.dump(meta_payload, f, ensure_ascii=False, indent=2)
-
         # Write the markdown content if provided
+        markdown_dest = meta_dest_root / f"{candidate_base}.md"
         if markdown_content:
-            markdown_dest = meta_dest_root / f"{candidate_base}.md"
-            with markdown_dest.open("w", encoding="utf-8") as f:
-                f.write(markdown_content)
+            # Linked to the shared blob of identical markdown
+            self.content_store.write_markdown(markdown_dest, markdown_content)
+
+        Catalog(user_dirs["user_dir"]).record(
+            meta_dest_root.name,
+            meta_payload,
+            markdown_dest if markdown_content else None,
+            file_dest,
+        )
+        self._record_corpus_change(
+            user_dirs, meta_dest_root.name, [meta_dest, markdown_dest]
+        )
 
         # Return path relative to processed dir so callers can locate it
         return str(meta_dest.relative_to(user_dirs["processed_dir"]))
@@ -159,33 +229,53 @@ class ProcessHelper:
     ) -> str:
         # Ensure base name is sanitized and unique alongside .meta in links dir
         base_name = self._sanitize_base_name(base_name)
-        candidate_base = base_name or "link"
-        counter = 1
-        while True:
-            meta_dest = user_dirs["processed_links_dir"] / f"{candidate_base}.meta"
-            if not meta_dest.exists():
-                break
-            candidate_base = f"{base_name}-{counter}"
-            counter += 1
-
-        meta_payload = {
-            "old_name": original_url,
-            "name": candidate_base,
-            "summary": summary,
-            "tags": tags or [],
-        }
-        with meta_dest.open("w", encoding="utf-8") as f:
-            json.dump(meta_payload, f, ensure_ascii=False, indent=2)
+        candidate_base, meta_payload = self._create_meta(
+            user_dirs["processed_links_dir"], base_name, original_url, summary, tags
+        )
+        meta_dest = user_dirs["processed_links_dir"] / f"{candidate_base}.meta"
 
         # Write the markdown content if provided
+        markdown_dest = user_dirs["processed_links_dir"] / f"{candidate_base}.md"
         if markdown_content:
-            markdown_dest = user_dirs["processed_links_dir"] / f"{candidate_base}.md"
-            with markdown_dest.open("w", encoding="utf-8") as f:
-                f.write(markdown_content)
+            # Linked to the shared blob of identical markdown
+            self.content_store.write_markdown(markdown_dest, markdown_content)
+
+        Catalog(user_dirs["user_dir"]).record(
+            "links", meta_payload, markdown_dest if markdown_content else None
+        )
+        self._record_corpus_change(user_dirs, "links", [meta_dest, markdown_dest])
 
         # Return path relative to processed dir so callers can locate it
         return str(meta_dest.relative_to(user_dirs["processed_dir"]))
 
+    def _record_corpus_change(
+        self, user_dirs: dict, category: str, paths: List[Path]
+    ) -> None:
+        # Invalidates cached search answers for this user
+        bump_corpus_version(user_dirs["user_dir"])
+        # The index self-heals on the next search, so a failure here is not fatal
+        try:
+            SearchIndex.for_category(user_dirs["user_dir"], category).add_files(paths)
+        except Exception:
+            logger.exception(f"Failed to update search index for {category}")
+
+    def _refresh_indexes(self, user_dirs: dict, categories: Collection[str]) -> None:
+        """Bring the vector indexes and routing catalog up to date after a batch.
+
+        Each vector index sync writes a new generation of the whole index, so
+        it runs once per batch of stored files rather than once per file.
+        """
+        # Both self-heal on the next search, so a failure here is not fatal
+        for category in categories:
+            try:
+                VectorIndex.for_category(user_dirs["user_dir"], category).sync()
+            except Exception:
+                logger.exception(f"Failed to update vector index for {category}")
+        try:
+            build_catalog(user_dirs["user_dir"])
+        except Exception:
+            logger.exception("Failed to rebuild routing catalog")
+
     def _update_status(self, process_id: str, message: str) -> None:
         self.db.update_process_document(process_id, "processing", message)
 
@@ -194,103 +284,287 @@ class ProcessHelper:
     ) -> None:
         self.db.update_tuple_with_new_name(process_id, old_name, new_name)
 
-    def _save_uploads(self, files: List[UploadFile], user_dirs: dict) -> List[Path]:
-        saved_paths: List[Path] = []
+    def save_uploads(
+        self, process_id: str, user_id: str, files: List[UploadFile]
+    ) -> List[dict]:
+        """Save uploads to the process's processing dir, hashing them in the same pass.
+
+        Runs before the process is queued, since the uploads do not outlive
+        the request.
+
+        Returns:
+            One job item (`path`, `name`, `sha256`) per upload, in upload order
+        """
+        processing_dir = (
+            self._get_user_directories(user_id)["processing_dir"] / process_id
+        )
+        processing_dir.mkdir(parents=True, exist_ok=True)
+        items: List[dict] = []
         for file in files:
-            dst_path = user_dirs["processing_dir"] / file.filename
+            dst_path = processing_dir / Path(file.filename).name
             with dst_path.open("wb") as out_f:
-                shutil.copyfileobj(file.file, out_f)
-            saved_paths.append(dst_path)
-        return saved_paths
+                digest = hash_stream(file.file, out_f)
+            items.append({"path": str(dst_path), "name": file.filename, "sha256": digest})
+        return items
 
-    def process_files_background(
-        self, process_id: str, user_id: str, files: List[UploadFile]
-    ) -> None:
+    def _store_file(
+        self,
+        process_id: str,
+        user_id: str,
+        path: Path,
+        original_name: str,
+        markdown: Markdown,
+        user_dirs: dict,
+        index: int,
+        analysis: Optional[dict] = None,
+    ) -> dict:
+        """Analyze a converted upload (unless `analysis` is given) and store it.
+
+        Returns:
+            The `name`, `summary` and `tags` it was stored with
+        """
+        if analysis is None:
+            logger.info(
+                f"Analyzing file {original_name}",
+                extra={
+                    "process_id": process_id,
+                    "user_id": user_id,
+                    "file": original_name,
+                    "index": index,
+                },
+            )
+            self._update_status(process_id, f"Analyzing the file {original_name}")
+
+            content = self._truncate(markdown, 2000)
+
+            name, summary, tags = self.ai_helper.get_analyzed_file_data(content)
+            analysis = {"name": name, "summary": summary, "tags": tags}
+
+        new_name = self._move_and_rename_with_meta(
+            path,
+            analysis["name"],
+            original_name,
+            analysis["summary"],
+            analysis["tags"],
+            user_dirs,
+            markdown,
+        )
+        self._update_tuple_with_new_name(process_id, original_name, new_name)
         logger.info(
-            "Background processing started",
+            f"File {original_name} processed and moved to {new_name}",
             extra={
                 "process_id": process_id,
                 "user_id": user_id,
-                "file_count": len(files),
+                "old_name": original_name,
+                "new_name": new_name,
+                "index": index,
             },
         )
-
-        # Get user-specific directories
+        return analysis
+
+    def process_files(
+        self, process_id: str, user_id: str, items: List[dict]
+    ) -> Dict[str, Optional[str]]:
+        """Convert, analyze and store saved uploads.
+
+        Args:
+            process_id: The Firestore process to report progress to
+            user_id: Owner of the files
+            items: Items from `save_uploads` still to be processed
+
+        Returns:
+            The error for each item's `path`, or None once it is stored. A
+            file no longer in the processing dir was stored by an earlier,
+            interrupted attempt and counts as stored.
+        """
         user_dirs = self._get_user_directories(user_id)
-        saved_paths = self._save_uploads(files, user_dirs)
-
-        for idx, (upload, path) in enumerate(zip(files, saved_paths), start=1):
-            original_name = upload.filename
-            ext = path.suffix.lower().lstrip(".")
+        outcomes: Dict[str, Optional[str]] = {}
+
+        def store(
+            path: Path,
+            markdown: Markdown,
+            analysis: Optional[dict] = None,
+            error: Optional[Exception] = None,
+        ):
+            original_name = original_names[path]
             try:
-                logger.info(
-                    f"Analyzing file {original_name}",
+                if error is not None:
+                    raise error
+                analysis = self._store_file(
+                    process_id,
+                    user_id,
+                    path,
+                    original_name,
+                    markdown,
+                    user_dirs,
+                    indexes[path],
+                    analysis,
+                )
+                outcomes[str(path)] = None
+                return analysis
+            except Exception as e:
+                logger.exception(
+                    f"Error processing file {original_name}",
                     extra={
                         "process_id": process_id,
                         "user_id": user_id,
                         "file": original_name,
-                        "index": idx,
+                        "index": indexes[path],
                     },
                 )
-                self._update_status(process_id, f"Analyzing the file {original_name}")
-
-                if ext in self._media_extensions:
-                    text = transcribe_media(str(path))
-                else:
-                    text = convert_file(str(path))
-
-                content = self._truncate(text, 2000)
-
-                name, summary, tags = self.ai_helper.get_analyzed_file_data(content)
-
-                new_name = self._move_and_rename_with_meta(
-                    path, name, original_name, summary, tags, user_dirs, text
+                outcomes[str(path)] = f"{type(e).__name__}: {e}"
+                return None
+
+        saved = []
+        for item in items:
+            path = Path(item["path"])
+            if path.exists():
+                saved.append((path, item))
+            else:
+                outcomes[item["path"]] = None
+        original_names = {path: item["name"] for path, item in saved}
+        indexes = {path: idx for idx, (path, _) in enumerate(saved, start=1)}
+        digests = {path: item["sha256"] for path, item in saved}
+
+        # Identical uploads are converted at most once per batch
+        paths_by_digest: dict = {}
+        for path, _ in saved:
+            paths_by_digest.setdefault(digests[path], []).append(path)
+
+        # Content seen before is stored straight from the content cache
+        conversions = []
+        for digest, paths in paths_by_digest.items():
+            cached = self.content_store.lookup(file_key(digest))
+            if cached is None:
+                primary = paths[0]
+                conversions.append(
+                    (primary, primary.suffix.lower().lstrip(".") in self._media_extensions)
                 )
-                self._update_tuple_with_new_name(process_id, original_name, new_name)
+                continue
+            for path in paths:
                 logger.info(
-                    f"File {original_name} processed and moved to {new_name}",
-                    extra={
-                        "process_id": process_id,
-                        "user_id": user_id,
-                        "old_name": original_name,
-                        "new_name": new_name,
-                        "index": idx,
-                    },
-                )
-            except Exception:
-                logger.exception(
-                    f"Error processing file {original_name}",
+                    f"File {original_names[path]} already processed; reusing cached content",
                     extra={
                         "process_id": process_id,
                         "user_id": user_id,
-                        "file": original_name,
-                        "index": idx,
+                        "file": original_names[path],
                     },
                 )
-                continue
-
-        self.db.finish_process(process_id)
-        logger.info(
-            f"Background processing completed {process_id}",
-            extra={"process_id": process_id, "user_id": user_id},
-        )
-
-    def process_links_background(
-        self, process_id: str, user_id: str, urls: List[str]
-    ) -> None:
-        logger.info(
-            "Background URL processing started",
-            extra={
-                "process_id": process_id,
-                "user_id": user_id,
-                "url_count": len(urls),
-            },
+                store(path, cached["markdown"], cached)
+
+        def analyze_and_store(converted: List[tuple]) -> None:
+            # One model request analyzes a whole batch of converted files
+            names = [original_names[path] for path, _ in converted]
+            logger.info(
+                f"Analyzing {len(converted)} files",
+                extra={"process_id": process_id, "user_id": user_id, "files": names},
+            )
+            self._update_status(
+                process_id,
+                f"Analyzing the file {names[0]}"
+                if len(names) == 1
+                else f"Analyzing the files {', '.join(names)}",
+            )
+            results = self.ai_helper.get_analyzed_files_data(
+                [self._truncate(text, 2000) for _, text in converted]
+            )
+            for (path, text), result in zip(converted, results):
+                digest = digests[path]
+                if isinstance(result, Exception):
+                    analysis = store(path, text, error=result)
+                else:
+                    name, summary, tags = result
+                    analysis = store(
+                        path, text, {"name": name, "summary": summary, "tags": tags}
+                    )
+                if analysis is None:
+                    if isinstance(text, MarkdownFile):
+                        # Streamed markdown of a file that was not stored
+                        text.discard()
+                    for duplicate in paths_by_digest[digest][1:]:
+                        outcomes[str(duplicate)] = outcomes[str(path)]
+                    continue
+                self.content_store.remember(file_key(digest), text, **analysis)
+                for duplicate in paths_by_digest[digest][1:]:
+                    cached = self.content_store.lookup(file_key(digest)) or {
+                        **analysis,
+                        "markdown": text,
+                    }
+                    store(duplicate, cached["markdown"], cached)
+
+        # Conversions run concurrently; converted files are analyzed and
+        # stored in batches of AI_BATCH_SIZE as they finish, with up to
+        # AI_BATCH_CONCURRENCY batches in flight while conversion goes on
+        if conversions:
+            self._update_status(process_id, f"Converting {len(conversions)} files")
+        analyses: list = []
+        executor = ThreadPoolExecutor(
+            max_workers=max(1, AI_BATCH_CONCURRENCY), thread_name_prefix="analysis"
         )
 
-        # Get user-specific directories
+        def submit(batch: List[tuple]) -> None:
+            # Keeps converted markdown from piling up behind the model
+            running = [future for future in analyses if not future.done()]
+            if len(running) >= max(1, AI_BATCH_CONCURRENCY):
+                wait(running, return_when=FIRST_COMPLETED)
+            analyses.append(executor.submit(analyze_and_store, batch))
+
+        converted: List[tuple] = []
+        try:
+            for path, text, error in get_conversion_pool().convert(conversions):
+                if error is not None:
+                    logger.error(
+                        f"Error converting file {original_names[path]}",
+                        exc_info=error,
+                        extra={
+                            "process_id": process_id,
+                            "user_id": user_id,
+                            "file": original_names[path],
+                            "index": indexes[path],
+                        },
+                    )
+                    for same in paths_by_digest[digests[path]]:
+                        outcomes[str(same)] = f"{type(error).__name__}: {error}"
+                    continue
+                converted.append((path, text))
+                if len(converted) >= max(1, AI_BATCH_SIZE):
+                    submit(converted)
+                    converted = []
+            if converted:
+                submit(converted)
+        finally:
+            executor.shutdown(wait=True)
+        # A batch that failed as a whole fails the run, as it did inline
+        for future in analyses:
+            future.result()
+
+        if any(outcome is None for outcome in outcomes.values()):
+            self._refresh_indexes(user_dirs, ("docs", "media"))
+        return outcomes
+
+    async def process_links(
+        self,
+        process_id: str,
+        user_id: str,
+        urls: List[str],
+        retry_fetch_errors: Collection[str] = (),
+    ) -> Dict[str, Optional[str]]:
+        """Fetch, analyze and store URLs concurrently.
+
+        Args:
+            process_id: The Firestore process to report progress to
+            user_id: Owner of the links
+            urls: URLs still to be processed
+            retry_fetch_errors: URLs whose fetch error should be reported as a
+                failure (to be retried) instead of being stored as the content
+
+        Returns:
+            The error for each URL, or None once it is stored
+        """
         user_dirs = self._get_user_directories(user_id)
+        outcomes: Dict[str, Optional[str]] = {}
 
-        for idx, url in enumerate(urls, start=1):
+        async def ingest(idx: int, url: str) -> None:
             try:
                 logger.info(
                     f"Processing URL {url}",
@@ -301,18 +575,39 @@ class ProcessHelper:
                         "index": idx,
                     },
                 )
-                self._update_status(process_id, f"Fetching and analyzing the URL {url}")
+                await asyncio.to_thread(
+                    self._update_status,
+                    process_id,
+                    f"Fetching and analyzing the URL {url}",
+                )
 
-                markdown = url_to_markdown(url)
-                content = self._truncate(markdown, 2000)
+                markdown = await url_to_markdown_async(url)
+                if markdown.startswith("Error") and url in retry_fetch_errors:
+                    raise RuntimeError(markdown)
 
-                name, summary, tags = self.ai_helper.get_analyzed_file_data(content)
+                # The same page with the same content is not analyzed again
+                key = url_key(url, markdown)
+                cached = await asyncio.to_thread(self.content_store.lookup, key)
+                if cached is not None:
+                    name, summary, tags = cached["name"], cached["summary"], cached["tags"]
+                else:
+                    content = self._truncate(markdown, 2000)
+                    name, summary, tags = await asyncio.to_thread(
+                        self.ai_helper.get_analyzed_file_data, content
+                    )
 
-                new_name = self._write_link_meta(
-                    name, url, summary, tags, user_dirs, markdown
+                new_name = await asyncio.to_thread(
+                    self._write_link_meta, name, url, summary, tags, user_dirs, markdown
+                )
+                await asyncio.to_thread(
+                    self._update_tuple_with_new_name, process_id, url, new_name
                 )
-                self._update_tuple_with_new_name(process_id, url, new_name)
+                if cached is None and not markdown.startswith("Error"):
+                    await asyncio.to_thread(
+                        self.content_store.remember, key, markdown, name, summary, tags
+                    )
 
+                outcomes[url] = None
                 logger.info(
                     f"URL processed and meta written to {new_name}",
                     extra={
@@ -323,7 +618,8 @@ class ProcessHelper:
                         "index": idx,
                     },
                 )
-            except Exception:
+            except Exception as e:
+                outcomes[url] = f"{type(e).__name__}: {e}"
                 logger.exception(
                     f"Error processing URL {url}",
                     extra={
@@ -333,10 +629,11 @@ class ProcessHelper:
                         "index": idx,
                     },
                 )
-                continue
 
-        self.db.finish_process(process_id)
-        logger.info(
-            f"Background URL processing completed {process_id}",
-            extra={"process_id": process_id, "user_id": user_id},
+        # Fetch concurrency is bounded globally and per host by the URL fetcher
+        await asyncio.gather(
+            *(ingest(idx, url) for idx, url in enumerate(urls, start=1))
         )
+        if any(outcome is None for outcome in outcomes.values()):
+            await asyncio.to_thread(self._refresh_indexes, user_dirs, ("links",))
+        return outcomes
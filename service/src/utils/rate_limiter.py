@@ -0,0 +1,313 @@
+"""Per-host rate limiting for link ingestion.
+
+Every request that link ingestion sends to a site takes a token from that
+host's bucket first:
+
+- pages fetched on the shared async client (``url_fetcher``)
+- the synchronous ``requests`` fallbacks in ``url_helper``
+- GitHub API requests and the Wikipedia, YouTube and X SDK calls
+
+Buckets refill at ``RATE_LIMIT_PER_SECOND`` with a burst of
+``RATE_LIMIT_BURST``. Hosts with known API limits (GitHub, with or without
+``GITHUB_TOKEN``, Reddit, Wikipedia, X) get their own defaults, and ``RATE_LIMITS`` overrides
+any host as a comma-separated list of ``host=requests/seconds[/burst]``.
+
+A 429 (or a 503 with ``Retry-After``) blocks the host. The block lasts for
+the ``Retry-After`` time, or until GitHub's ``X-RateLimit-Reset`` when the
+quota is used up, and the request is then retried. Only requests to that
+host wait; a waiting request holds none of the global fetch slots. If a host
+would keep a request waiting longer than ``RATE_LIMIT_MAX_WAIT`` seconds, the
+request fails at once with ``RateLimited`` instead. The job queue retries it
+later.
+
+``HostScheduler.acquire`` blocks the calling thread and ``acquire_async``
+awaits, so threads and the event loop share the same buckets.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Mapping, Optional, Tuple
+from urllib.parse import urlparse
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_PER_SECOND = float(os.getenv("RATE_LIMIT_PER_SECOND", "2"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "4"))
+# Per-host overrides: "host=requests/seconds[/burst],..."
+RATE_LIMITS = os.getenv("RATE_LIMITS", "")
+# Longest a request waits for its host before failing
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "120"))
+# Retries of a request answered with 429
+RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "3"))
+
+# (requests, per seconds, burst) for APIs with published limits; a host
+# matches its entry and any subdomain of it
+DEFAULT_HOST_LIMITS: Dict[str, Tuple[float, float, int]] = {
+    # REST API: 60 requests per hour, or 5,000 with a token
+    "api.github.com": (
+        (5000, 3600, 50) if os.getenv("GITHUB_TOKEN") else (60, 3600, 10)
+    ),
+    # Repository files; not part of the API quota
+    "raw.githubusercontent.com": (5000, 3600, 20),
+    # Unauthenticated JSON endpoints allow about 10 requests per minute
+    "reddit.com": (10, 60, 3),
+    "wikipedia.org": (10, 1, 10),
+    # Tweet lookup on the basic tier: 15 requests per 15 minutes
+    "api.twitter.com": (15, 900, 2),
+    "api.x.com": (15, 900, 2),
+}
+
+# Backoff after a 429 without Retry-After, doubled per attempt
+_DEFAULT_PENALTY = 5.0
+
+
+class RateLimited(Exception):
+    """A host is throttled for longer than the caller may wait."""
+
+    def __init__(self, host: str, retry_after: float):
+        super().__init__(f"Rate limited by {host}; retry in {retry_after:.0f}s")
+        self.host = host
+        self.retry_after = retry_after
+
+
+def parse_limits(spec: str) -> Dict[str, Tuple[float, float, int]]:
+    """Parse `host=requests/seconds[/burst]` entries separated by commas."""
+    limits = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        try:
+            host, value = entry.split("=", 1)
+            parts = value.split("/")
+            requests, seconds = float(parts[0]), float(parts[1])
+            burst = int(parts[2]) if len(parts) > 2 else max(1, int(requests))
+        except (ValueError, IndexError):
+            raise ValueError(
+                f"Invalid RATE_LIMITS entry '{entry}'. Expected host=requests/seconds[/burst]"
+            )
+        limits[host.strip().lower()] = (requests, seconds, burst)
+    return limits
+
+
+def is_throttled(status_code: Optional[int], headers: Mapping[str, str]) -> bool:
+    """Whether a response asks the client to slow down."""
+    if status_code == 429:
+        return True
+    if status_code == 503 and headers.get("retry-after"):
+        return True
+    # GitHub answers an exhausted quota with a 403
+    return status_code == 403 and headers.get("x-ratelimit-remaining") == "0"
+
+
+def retry_after_seconds(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """Seconds to wait according to `Retry-After` or an exhausted `X-RateLimit-*` quota."""
+    if not headers:
+        return None
+    headers = {str(k).lower(): str(v) for k, v in headers.items()}
+    value = headers.get("retry-after")
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    reset = headers.get("x-ratelimit-reset") or headers.get("x-rate-limit-reset")
+    remaining = headers.get("x-ratelimit-remaining") or headers.get("x-rate-limit-remaining")
+    if reset and remaining == "0":
+        try:
+            return max(0.0, float(reset) - time.time())
+        except ValueError:
+            pass
+    return None
+
+
+class TokenBucket:
+    """Token bucket with an optional block, e.g. from a `Retry-After`."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.waits = 0
+        self.penalties = 0
+        self._lock = threading.Lock()
+
+    def try_take(self, tokens: int = 1) -> float:
+        """Take tokens if available; otherwise return the seconds until they are."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            tokens = min(tokens, self.burst)
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0.0
+            self.waits += 1
+            return (tokens - self.tokens) / self.rate
+
+    def block(self, seconds: float) -> None:
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+            self.penalties += 1
+
+
+class HostScheduler:
+    """Per-host token buckets shared by synchronous and async callers."""
+
+    def __init__(
+        self,
+        rate: float = RATE_LIMIT_PER_SECOND,
+        burst: int = RATE_LIMIT_BURST,
+        limits: Optional[Dict[str, Tuple[float, float, int]]] = None,
+        max_wait: float = RATE_LIMIT_MAX_WAIT,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.limits = {**DEFAULT_HOST_LIMITS, **(limits or {})}
+        self.max_wait = max_wait
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def host_key(self, url_or_host: str) -> str:
+        """The bucket a URL or host name counts against."""
+        host = (urlparse(url_or_host).hostname if "//" in url_or_host else url_or_host) or ""
+        host = host.lower()
+        if host.startswith("www."):
+            host = host[4:]
+        for limited in self.limits:
+            if host == limited or host.endswith("." + limited):
+                return limited
+        return host
+
+    def bucket(self, url_or_host: str) -> Tuple[str, TokenBucket]:
+        key = self.host_key(url_or_host)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if key in self.limits:
+                    requests, seconds, burst = self.limits[key]
+                    bucket = TokenBucket(requests / seconds, burst)
+                else:
+                    bucket = TokenBucket(self.rate, self.burst)
+                self._buckets[key] = bucket
+            return key, bucket
+
+    def _next_wait(self, url_or_host: str, tokens: int, waited: float) -> float:
+        key, bucket = self.bucket(url_or_host)
+        wait = bucket.try_take(tokens)
+        if wait and waited + wait > self.max_wait:
+            raise RateLimited(key, wait)
+        return wait
+
+    def acquire(self, url_or_host: str, tokens: int = 1) -> None:
+        """Block the calling thread until the host allows `tokens` more requests.
+
+        Raises:
+            RateLimited: If that would take longer than `max_wait` seconds.
+        """
+        waited = 0.0
+        while True:
+            wait = self._next_wait(url_or_host, tokens, waited)
+            if not wait:
+                return
+            time.sleep(wait)
+            waited += wait
+
+    async def acquire_async(self, url_or_host: str, tokens: int = 1) -> None:
+        """Async `acquire`; only the awaiting task waits."""
+        waited = 0.0
+        while True:
+            wait = self._next_wait(url_or_host, tokens, waited)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def penalize(
+        self, url_or_host: str, retry_after: Optional[float], attempt: int = 0
+    ) -> float:
+        """Block a host after it throttled a request.
+
+        Args:
+            url_or_host: The throttled URL or host
+            retry_after: Seconds from `retry_after_seconds`, or None for a backoff
+            attempt: Retries of the request so far, for the backoff
+
+        Returns:
+            Seconds the host is blocked for
+        """
+        seconds = retry_after if retry_after is not None else _DEFAULT_PENALTY * 2**attempt
+        key, bucket = self.bucket(url_or_host)
+        bucket.block(seconds)
+        logger.warning(f"{key} is throttling requests; pausing it for {seconds:.0f}s")
+        return seconds
+
+    def call(
+        self,
+        url_or_host: str,
+        fn: Callable,
+        *args,
+        tokens: int = 1,
+        retry_on: Tuple[type, ...] = (),
+        **kwargs,
+    ):
+        """Run a blocking SDK call under the host's limit.
+
+        Exceptions in `retry_on` are treated as throttling. The host is paused
+        for the time given by the exception's response headers, and the call
+        is then retried.
+        """
+        for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+            self.acquire(url_or_host, tokens)
+            try:
+                return fn(*args, **kwargs)
+            except retry_on as e:
+                if attempt == RATE_LIMIT_MAX_RETRIES:
+                    raise
+                headers = getattr(e, "headers", None) or getattr(
+                    getattr(e, "response", None), "headers", None
+                )
+                self.penalize(url_or_host, retry_after_seconds(headers), attempt)
+
+    def stats(self) -> dict:
+        with self._lock:
+            buckets = dict(self._buckets)
+        now = time.monotonic()
+        return {
+            key: {
+                "rate_per_second": round(bucket.rate, 4),
+                "burst": bucket.burst,
+                "blocked_for": round(max(0.0, bucket.blocked_until - now), 1),
+                "waits": bucket.waits,
+                "penalties": bucket.penalties,
+            }
+            for key, bucket in buckets.items()
+        }
+
+
+_scheduler: Optional[HostScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_host_scheduler() -> HostScheduler:
+    """Return the process-wide scheduler, creating it on first use."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = HostScheduler(limits=parse_limits(RATE_LIMITS))
+        return _scheduler
@@ -0,0 +1,207 @@
+import json
+import logging
+import math
+import os
+import re
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+from dotenv import load_dotenv
+
+from .catalog import Catalog
+from .search_cache import get_corpus_version
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Uploads directory is one level up from project root (adjacent to project)
+UPLOADS_DIR = (
+    Path(__file__).resolve().parents[3] / "uploads"
+)  # Go up 3 levels from src/utils/router.py
+
+CATEGORIES = ["links", "docs", "media"]
+
+# Route only when the best category holds at least this share of the total
+# score; below it every non-empty category is searched (1.0+ disables routing)
+ROUTING_MIN_CONFIDENCE = float(os.getenv("ROUTING_MIN_CONFIDENCE", "0.5"))
+# Once routing, also keep any category holding at least this share
+ROUTING_MIN_SHARE = float(os.getenv("ROUTING_MIN_SHARE", "0.2"))
+
+CATALOG_FILE = "routing_catalog.json"
+ROUTING_LOG_FILE = "routing_decisions.jsonl"
+# The decision log is rotated to routing_decisions.jsonl.1 at this size
+# (0 disables the log)
+ROUTING_LOG_MAX_KB = int(os.getenv("ROUTING_LOG_MAX_KB", "1024"))
+
+_log_lock = threading.Lock()
+
+# Words that hint at a category regardless of what the user has stored
+CATEGORY_HINTS = {
+    "links": {
+        "link", "links", "url", "website", "site", "web", "page", "article",
+        "blog", "post", "tweet", "thread", "repo", "repository", "github",
+        "youtube", "wikipedia", "reddit", "linkedin",
+    },
+    "docs": {
+        "pdf", "document", "documents", "doc", "docx", "file", "files",
+        "slides", "slide", "presentation", "deck", "spreadsheet", "sheet",
+        "csv", "xlsx", "pptx", "report", "paper", "notes",
+    },
+    "media": {
+        "video", "videos", "audio", "podcast", "recording", "recorded",
+        "transcript", "lecture", "talk", "meeting", "call", "mp3", "mp4",
+        "listen", "listened", "watch", "watched", "said",
+    },
+}
+HINT_WEIGHT = 2.0
+TAG_WEIGHT = 3.0
+NAME_WEIGHT = 2.0
+
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "with",
+    "about", "is", "are", "was", "were", "what", "which", "who", "how", "why",
+    "when", "where", "do", "does", "did", "i", "me", "my", "we", "our", "you",
+    "your", "it", "its", "this", "that", "these", "those", "there", "any",
+    "all", "can", "could", "should", "would", "find", "show", "tell", "give",
+    "from", "have", "has", "had", "be", "been", "by", "at", "as", "so",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _tokens(text: str) -> List[str]:
+    return [
+        t for t in _TOKEN_RE.findall((text or "").lower().replace("_", " "))
+        if t not in STOPWORDS and len(t) > 1
+    ]
+
+
+def build_catalog(user_dir: Path) -> dict:
+    """Summarize a user's file catalog into per-category file counts and term weights.
+
+    The catalog is written to `uploads/<user_id>/routing_catalog.json` stamped
+    with the corpus version it was built from.
+    """
+    user_dir = Path(user_dir)
+    version = get_corpus_version(user_dir)
+    entries, _ = Catalog(user_dir).list_entries()
+    categories = {c: {"count": 0, "terms": {}} for c in CATEGORIES}
+    for entry in entries:
+        info = categories.get(entry["category"])
+        if info is None:
+            continue
+        info["count"] += 1
+        weights: dict = {}
+        for token in _tokens(entry["name"]):
+            weights[token] = max(weights.get(token, 0.0), NAME_WEIGHT)
+        for token in _tokens(" ".join(entry["tags"])):
+            weights[token] = max(weights.get(token, 0.0), TAG_WEIGHT)
+        for token in _tokens(entry["summary"]):
+            weights[token] = max(weights.get(token, 0.0), 1.0)
+        for token, weight in weights.items():
+            info["terms"][token] = info["terms"].get(token, 0.0) + weight
+
+    catalog = {"version": version, "categories": categories}
+    # Unique, since several ingestion jobs may rebuild the catalog at once
+    tmp_path = user_dir / f"{CATALOG_FILE}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(catalog, f, ensure_ascii=False)
+        os.replace(tmp_path, user_dir / CATALOG_FILE)
+    except OSError:
+        tmp_path.unlink(missing_ok=True)
+        logger.exception(f"Failed to write routing catalog for {user_dir.name}")
+    return catalog
+
+
+def load_catalog(user_dir: Path) -> dict:
+    """Return the user's routing catalog, rebuilding it if the corpus changed."""
+    user_dir = Path(user_dir)
+    try:
+        with open(user_dir / CATALOG_FILE, "r", encoding="utf-8") as f:
+            catalog = json.load(f)
+        if catalog.get("version") == get_corpus_version(user_dir):
+            return catalog
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+    return build_catalog(user_dir)
+
+
+def _score(query_tokens: List[str], category: str, info: dict) -> float:
+    score = 0.0
+    for token in query_tokens:
+        if token in CATEGORY_HINTS[category]:
+            score += HINT_WEIGHT
+        # Diminishing returns so one big category doesn't win on volume alone
+        score += math.log1p(info["terms"].get(token, 0.0))
+    return score
+
+
+def route_query(user_id: str, user_query: str) -> dict:
+    """Decide which category agents to run for a query.
+
+    Categories with no files are always skipped. Remaining categories are
+    scored against the query using the catalog's names, tags and summaries
+    plus category hint words; if the best category's share of the total score
+    is below `ROUTING_MIN_CONFIDENCE`, every non-empty category is searched.
+
+    Returns:
+        Dict with `agents` (categories to run), `scores`, `confidence`, `counts`
+        and `fallback` (True when routing fell back to full fan-out).
+    """
+    user_dir = UPLOADS_DIR / user_id
+    catalog = load_catalog(user_dir)
+    counts = {c: catalog["categories"][c]["count"] for c in CATEGORIES}
+    non_empty = [c for c in CATEGORIES if counts[c] > 0]
+
+    query_tokens = _tokens(user_query)
+    scores = {
+        c: _score(query_tokens, c, catalog["categories"][c]) for c in non_empty
+    }
+    total = sum(scores.values())
+    shares = {c: (s / total if total else 0.0) for c, s in scores.items()}
+    confidence = max(shares.values(), default=0.0)
+
+    fallback = confidence < ROUTING_MIN_CONFIDENCE
+    if fallback:
+        agents = non_empty
+    else:
+        agents = [c for c in non_empty if shares[c] >= ROUTING_MIN_SHARE]
+
+    decision = {
+        "agents": agents,
+        "scores": {c: round(s, 4) for c, s in scores.items()},
+        "confidence": round(confidence, 4),
+        "counts": counts,
+        "fallback": fallback,
+    }
+    logger.info(f"Routing decision for user {user_id}: {decision}")
+    _record_decision(user_dir, user_query, decision)
+    return decision
+
+
+def _record_decision(user_dir: Path, user_query: str, decision: dict) -> None:
+    """Append the decision to `uploads/<user_id>/routing_decisions.jsonl` for tuning.
+
+    Once the log reaches `ROUTING_LOG_MAX_KB` it replaces the previous
+    `routing_decisions.jsonl.1`, so at most twice that is kept per user.
+    """
+    if ROUTING_LOG_MAX_KB <= 0:
+        return
+    entry = {"timestamp": datetime.now().isoformat(), "query": user_query, **decision}
+    log_path = user_dir / ROUTING_LOG_FILE
+    try:
+        with _log_lock:
+            if (
+                log_path.exists()
+                and log_path.stat().st_size >= ROUTING_LOG_MAX_KB * 1024
+            ):
+                os.replace(log_path, log_path.with_name(f"{ROUTING_LOG_FILE}.1"))
+            with open(log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    except OSError:
+        logger.exception("Failed to record routing decision")
@@ -0,0 +1,122 @@
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Mapping, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from .search_index import CORPUS_VERSION_FILE
+
+load_dotenv()
+
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1024"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "900"))
+
+# (user_id, normalized query, normalized budget, corpus version)
+CacheKey = Tuple[str, str, str, str]
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query so trivially different phrasings share a cache entry."""
+    query = re.sub(r"\s+", " ", (query or "").strip().lower())
+    return query.rstrip(" ?!.")
+
+
+def normalize_budget(budget: Optional[Mapping[str, object]]) -> str:
+    """Normalize a search budget; unset limits and no budget at all are equal."""
+    limits = {k: v for k, v in (budget or {}).items() if v is not None}
+    return json.dumps(limits, sort_keys=True) if limits else ""
+
+
+def get_corpus_version(user_dir: Path) -> str:
+    """Return the current corpus version for `uploads/<user_id>`."""
+    try:
+        return (Path(user_dir) / CORPUS_VERSION_FILE).read_text().strip()
+    except FileNotFoundError:
+        return ""
+
+
+def bump_corpus_version(user_dir: Path) -> str:
+    """Mark the user's corpus as changed.
+
+    Each bump writes a fresh random token rather than incrementing a counter,
+    so concurrent writers can never end up back on a version a cached answer
+    was computed against.
+    """
+    user_dir = Path(user_dir)
+    user_dir.mkdir(parents=True, exist_ok=True)
+    version = uuid.uuid4().hex
+    tmp_path = user_dir / f"{CORPUS_VERSION_FILE}.{version}.tmp"
+    tmp_path.write_text(version)
+    os.replace(tmp_path, user_dir / CORPUS_VERSION_FILE)
+    return version
+
+
+class SearchCache:
+    """LRU cache of search answers with a TTL and a size bound.
+
+    Keys are `(user_id, normalized query, normalized budget, corpus version)`,
+    so any upload, link ingestion or deletion makes older entries unreachable;
+    they then age out through LRU eviction or the TTL. A tighter budget can
+    yield a shorter answer, so answers are only shared between equal budgets.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = SEARCH_CACHE_MAX_ENTRIES,
+        ttl: float = SEARCH_CACHE_TTL,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[CacheKey, Tuple[float, str]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(
+        user_id: str,
+        query: str,
+        corpus_version: str,
+        budget: Optional[Mapping[str, object]] = None,
+    ) -> CacheKey:
+        return user_id, normalize_query(query), normalize_budget(budget), corpus_version
+
+    def get(self, key: CacheKey) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key: CacheKey, value: str) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
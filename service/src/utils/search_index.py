@@ -0,0 +1,366 @@
+"""Persistent inverted index over a user's processed files.
+
+Each ``uploads/<user_id>/processed/<category>`` directory gets its own SQLite
+database at ``uploads/<user_id>/index/<category>.sqlite3`` holding, for every
+lowercased word token, the files and line numbers it occurs on. The ``grep``
+tool uses it to narrow a regex search down to candidate files before doing a
+verified scan, and the ``search`` tool uses it to rank files with BM25.
+
+This module only depends on the standard library so that ``tools.py`` can
+import it when it is launched as a standalone MCP server script.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import re
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+try:  # Python 3.11+
+    from re import _parser as sre_parse
+except ImportError:  # pragma: no cover - Python 3.10
+    import sre_parse
+
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"\w+")
+
+# BM25 parameters used by ``SearchIndex.search``
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Characters of a file tokenized before its postings are written out, which
+# bounds the memory used to index a very large file
+INDEX_BLOCK_CHARS = 4 * 1024 * 1024
+
+# Bumped under ``uploads/<user_id>`` by every change to the processed files
+CORPUS_VERSION_FILE = "corpus_version"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    token TEXT NOT NULL,
+    path TEXT NOT NULL,
+    tf INTEGER NOT NULL,
+    lines TEXT NOT NULL,
+    PRIMARY KEY (token, path)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_path ON postings (path);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercased word tokens."""
+    return [token.lower() for token in TOKEN_RE.findall(text)]
+
+
+def _literal_runs(parsed) -> List[str]:
+    """Collect literal substrings that every match of a parsed regex must contain.
+
+    Only constructs that are guaranteed to participate in a match are inspected
+    (plain sequences, groups and repeats with a minimum of at least one), so the
+    result is always a safe under-approximation of the pattern.
+    """
+    runs: List[str] = []
+    current: List[str] = []
+
+    def flush() -> None:
+        if current:
+            runs.append("".join(current))
+            current.clear()
+
+    for op, av in parsed:
+        if op is sre_parse.LITERAL:
+            current.append(chr(av))
+            continue
+        flush()
+        if op is sre_parse.SUBPATTERN:
+            runs.extend(_literal_runs(av[-1]))
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+            min_count, _, sub = av
+            if min_count >= 1:
+                runs.extend(_literal_runs(sub))
+    flush()
+    return runs
+
+
+def _token_constraints(pattern: str) -> List[Tuple[str, str]]:
+    """Derive token constraints from a regex pattern.
+
+    Returns a list of ``(kind, word)`` pairs where ``kind`` is one of ``exact``,
+    ``prefix``, ``suffix`` or ``substring`` describing how ``word`` must relate
+    to at least one token on a matching line.
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception:
+        return []
+
+    constraints: List[Tuple[str, str]] = []
+    for run in _literal_runs(parsed):
+        for match in TOKEN_RE.finditer(run):
+            word = match.group().lower()
+            left_closed = match.start() > 0
+            right_closed = match.end() < len(run)
+            if left_closed and right_closed:
+                kind = "exact"
+            elif left_closed:
+                kind = "prefix"
+            elif right_closed:
+                kind = "suffix"
+            else:
+                kind = "substring"
+            constraints.append((kind, word))
+    return constraints
+
+
+class SearchIndex:
+    """Inverted, line-positional index for one category of a user's files."""
+
+    def __init__(
+        self, root_dir: Path, index_path: Path, version_path: Optional[Path] = None
+    ):
+        self.root_dir = Path(root_dir)
+        self.index_path = Path(index_path)
+        self.version_path = Path(version_path) if version_path else None
+
+    @classmethod
+    def for_category(cls, user_dir: Path, category: str) -> "SearchIndex":
+        """Build the index handle for ``uploads/<user_id>`` and a category."""
+        user_dir = Path(user_dir)
+        return cls(
+            user_dir / "processed" / category,
+            user_dir / "index" / f"{category}.sqlite3",
+            user_dir / CORPUS_VERSION_FILE,
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.index_path), timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Open a connection, commit or roll back on exit, then close it."""
+        conn = self._connect()
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _corpus_version(self) -> str:
+        if self.version_path is None:
+            return ""
+        try:
+            return self.version_path.read_text().strip()
+        except FileNotFoundError:
+            return ""
+
+    def _rel_path(self, path: Path | str) -> str:
+        path = Path(path)
+        if path.is_absolute():
+            path = path.resolve().relative_to(self.root_dir.resolve())
+        return path.as_posix()
+
+    @staticmethod
+    def _write_postings(
+        conn: sqlite3.Connection, rel_path: str, positions: dict
+    ) -> None:
+        """Add one block's postings to the file's, whose lines all come before."""
+        conn.executemany(
+            """
+            INSERT INTO postings (token, path, tf, lines) VALUES (?, ?, ?, ?)
+            ON CONFLICT (token, path) DO UPDATE SET
+                tf = tf + excluded.tf, lines = lines || ',' || excluded.lines
+            """,
+            (
+                (
+                    token,
+                    rel_path,
+                    len(lines),
+                    ",".join(str(n) for n in dict.fromkeys(lines)),
+                )
+                for token, lines in positions.items()
+            ),
+        )
+
+    def _index_one(self, conn: sqlite3.Connection, full_path: Path) -> None:
+        rel_path = self._rel_path(full_path)
+        stat = full_path.stat()
+        conn.execute("DELETE FROM postings WHERE path = ?", (rel_path,))
+        length = 0
+        try:
+            with open(full_path, "r", encoding="utf-8") as f:
+                positions: dict = {}
+                block_chars = 0
+                for line_num, line in enumerate(f, 1):
+                    for token in tokenize(line):
+                        length += 1
+                        # One entry per occurrence so len() doubles as tf
+                        positions.setdefault(token, []).append(line_num)
+                    block_chars += len(line)
+                    if block_chars >= INDEX_BLOCK_CHARS:
+                        self._write_postings(conn, rel_path, positions)
+                        positions = {}
+                        block_chars = 0
+                self._write_postings(conn, rel_path, positions)
+        except (UnicodeDecodeError, PermissionError):
+            # Non-text files are recorded without postings so they are never
+            # candidates, mirroring the scan which skips them as well.
+            conn.execute("DELETE FROM postings WHERE path = ?", (rel_path,))
+            length = 0
+
+        conn.execute(
+            "INSERT OR REPLACE INTO files (path, size, mtime_ns, length) VALUES (?, ?, ?, ?)",
+            (rel_path, stat.st_size, stat.st_mtime_ns, length),
+        )
+
+    def add_files(self, paths: Iterable[Path]) -> None:
+        """Index (or re-index) the given files."""
+        with self._transaction() as conn:
+            for path in paths:
+                path = Path(path)
+                if path.is_file():
+                    self._index_one(conn, path)
+
+    def remove_files(self, paths: Iterable[Path | str]) -> None:
+        """Drop the given files (absolute or category-relative) from the index."""
+        with self._transaction() as conn:
+            for path in paths:
+                rel_path = self._rel_path(path)
+                conn.execute("DELETE FROM postings WHERE path = ?", (rel_path,))
+                conn.execute("DELETE FROM files WHERE path = ?", (rel_path,))
+
+    def sync(self) -> None:
+        """Bring the index in line with the files currently on disk.
+
+        New or modified files (by size and mtime) are re-indexed and entries for
+        files that no longer exist are dropped, so a missed update from the
+        ingestion pipeline never produces stale results. The walk is skipped
+        while the user's corpus version matches the one of the last sync.
+        """
+        if not self.root_dir.is_dir():
+            return
+        # Read before the walk: a change landing mid-walk bumps the version
+        # again, so the next call walks once more.
+        version = self._corpus_version()
+        if version:
+            with self._transaction() as conn:
+                row = conn.execute(
+                    "SELECT value FROM meta WHERE key = 'corpus_version'"
+                ).fetchone()
+            if row and row[0] == version:
+                return
+        root = self.root_dir.resolve()
+        on_disk = {}
+        for file in root.rglob("*"):
+            if file.is_file():
+                on_disk[file.relative_to(root).as_posix()] = file
+
+        with self._transaction() as conn:
+            indexed = {
+                path: (size, mtime_ns)
+                for path, size, mtime_ns in conn.execute(
+                    "SELECT path, size, mtime_ns FROM files"
+                )
+            }
+            for rel_path in indexed.keys() - on_disk.keys():
+                conn.execute("DELETE FROM postings WHERE path = ?", (rel_path,))
+                conn.execute("DELETE FROM files WHERE path = ?", (rel_path,))
+            for rel_path, file in on_disk.items():
+                stat = file.stat()
+                if indexed.get(rel_path) != (stat.st_size, stat.st_mtime_ns):
+                    self._index_one(conn, file)
+            if version:
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('corpus_version', ?)",
+                    (version,),
+                )
+
+    def candidates(self, pattern: str) -> Optional[List[str]]:
+        """Return the sorted relative paths of files that may match ``pattern``.
+
+        Returns None when no literal can be extracted from the pattern, in
+        which case callers must fall back to scanning every file.
+        """
+        constraints = _token_constraints(pattern)
+        if not constraints:
+            return None
+
+        result: Optional[set] = None
+        with self._transaction() as conn:
+            for kind, word in constraints:
+                if kind == "exact":
+                    query, arg = "SELECT path FROM postings WHERE token = ?", word
+                elif kind == "prefix":
+                    query, arg = "SELECT path FROM postings WHERE token GLOB ?", f"{word}*"
+                elif kind == "suffix":
+                    query, arg = "SELECT path FROM postings WHERE token GLOB ?", f"*{word}"
+                else:
+                    query, arg = (
+                        "SELECT path FROM postings WHERE token GLOB ?",
+                        f"*{word}*",
+                    )
+                paths = {row[0] for row in conn.execute(query, (arg,))}
+                result = paths if result is None else result & paths
+                if not result:
+                    return []
+        return sorted(result or [])
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[str, float, List[int]]]:
+        """Rank files against a free-text query using BM25.
+
+        Returns:
+            List of ``(relative_path, score, line_numbers)`` tuples, best first,
+            where ``line_numbers`` are the lines containing any query term.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        with self._transaction() as conn:
+            total_docs, avg_length = conn.execute(
+                "SELECT COUNT(*), AVG(length) FROM files"
+            ).fetchone()
+            if not total_docs:
+                return []
+            avg_length = avg_length or 1.0
+            lengths = dict(conn.execute("SELECT path, length FROM files"))
+
+            scores: dict = {}
+            lines_by_path: dict = {}
+            for term in terms:
+                rows = conn.execute(
+                    "SELECT path, tf, lines FROM postings WHERE token = ?", (term,)
+                ).fetchall()
+                if not rows:
+                    continue
+                df = len(rows)
+                idf = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+                for path, tf, lines in rows:
+                    length = lengths.get(path, avg_length)
+                    norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                    scores[path] = scores.get(path, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+                    lines_by_path.setdefault(path, set()).update(
+                        int(n) for n in lines.split(",") if n
+                    )
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [(path, score, sorted(lines_by_path[path])) for path, score in ranked]
@@ -0,0 +1,195 @@
+"""Write-behind buffer for process status updates.
+
+Processing a file used to cost several Firestore round trips. There was a
+status update, plus a rename that read the whole ``files`` array and wrote it
+back, so a large batch rewrote the array once per file.
+
+``StatusBuffer`` has the same interface as ``FirestoreHelper`` but only
+records status messages and renames. Per process, the latest status wins and
+renames accumulate. A background thread flushes them every
+``STATUS_FLUSH_INTERVAL`` seconds as one batched write across all processes.
+
+- A flush with renames reads the process's ``files`` array once and applies
+  all of them in one pass. The array is not kept between flushes: another
+  worker process may have renamed items since, or finish the process.
+- ``finish_process`` flushes its process right away, so a completed process
+  never shows stale progress.
+- Reads flush pending updates first.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Seconds between flushes of buffered status updates
+STATUS_FLUSH_INTERVAL = float(os.getenv("STATUS_FLUSH_INTERVAL", "1.0"))
+# Failed flushes of one process before its pending updates are dropped
+_MAX_FLUSH_FAILURES = 3
+
+
+class StatusBuffer:
+    """Coalesces process status and rename updates and writes them in batches.
+
+    Args:
+        backend: A `FirestoreHelper` or `InMemoryProcessStore`
+        interval: Seconds between background flushes
+    """
+
+    def __init__(self, backend, interval: float = STATUS_FLUSH_INTERVAL):
+        self.backend = backend
+        self.interval = interval
+        self._lock = threading.Lock()
+        # Serializes flushes so two never write the same process concurrently
+        self._flush_lock = threading.Lock()
+        # process_id -> {"status", "updated_at", "renames", "finished_at"}
+        self._pending: Dict[str, dict] = {}
+        self._failures: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _entry(self, process_id: str) -> dict:
+        self._ensure_thread()
+        return self._pending.setdefault(process_id, {"renames": {}})
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None and not self._stop.is_set():
+            self._thread = threading.Thread(
+                target=self._run, name="status-buffer", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to flush process status updates")
+
+    def create_process_document(
+        self, process_id: str, files: List[str], user_id: str
+    ) -> None:
+        self.backend.create_process_document(process_id, files, user_id)
+
+    def update_process_document(
+        self, process_id: str, status: str, message: str
+    ) -> None:
+        with self._lock:
+            entry = self._entry(process_id)
+            entry["status"] = {"type": status, "message": message}
+            entry["updated_at"] = datetime.now()
+
+    def update_tuple_with_new_name(
+        self, process_id: str, old_name: str, new_name: str
+    ) -> None:
+        with self._lock:
+            self._entry(process_id)["renames"][old_name] = new_name
+
+    def finish_process(self, process_id: str) -> None:
+        with self._lock:
+            entry = self._entry(process_id)
+            entry["status"] = {"type": "completed", "message": ""}
+            entry["finished_at"] = datetime.now()
+        self.flush([process_id])
+
+    def get_latest_processes(self, user_id: str, limit: int = 5):
+        self.flush()
+        return self.backend.get_latest_processes(user_id, limit=limit)
+
+    def _fields(self, process_id: str, entry: dict) -> Optional[dict]:
+        """Firestore fields for a pending entry; None if there is nothing to write."""
+        fields = {
+            key: entry[key]
+            for key in ("status", "updated_at", "finished_at")
+            if key in entry
+        }
+        if entry["renames"]:
+            files = self.backend.get_process_files(process_id)
+            if files is None:
+                # Mirrors FirestoreHelper: renames of a missing process are ignored
+                files = []
+            files = [
+                {"old_name": file["old_name"], "new_name": entry["renames"][file["old_name"]]}
+                if file.get("old_name") in entry["renames"]
+                else file
+                for file in files
+            ]
+            if files:
+                fields["files"] = files
+        return fields or None
+
+    def flush(self, process_ids: Optional[List[str]] = None) -> None:
+        """Write pending updates (of the given processes, or all) in one batch."""
+        with self._flush_lock:
+            with self._lock:
+                ids = list(self._pending) if process_ids is None else [
+                    process_id for process_id in process_ids if process_id in self._pending
+                ]
+                taken = {process_id: self._pending.pop(process_id) for process_id in ids}
+            if not taken:
+                return
+
+            updates = {}
+            for process_id, entry in taken.items():
+                try:
+                    fields = self._fields(process_id, entry)
+                except Exception:
+                    logger.exception(f"Failed to read process {process_id}")
+                    self._requeue(process_id, entry)
+                    continue
+                if fields:
+                    updates[process_id] = fields
+            if not updates:
+                return
+
+            try:
+                self.backend.write_process_updates(updates)
+                failed = []
+            except Exception:
+                # One bad document fails the whole batch; find it
+                failed = []
+                for process_id, fields in updates.items():
+                    try:
+                        self.backend.write_process_updates({process_id: fields})
+                    except Exception as e:
+                        logger.warning(
+                            f"Failed to write status of process {process_id}: {e!r}"
+                        )
+                        failed.append(process_id)
+            for process_id in updates:
+                if process_id in failed:
+                    self._requeue(process_id, taken[process_id])
+                else:
+                    with self._lock:
+                        self._failures.pop(process_id, None)
+
+    def _requeue(self, process_id: str, entry: dict) -> None:
+        """Put a failed entry back under any newer updates, up to a retry limit."""
+        with self._lock:
+            failures = self._failures.get(process_id, 0) + 1
+            if failures >= _MAX_FLUSH_FAILURES:
+                logger.error(f"Dropping status updates of process {process_id}")
+                self._failures.pop(process_id, None)
+                return
+            self._failures[process_id] = failures
+            newer = self._pending.get(process_id, {"renames": {}})
+            merged = {**entry, **{k: v for k, v in newer.items() if k != "renames"}}
+            merged["renames"] = {**entry["renames"], **newer["renames"]}
+            self._pending[process_id] = merged
+
+    def close(self) -> None:
+        """Stop the flush thread and write everything still pending."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
@@ -0,0 +1,311 @@
+"""Streaming, memory-bounded conversion of very large documents.
+
+MarkItDown builds the whole markdown string in memory, on top of the parsed
+document. The string is then sent back from the conversion worker and held
+while the file is analyzed and stored. A 2,000-page PDF or a 500 MB CSV can
+add gigabytes to a worker that way.
+
+Inputs of at least ``STREAM_CONVERT_MIN_MB`` with a streamable type are
+converted differently:
+
+- PDFs page by page (same text as MarkItDown's pdfminer fallback)
+- CSV and XLSX files in batches of ``STREAM_BATCH_ROWS`` rows, as markdown
+  tables
+
+The markdown is appended to a temporary file next to the upload while its hash
+and a short prefix are taken. The worker returns a ``MarkdownFile`` handle in
+place of the text. Only the prefix goes to the analysis, and the content store
+adopts the file as its blob without reading it back.
+
+After each page or batch the worker's resident memory is checked against
+``STREAM_PEAK_MEMORY_MB``. Going over it fails the file with a
+``MemoryError``, before the address-space limit of the conversion pool would
+kill the worker.
+"""
+
+from __future__ import annotations
+
+import csv
+import gc
+import hashlib
+import io
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from dotenv import load_dotenv
+
+from .content_store import MarkdownFile
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - non-POSIX
+    resource = None
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Inputs at least this large (in MB) are converted by streaming
+STREAM_CONVERT_MIN_MB = float(os.getenv("STREAM_CONVERT_MIN_MB", "20"))
+# CSV/XLSX rows converted and written per batch
+STREAM_BATCH_ROWS = int(os.getenv("STREAM_BATCH_ROWS", "5000"))
+# Resident memory ceiling of a streaming conversion (0 disables it)
+STREAM_PEAK_MEMORY_MB = int(os.getenv("STREAM_PEAK_MEMORY_MB", "1024"))
+
+STREAMABLE_EXTENSIONS = {"pdf", "csv", "xlsx"}
+
+# Characters of markdown kept in memory for the analysis
+_PREFIX_CHARS = 4096
+# Bytes of a CSV read to detect its encoding
+_ENCODING_SAMPLE = 1 << 20
+# Same escaping as MarkItDown's CSV converter
+_PIPE_ESCAPE_RE = re.compile(r"(?<!\\)(\\*)\|")
+
+
+def should_stream(path: Path) -> bool:
+    """Whether a document is large enough, and of a type, to convert by streaming."""
+    ext = path.suffix.lower().lstrip(".")
+    if ext not in STREAMABLE_EXTENSIONS:
+        return False
+    return path.stat().st_size >= STREAM_CONVERT_MIN_MB * 1024 * 1024
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        if resource is None:
+            return 0
+        # Peak rather than current RSS, in KB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class MemoryCeiling:
+    """Raises `MemoryError` once resident memory stays above `limit_mb`."""
+
+    def __init__(self, limit_mb: int = STREAM_PEAK_MEMORY_MB):
+        self.limit_bytes = max(0, limit_mb) * 1024 * 1024
+        self.peak_bytes = 0
+
+    def check(self) -> None:
+        rss = _rss_bytes()
+        if self.limit_bytes and rss > self.limit_bytes:
+            gc.collect()
+            rss = _rss_bytes()
+        self.peak_bytes = max(self.peak_bytes, rss)
+        if self.limit_bytes and rss > self.limit_bytes:
+            raise MemoryError(
+                f"Conversion exceeded the {self.limit_bytes // (1024 * 1024)} MB "
+                f"memory ceiling ({rss // (1024 * 1024)} MB resident)"
+            )
+
+
+class _MarkdownWriter:
+    """Appends markdown to a file while hashing it and keeping its prefix."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = path.open("w", encoding="utf-8", newline="")
+        self._digest = hashlib.sha256()
+        self._size = 0
+        self._prefix: List[str] = []
+        self._prefix_chars = 0
+
+    def write(self, text: str) -> None:
+        if not text:
+            return
+        self._file.write(text)
+        data = text.encode("utf-8")
+        self._digest.update(data)
+        self._size += len(data)
+        if self._prefix_chars < _PREFIX_CHARS:
+            piece = text[: _PREFIX_CHARS - self._prefix_chars]
+            self._prefix.append(piece)
+            self._prefix_chars += len(piece)
+
+    def finish(self) -> MarkdownFile:
+        self._file.close()
+        prefix = "".join(self._prefix)
+        if not prefix.strip():
+            raise RuntimeError("Streaming conversion did not return Markdown text")
+        return MarkdownFile(self.path, self._digest.hexdigest(), self._size, prefix)
+
+    def abort(self) -> None:
+        self._file.close()
+        self.path.unlink(missing_ok=True)
+
+
+def _escape_cell(value) -> str:
+    value = "" if value is None else str(value)
+    value = _PIPE_ESCAPE_RE.sub(lambda m: m.group(1) * 2 + r"\|", value)
+    return value.replace("\r\n", " ").replace("\n", " ").replace("\r", " ")
+
+
+def _table_row(cells: Iterable, width: int) -> str:
+    cells = [_escape_cell(cell) for cell in cells]
+    cells.extend([""] * (width - len(cells)))
+    return "| " + " | ".join(cells) + " |"
+
+
+def _write_table(
+    writer: _MarkdownWriter,
+    rows: Iterable[list],
+    width: int,
+    ceiling: MemoryCeiling,
+    batch_rows: int,
+) -> None:
+    """Write rows as a markdown table (the first row is the header), in batches."""
+    batch: List[str] = []
+    header = True
+    for row in rows:
+        batch.append(_table_row(row, width))
+        if header:
+            batch.append("| " + " | ".join(["---"] * width) + " |")
+            header = False
+        if len(batch) >= batch_rows:
+            writer.write("\n".join(batch) + "\n")
+            batch.clear()
+            ceiling.check()
+    writer.write("\n".join(batch))
+    ceiling.check()
+
+
+def _detect_encoding(path: Path) -> str:
+    from charset_normalizer import from_bytes
+
+    with path.open("rb") as f:
+        sample = f.read(_ENCODING_SAMPLE)
+    best = from_bytes(sample).best()
+    return best.encoding if best is not None else "utf-8"
+
+
+def _csv_rows(path: Path, encoding: str) -> Iterable[list]:
+    """CSV rows with blank rows at the start, end and after the header removed."""
+    with path.open(encoding=encoding, errors="replace", newline="") as f:
+        # Excel and other tools prepend a UTF-8 BOM to CSV exports
+        if f.read(1) != "\ufeff":
+            f.seek(0)
+        blanks = 0
+        seen = 0
+        for row in csv.reader(f):
+            if not row:
+                blanks += 1
+                continue
+            if seen > 1:
+                # Blank rows inside the table are kept
+                for _ in range(blanks):
+                    yield []
+            blanks = 0
+            seen += 1
+            yield row
+
+
+def _stream_csv(
+    path: Path, writer: _MarkdownWriter, ceiling: MemoryCeiling, batch_rows: int
+) -> None:
+    encoding = _detect_encoding(path)
+    # A first pass finds the widest row so every row can be padded to it
+    width = max((len(row) for row in _csv_rows(path, encoding)), default=0)
+    if width:
+        _write_table(writer, _csv_rows(path, encoding), width, ceiling, batch_rows)
+
+
+def _stream_xlsx(
+    path: Path, writer: _MarkdownWriter, ceiling: MemoryCeiling, batch_rows: int
+) -> None:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(str(path), read_only=True, data_only=True)
+    try:
+        for index, sheet in enumerate(workbook.worksheets):
+            writer.write(("\n\n" if index else "") + f"## {sheet.title}\n")
+
+            def rows():
+                for row in sheet.iter_rows(values_only=True):
+                    if any(value is not None for value in row):
+                        yield list(row)
+
+            width = sheet.max_column or max((len(row) for row in rows()), default=0)
+            if width:
+                _write_table(writer, rows(), width, ceiling, batch_rows)
+            ceiling.check()
+    finally:
+        workbook.close()
+
+
+def _stream_pdf(path: Path, writer: _MarkdownWriter, ceiling: MemoryCeiling) -> None:
+    from pdfminer.converter import TextConverter
+    from pdfminer.layout import LAParams
+    from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+    from pdfminer.pdfpage import PDFPage
+
+    # Without caching, fonts and page objects are not kept for the whole document
+    resources = PDFResourceManager(caching=False)
+    page_text = io.StringIO()
+    device = TextConverter(resources, page_text, laparams=LAParams())
+    interpreter = PDFPageInterpreter(resources, device)
+    try:
+        with path.open("rb") as f:
+            for page in PDFPage.get_pages(f, caching=False):
+                interpreter.process_page(page)
+                writer.write(page_text.getvalue())
+                page_text.seek(0)
+                page_text.truncate()
+                ceiling.check()
+    finally:
+        device.close()
+
+
+def stream_to_markdown(
+    file_path: str,
+    batch_rows: int = STREAM_BATCH_ROWS,
+    peak_memory_mb: int = STREAM_PEAK_MEMORY_MB,
+    output: Optional[Path] = None,
+) -> MarkdownFile:
+    """Convert a large PDF, CSV or XLSX file to a markdown file by streaming.
+
+    Args:
+        file_path: Path to the input document
+        batch_rows: Rows converted and written at a time (CSV/XLSX)
+        peak_memory_mb: Resident memory ceiling (0 disables it)
+        output: Markdown file to write; defaults to a hidden file next to the input
+
+    Returns:
+        A `MarkdownFile` for the written markdown, marked temporary
+
+    Raises:
+        FileNotFoundError: If the path does not exist or is not a file.
+        ValueError: If the file type cannot be streamed.
+        MemoryError: If the conversion goes over the memory ceiling.
+        RuntimeError: If the conversion does not yield Markdown text.
+    """
+    path = Path(file_path)
+    if not path.exists() or not path.is_file():
+        raise FileNotFoundError(f"Input path is not a file: {file_path}")
+    ext = path.suffix.lower().lstrip(".")
+    if ext not in STREAMABLE_EXTENSIONS:
+        raise ValueError(f"Cannot stream-convert '.{ext}' files")
+
+    writer = _MarkdownWriter(output or path.with_name(f".{path.name}.md.partial"))
+    ceiling = MemoryCeiling(peak_memory_mb)
+    batch_rows = max(1, batch_rows)
+    try:
+        if ext == "pdf":
+            _stream_pdf(path, writer, ceiling)
+        elif ext == "csv":
+            _stream_csv(path, writer, ceiling, batch_rows)
+        else:
+            _stream_xlsx(path, writer, ceiling, batch_rows)
+        markdown = writer.finish()
+    except BaseException:
+        writer.abort()
+        raise
+    logger.info(
+        f"Streamed {path.name} to {markdown.size / (1024 * 1024):.1f} MB of markdown "
+        f"(peak RSS {ceiling.peak_bytes / (1024 * 1024):.0f} MB)"
+    )
+    return markdown
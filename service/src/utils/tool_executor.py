@@ -0,0 +1,130 @@
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import AsyncIterator, List, Optional
+
+import mcp.types as mcp_types
+from dotenv import load_dotenv
+
+from .tool_pool import ToolServer, close_tool_pool, get_tool_pool
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# "subprocess" runs tools in isolated MCP server processes (see tool_pool.py),
+# "inprocess" calls the tool functions directly on a thread pool.
+TOOL_EXECUTION_MODE = os.getenv("TOOL_EXECUTION_MODE", "subprocess")
+TOOL_THREADS = int(os.getenv("TOOL_THREADS", "8"))
+
+
+def mcp_result_to_text(result: mcp_types.CallToolResult) -> str:
+    """Flatten an MCP tool result into the string handed back to the model."""
+    if getattr(result, "structuredContent", None):
+        return json.dumps(result.structuredContent)
+    parts = []
+    for c in result.content:
+        if isinstance(c, mcp_types.TextContent):
+            parts.append(c.text)
+    return "\n".join(parts) if parts else ""
+
+
+class SubprocessToolExecutor:
+    """Runs tools through a pooled `tools.py` MCP server over stdio."""
+
+    def __init__(self, server: ToolServer):
+        self._server = server
+        self.tools: List[mcp_types.Tool] = server.tools
+
+    async def call_tool(self, name: str, args: dict) -> str:
+        result = await self._server.session.call_tool(name, args)
+        return mcp_result_to_text(result)
+
+    def retire(self) -> None:
+        """Don't reuse the server after this run; it may still be busy with a call."""
+        self._server.retired = True
+
+
+class InProcessToolExecutor:
+    """Calls the `tools.py` functions directly, skipping the JSON-RPC hop.
+
+    The tools do blocking file I/O, so calls run on a dedicated thread pool to
+    keep the event loop free.
+    """
+
+    def __init__(self, max_workers: int = TOOL_THREADS):
+        from . import tools
+
+        self._tools_module = tools
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="helix-tool"
+        )
+        self.tools: List[mcp_types.Tool] = []
+
+    async def start(self) -> None:
+        if not self.tools:
+            self.tools = await self._tools_module.mcp.list_tools()
+
+    async def call_tool(self, name: str, args: dict) -> str:
+        if name not in {t.name for t in self.tools}:
+            return f"Unknown tool: {name}"
+        fn = getattr(self._tools_module, name)
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self._executor, partial(fn, **args))
+        except Exception as e:
+            # Mirror the MCP server, which reports tool errors to the model
+            return f"Error executing tool {name}: {str(e)}"
+        return result if isinstance(result, str) else json.dumps(result)
+
+    def retire(self) -> None:
+        # A running thread can't be stopped; it finishes in the background
+        pass
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_in_process: Optional[InProcessToolExecutor] = None
+
+
+async def get_in_process_executor() -> InProcessToolExecutor:
+    global _in_process
+    if _in_process is None:
+        _in_process = InProcessToolExecutor()
+    await _in_process.start()
+    return _in_process
+
+
+@asynccontextmanager
+async def tool_executor(mode: Optional[str] = None) -> AsyncIterator:
+    """Yield a tool executor for one agent run in the configured mode."""
+    mode = mode or TOOL_EXECUTION_MODE
+    if mode == "inprocess":
+        yield await get_in_process_executor()
+    elif mode == "subprocess":
+        async with get_tool_pool().acquire() as server:
+            yield SubprocessToolExecutor(server)
+    else:
+        raise ValueError(
+            f"Unknown TOOL_EXECUTION_MODE '{mode}'. Expected 'subprocess' or 'inprocess'"
+        )
+
+
+async def start_tool_executors() -> None:
+    if TOOL_EXECUTION_MODE == "inprocess":
+        await get_in_process_executor()
+    else:
+        await get_tool_pool().start()
+
+
+async def close_tool_executors() -> None:
+    global _in_process
+    await close_tool_pool()
+    if _in_process is not None:
+        _in_process.close()
+        _in_process = None
@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, List, Optional
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+import mcp.types as mcp_types
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+TOOL_POOL_MAX_SIZE = int(os.getenv("TOOL_POOL_MAX_SIZE", "8"))
+TOOL_POOL_MIN_SIZE = int(os.getenv("TOOL_POOL_MIN_SIZE", "3"))
+TOOL_POOL_MAX_LIFETIME = float(os.getenv("TOOL_POOL_MAX_LIFETIME", "1800"))
+TOOL_POOL_MAX_USES = int(os.getenv("TOOL_POOL_MAX_USES", "500"))
+TOOL_POOL_HEALTH_CHECK_INTERVAL = float(
+    os.getenv("TOOL_POOL_HEALTH_CHECK_INTERVAL", "30")
+)
+TOOL_POOL_HEALTH_CHECK_TIMEOUT = float(
+    os.getenv("TOOL_POOL_HEALTH_CHECK_TIMEOUT", "5")
+)
+
+
+class ToolServer:
+    """A warm `tools.py` subprocess with an initialized MCP client session.
+
+    The stdio transport and session are async context managers that must be
+    entered and exited from the same task, so each server owns a background
+    task that keeps them open until `close()` is called.
+    """
+
+    def __init__(self, params: StdioServerParameters):
+        self._params = params
+        self._ready = asyncio.Event()
+        self._closing = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._error: Optional[BaseException] = None
+        self.session: Optional[ClientSession] = None
+        self.tools: List[mcp_types.Tool] = []
+        self.created_at = time.monotonic()
+        self.last_used_at = self.created_at
+        self.uses = 0
+        # Set when a call was abandoned while the server may still be running it
+        self.retired = False
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+        await self._ready.wait()
+        if self._error is not None:
+            raise RuntimeError(f"Tool server failed to start: {self._error}")
+
+    async def _run(self) -> None:
+        try:
+            async with stdio_client(self._params) as (read, write):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    self.tools = (await session.list_tools()).tools
+                    self.session = session
+                    self._ready.set()
+                    await self._closing.wait()
+        except BaseException as e:
+            self._error = e
+            if not isinstance(e, asyncio.CancelledError):
+                logger.error(f"Tool server stopped: {str(e)}")
+        finally:
+            self.session = None
+            self._ready.set()
+
+    @property
+    def alive(self) -> bool:
+        return (
+            self.session is not None
+            and self._task is not None
+            and not self._task.done()
+        )
+
+    def expired(self, max_lifetime: float, max_uses: int) -> bool:
+        age = time.monotonic() - self.created_at
+        return age >= max_lifetime or self.uses >= max_uses
+
+    async def healthy(self, timeout: float) -> bool:
+        if not self.alive:
+            return False
+        try:
+            await asyncio.wait_for(self.session.send_ping(), timeout=timeout)
+            return True
+        except Exception as e:
+            logger.warning(f"Tool server failed health check: {str(e)}")
+            return False
+
+    async def close(self, timeout: float = 5) -> None:
+        if self._task is None or self._task.done():
+            return
+        self._closing.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout=timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            self._task.cancel()
+        except Exception:
+            pass
+
+
+class ToolServerPool:
+    """Bounded pool of warm MCP tool servers shared by all search agents.
+
+    Servers are not tied to a user: the agent passes `user_id` and
+    `subdirectory` as tool arguments. A server is checked out exclusively for
+    the duration of one agent run, health-checked when it has been idle for a
+    while, and recycled once it exceeds its maximum lifetime or use count. A
+    server retired because a call timed out is closed when it is released,
+    which also stops the abandoned call.
+    """
+
+    def __init__(
+        self,
+        max_size: int = TOOL_POOL_MAX_SIZE,
+        min_size: int = TOOL_POOL_MIN_SIZE,
+        max_lifetime: float = TOOL_POOL_MAX_LIFETIME,
+        max_uses: int = TOOL_POOL_MAX_USES,
+        health_check_interval: float = TOOL_POOL_HEALTH_CHECK_INTERVAL,
+        health_check_timeout: float = TOOL_POOL_HEALTH_CHECK_TIMEOUT,
+    ):
+        self.max_size = max(1, max_size)
+        self.min_size = max(0, min(min_size, self.max_size))
+        self.max_lifetime = max_lifetime
+        self.max_uses = max_uses
+        self.health_check_interval = health_check_interval
+        self.health_check_timeout = health_check_timeout
+        self._params = StdioServerParameters(
+            command="python",
+            args=[str(Path(__file__).parent / "tools.py")],
+        )
+        self._idle: List[ToolServer] = []
+        self._in_use = 0
+        self._slots = asyncio.Semaphore(self.max_size)
+        self._closed = False
+
+    async def start(self) -> None:
+        """Pre-warm `min_size` servers so the first searches skip startup."""
+        results = await asyncio.gather(
+            *[self._spawn() for _ in range(self.min_size - len(self._idle))],
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, ToolServer):
+                self._idle.append(result)
+            else:
+                logger.error(f"Failed to pre-warm tool server: {str(result)}")
+        logger.info(f"Tool server pool started with {len(self._idle)} warm servers")
+
+    async def _spawn(self) -> ToolServer:
+        server = ToolServer(self._params)
+        await server.start()
+        return server
+
+    async def _checkout(self) -> ToolServer:
+        while self._idle:
+            server = self._idle.pop()
+            if server.expired(self.max_lifetime, self.max_uses):
+                logger.info("Recycling tool server after max lifetime/uses")
+                await server.close()
+                continue
+            idle_for = time.monotonic() - server.last_used_at
+            if idle_for >= self.health_check_interval and not await server.healthy(
+                self.health_check_timeout
+            ):
+                await server.close()
+                continue
+            if not server.alive:
+                await server.close()
+                continue
+            return server
+        return await self._spawn()
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[ToolServer]:
+        """Check out a server for exclusive use, waiting if the pool is full."""
+        if self._closed:
+            raise RuntimeError("Tool server pool is closed")
+        async with self._slots:
+            server = await self._checkout()
+            self._in_use += 1
+            try:
+                yield server
+            except BaseException:
+                # The session may be left mid-request; never hand it out again
+                await server.close()
+                raise
+            finally:
+                self._in_use -= 1
+            server.uses += 1
+            server.last_used_at = time.monotonic()
+            if self._closed or server.retired or not server.alive:
+                if server.retired:
+                    logger.info("Closing tool server after a timed-out call")
+                await server.close()
+            else:
+                self._idle.append(server)
+
+    async def close(self) -> None:
+        self._closed = True
+        idle, self._idle = self._idle, []
+        await asyncio.gather(*[server.close() for server in idle])
+
+    def stats(self) -> dict:
+        return {
+            "idle": len(self._idle),
+            "in_use": self._in_use,
+            "max_size": self.max_size,
+        }
+
+
+_pool: Optional[ToolServerPool] = None
+
+
+def get_tool_pool() -> ToolServerPool:
+    """Return the process-wide tool server pool, creating it on first use."""
+    global _pool
+    if _pool is None or _pool._closed:
+        _pool = ToolServerPool()
+    return _pool
+
+
+async def close_tool_pool() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
@@ -1,39 +1,113 @@
+import io
 import logging
 import os
 import re
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from functools import lru_cache, partial, wraps
+from itertools import islice
 from pathlib import Path
 
+import anyio
 from mcp.server.fastmcp import FastMCP
 
+try:
+    from .line_index import read_bytes, read_lines
+    from .search_index import SearchIndex, sre_parse
+    from .vector_index import VectorIndex
+except ImportError:  # Launched as a standalone script by the agent
+    from line_index import read_bytes, read_lines
+    from search_index import SearchIndex, sre_parse
+    from vector_index import VectorIndex
+
 logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 mcp = FastMCP("local_tools")
 
+
+def _threaded_tool(fn):
+    """Register a blocking tool with the MCP server, run on a worker thread.
+
+    FastMCP calls sync tools directly on the server's event loop, which would
+    run the concurrent calls of an agent turn one after another. The module
+    keeps the plain function for the in-process executor.
+    """
+
+    @wraps(fn)
+    async def run_in_thread(*args, **kwargs):
+        return await anyio.to_thread.run_sync(partial(fn, *args, **kwargs))
+
+    mcp.tool()(run_in_thread)
+    return fn
+
+# Upper bound on how much read_file returns in one call
+READ_FILE_MAX_BYTES = int(os.getenv("READ_FILE_MAX_BYTES", "65536"))
+
+# Workers used by grep when searching many files. "thread" overlaps file I/O;
+# "process" also parallelizes regex matching, which holds the GIL.
+GREP_WORKERS = int(os.getenv("GREP_WORKERS", str(min(8, os.cpu_count() or 1))))
+GREP_POOL = os.getenv("GREP_POOL", "thread")
+# Files handed to a worker at a time; early termination happens between batches
+GREP_BATCH_SIZE = int(os.getenv("GREP_BATCH_SIZE", "64"))
+# Files up to this size are checked with one whole-file regex search first
+GREP_PREFILTER_MAX_BYTES = 8 * 1024 * 1024
+# Number of recent patterns whose "no match" files are remembered
+GREP_MEMO_PATTERNS = int(os.getenv("GREP_MEMO_PATTERNS", "128"))
+
 # Uploads directory is one level up from project root (adjacent to project)
 BASE_DIR = (
     Path(__file__).resolve().parents[3] / "uploads"
 )  # Go up 3 levels from src/utils/tools.py
 
 
-def get_user_dir() -> Path:
-    """Get the user's directory based on USER_ID and SUBDIRECTORY environment variables.
+SUBDIRECTORIES = {"links", "docs", "media"}
+
+
+def get_user_dir(user_id: str | None = None, subdirectory: str | None = None) -> Path:
+    """Get the user's directory for the given scope.
+
+    The scope is normally passed as tool arguments by the agent so one server
+    process can serve any user; the USER_ID and SUBDIRECTORY environment
+    variables are used as a fallback for single-scope servers.
 
     Returns:
         Path to user's directory: uploads/<user_id>/processed/<subdirectory>/
     """
-    user_id = os.getenv("USER_ID")
+    user_id = user_id or os.getenv("USER_ID")
     if not user_id:
-        raise ValueError("USER_ID environment variable is not set")
+        raise ValueError("user_id is not set")
+    if user_id in (".", "..") or "/" in user_id or "\\" in user_id:
+        raise ValueError(f"Invalid user_id '{user_id}'")
 
-    subdirectory = os.getenv("SUBDIRECTORY")
+    subdirectory = subdirectory or os.getenv("SUBDIRECTORY")
     if not subdirectory:
-        raise ValueError("SUBDIRECTORY environment variable is not set")
+        raise ValueError("subdirectory is not set")
+    if subdirectory not in SUBDIRECTORIES:
+        raise ValueError(
+            f"Invalid subdirectory '{subdirectory}'. Expected one of: {', '.join(sorted(SUBDIRECTORIES))}"
+        )
 
     user_dir = BASE_DIR / user_id / "processed" / subdirectory
 
     return user_dir
 
 
+def get_search_index(user_dir: Path) -> SearchIndex:
+    """Get the search index for a user's subdirectory, synced with disk."""
+    index = SearchIndex.for_category(user_dir.parents[1], user_dir.name)
+    index.sync()
+    return index
+
+
 def validate_path(user_dir: Path, rel_path: str) -> Path:
     """Validate that a relative path resolves within the user's directory."""
     full_path = (user_dir / rel_path).resolve()
@@ -43,17 +117,35 @@ def validate_path(user_dir: Path, rel_path: str) -> Path:
     return full_path
 
 
-@mcp.tool()
-def read_file(file_path: str) -> str:
-    """Read and return the contents of a file.
+@_threaded_tool
+def read_file(
+    file_path: str,
+    start_line: int | None = None,
+    end_line: int | None = None,
+    byte_offset: int | None = None,
+    max_bytes: int | None = None,
+    user_id: str | None = None,
+    subdirectory: str | None = None,
+) -> str:
+    """Read the contents of a file, or a slice of it.
+
+    Small files are returned whole. Large files, and any call with a range, are
+    returned as a slice with a header giving the total number of lines and
+    bytes, and a note on how to request the next slice.
 
     Args:
         file_path: Relative path to the file.
+        start_line: First line to return (1-based). Defaults to 1.
+        end_line: Last line to return (inclusive). Defaults to the end of the file.
+        byte_offset: Read from this byte offset instead of by lines.
+        max_bytes: Maximum number of bytes to return (capped by the server limit).
+        user_id: Owner of the files. Injected by the agent, not chosen by the model.
+        subdirectory: Category to search (links/docs/media). Injected by the agent.
 
     Returns:
-        The contents of the file as a string.
+        The contents of the file (or requested slice) as a string.
     """
-    user_dir = get_user_dir()
+    user_dir = get_user_dir(user_id, subdirectory)
     full_path = validate_path(user_dir, file_path)
 
     if not full_path.exists():
@@ -62,26 +154,77 @@ def read_file(file_path: str) -> str:
     if not full_path.is_file():
         raise ValueError(f"'{file_path}' is not a file")
 
+    cap = READ_FILE_MAX_BYTES
+    if max_bytes is not None and max_bytes > 0:
+        cap = min(max_bytes, READ_FILE_MAX_BYTES)
+    size = full_path.stat().st_size
+
+    if byte_offset is not None:
+        data, size = read_bytes(full_path, byte_offset, cap)
+        end = max(0, byte_offset) + len(data)
+        # A byte range may cut multi-byte characters at either edge
+        text = data.decode("utf-8", errors="ignore")
+        result = f"[{file_path}: bytes {max(0, byte_offset)}-{end} of {size}]\n{text}"
+        if end < size:
+            result += f"\n[Truncated. Call read_file with byte_offset={end} to continue.]"
+        return result
+
+    if start_line is None and end_line is None and size <= cap:
+        try:
+            with open(full_path, "r", encoding="utf-8") as f:
+                return f.read()
+        except UnicodeDecodeError:
+            raise ValueError(
+                f"'{file_path}' is not a text file or uses unsupported encoding"
+            )
+
+    requested_end = end_line if end_line is not None else sys.maxsize
+    data, first, last, total_lines, end = read_lines(
+        full_path, start_line or 1, requested_end, cap
+    )
     try:
-        with open(full_path, "r", encoding="utf-8") as f:
-            return f.read()
-    except UnicodeDecodeError:
-        raise ValueError(
-            f"'{file_path}' is not a text file or uses unsupported encoding"
+        text = data.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # Tolerate a character cut by the byte cap, reject anything else
+        if e.start < len(data) - 3:
+            raise ValueError(
+                f"'{file_path}' is not a text file or uses unsupported encoding"
+            )
+        text = data[: e.start].decode("utf-8")
+
+    if not data:
+        return f"[{file_path}: no lines in range; the file has {total_lines} lines ({size} bytes)]"
+
+    if last < first:
+        # A single line longer than the cap: continue it by byte offset
+        return (
+            f"[{file_path}: start of line {first} of {total_lines}, {size} bytes total]\n{text}"
+            f"\n[Truncated. Call read_file with byte_offset={end} to continue.]"
         )
 
+    result = f"[{file_path}: lines {first}-{last} of {total_lines}, {size} bytes total]\n{text}"
+    if last < min(requested_end, total_lines):
+        result += f"\n[Truncated at {cap} bytes. Call read_file with start_line={last + 1} to continue.]"
+    return result
+
 
-@mcp.tool()
-def list_file(directory_path: str = "") -> str:
+@_threaded_tool
+def list_file(
+    directory_path: str = "",
+    user_id: str | None = None,
+    subdirectory: str | None = None,
+) -> str:
     """List files and directories in the specified directory.
 
     Args:
         directory_path: Relative path to directory (empty string for root directory)
+        user_id: Owner of the files. Injected by the agent, not chosen by the model.
+        subdirectory: Category to search (links/docs/media). Injected by the agent.
 
     Returns:
         Formatted listing of files and directories with [DIR] or [FILE] indicators
     """
-    user_dir = get_user_dir()
+    user_dir = get_user_dir(user_id, subdirectory)
     full_path = validate_path(user_dir, directory_path)
 
     if not full_path.exists():
@@ -103,13 +246,20 @@ def list_file(directory_path: str = "") -> str:
     return "\n".join(items)
 
 
-@mcp.tool()
-def grep(pattern: str, file_path: str | None = None) -> str:
+@_threaded_tool
+def grep(
+    pattern: str,
+    file_path: str | None = None,
+    user_id: str | None = None,
+    subdirectory: str | None = None,
+) -> str:
     """Search for a regex pattern in files.
 
     Args:
         pattern: Regular expression pattern to search for.
         file_path: Optional relative path to a specific file. If None, searches all files recursively.
+        user_id: Owner of the files. Injected by the agent, not chosen by the model.
+        subdirectory: Category to search (links/docs/media). Injected by the agent.
 
     Returns:
         Matching lines in format 'filename:line_number:line_content' (max 100 matches)
@@ -119,7 +269,7 @@ def grep(pattern: str, file_path: str | None = None) -> str:
     except re.error as e:
         raise ValueError(f"Invalid regex pattern: {str(e)}")
 
-    user_dir = get_user_dir()
+    user_dir = get_user_dir(user_id, subdirectory)
     matches = []
     max_matches = 100
 
@@ -141,16 +291,29 @@ def grep(pattern: str, file_path: str | None = None) -> str:
                 "User directory does not exist. Please create it first."
             )
 
-        for file in user_dir_resolved.rglob("*"):
-            if file.is_file():
-                rel_path = file.relative_to(user_dir_resolved)
-                file_matches = _search_file(
-                    file, regex, str(rel_path), max_matches - len(matches)
-                )
-                matches.extend(file_matches)
+        candidates = None
+        try:
+            candidates = get_search_index(user_dir).candidates(pattern)
+        except Exception:
+            logger.exception("Search index unavailable, falling back to full scan")
+
+        if candidates is None:
+            files = (
+                (file, file.relative_to(user_dir_resolved))
+                for file in user_dir_resolved.rglob("*")
+                if file.is_file()
+            )
+        else:
+            files = (
+                (user_dir_resolved / rel_path, rel_path) for rel_path in candidates
+            )
 
-                if len(matches) >= max_matches:
-                    break
+        matches = _search_files(
+            [(file, str(rel_path)) for file, rel_path in files],
+            regex,
+            max_matches,
+            GREP_WORKERS,
+        )
 
     if not matches:
         return f"No matches found for pattern: {pattern}"
@@ -162,19 +325,307 @@ def grep(pattern: str, file_path: str | None = None) -> str:
     return result
 
 
+@_threaded_tool
+def search(
+    query: str,
+    limit: int = 10,
+    user_id: str | None = None,
+    subdirectory: str | None = None,
+) -> str:
+    """Rank files by relevance to a free-text query.
+
+    Args:
+        query: Words to look for, e.g. "kubernetes autoscaling".
+        limit: Maximum number of files to return (default 10).
+        user_id: Owner of the files. Injected by the agent, not chosen by the model.
+        subdirectory: Category to search (links/docs/media). Injected by the agent.
+
+    Returns:
+        One block per file, best first, in format 'filename (score)' followed by up
+        to 3 matching lines as 'line_number:line_content'
+    """
+    user_dir = get_user_dir(user_id, subdirectory).resolve()
+    if not user_dir.exists():
+        raise FileNotFoundError(
+            "User directory does not exist. Please create it first."
+        )
+
+    results = get_search_index(user_dir).search(query, limit=max(1, min(limit, 50)))
+    if not results:
+        return f"No files found for query: {query}"
+
+    blocks = []
+    for rel_path, score, line_numbers in results:
+        wanted = set(line_numbers[:3])
+        lines = []
+        try:
+            with open(user_dir / rel_path, "r", encoding="utf-8") as f:
+                for line_num, line in enumerate(f, 1):
+                    if line_num in wanted:
+                        lines.append(f"  {line_num}:{line.rstrip()}")
+                        if len(lines) == len(wanted):
+                            break
+        except (OSError, UnicodeDecodeError):
+            pass
+        blocks.append("\n".join([f"{rel_path} ({score:.2f})", *lines]))
+
+    return "\n\n".join(blocks)
+
+
+@_threaded_tool
+def semantic_search(
+    query: str,
+    limit: int = 5,
+    user_id: str | None = None,
+    subdirectory: str | None = None,
+) -> str:
+    """Find the passages most similar in meaning to a natural-language query.
+
+    Args:
+        query: What you are looking for, phrased as a question or description.
+        limit: Maximum number of passages to return (default 5).
+        user_id: Owner of the files. Injected by the agent, not chosen by the model.
+        subdirectory: Category to search (links/docs/media). Injected by the agent.
+
+    Returns:
+        One block per passage, best first, headed 'filename:start_line-end_line (score)'
+        followed by the section heading and the passage text
+    """
+    user_dir = get_user_dir(user_id, subdirectory)
+    if not user_dir.exists():
+        raise FileNotFoundError(
+            "User directory does not exist. Please create it first."
+        )
+
+    index = VectorIndex.for_category(user_dir.parents[1], user_dir.name)
+    index.sync()
+    results = index.search(query, limit=max(1, min(limit, 20)))
+    if not results:
+        return f"No passages found for query: {query}"
+
+    blocks = []
+    for result in results:
+        header = f"{result['path']}:{result['start_line']}-{result['end_line']} ({result['score']:.2f})"
+        if result["heading"]:
+            header += f"\n[{result['heading']}]"
+        blocks.append(f"{header}\n{result['text']}")
+
+    return "\n\n---\n\n".join(blocks)
+
+
+_grep_executor: Executor | None = None
+_grep_executor_lock = threading.Lock()
+
+# pattern -> {(path, size, mtime_ns)} of files known not to match it
+_no_match_memo: "OrderedDict[str, set]" = OrderedDict()
+_no_match_lock = threading.Lock()
+
+# Constructs that behave differently on a whole file than on a single line
+_PREFILTER_UNSAFE_OPS = {
+    sre_parse.ASSERT,
+    sre_parse.ASSERT_NOT,
+    sre_parse.GROUPREF,
+    sre_parse.GROUPREF_EXISTS,
+}
+_PREFILTER_UNSAFE_ATS = {sre_parse.AT_BEGINNING_STRING, sre_parse.AT_END_STRING}
+
+
+def _get_grep_executor() -> Executor:
+    global _grep_executor
+    with _grep_executor_lock:
+        if _grep_executor is None:
+            workers = max(1, GREP_WORKERS)
+            if GREP_POOL == "process":
+                _grep_executor = ProcessPoolExecutor(max_workers=workers)
+            else:
+                _grep_executor = ThreadPoolExecutor(
+                    max_workers=workers, thread_name_prefix="helix-grep"
+                )
+        return _grep_executor
+
+
+def _no_match_files(pattern: str) -> set:
+    with _no_match_lock:
+        memo = _no_match_memo.get(pattern)
+        if memo is None:
+            memo = _no_match_memo[pattern] = set()
+            while len(_no_match_memo) > GREP_MEMO_PATTERNS:
+                _no_match_memo.popitem(last=False)
+        else:
+            _no_match_memo.move_to_end(pattern)
+        return memo
+
+
+def _prefilter_safe(parsed) -> bool:
+    for op, av in parsed:
+        if op in _PREFILTER_UNSAFE_OPS:
+            return False
+        if op is sre_parse.AT and av in _PREFILTER_UNSAFE_ATS:
+            return False
+        if op is sre_parse.SUBPATTERN and not _prefilter_safe(av[-1]):
+            return False
+        if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and not _prefilter_safe(
+            av[2]
+        ):
+            return False
+        if op is sre_parse.BRANCH and not all(_prefilter_safe(b) for b in av[1]):
+            return False
+    return True
+
+
+@lru_cache(maxsize=256)
+def _prefilter(pattern: str) -> re.Pattern | None:
+    """Whole-file regex that can only miss a file if no single line matches.
+
+    With MULTILINE, ^ and $ match at line boundaries, so a match on any line is
+    also a match in the full text. Lookarounds, backreferences and \\A/\\Z can
+    see across lines and are not prefiltered.
+    """
+    try:
+        if not _prefilter_safe(sre_parse.parse(pattern)):
+            return None
+        return re.compile(pattern, re.MULTILINE)
+    except Exception:
+        return None
+
+
+def _scan_batch(
+    batch: list[tuple[int, str, str, tuple]],
+    pattern: str,
+    max_matches: int,
+    stop: threading.Event | None = None,
+) -> list[tuple[int, tuple, list[str], bool]]:
+    """Scan a batch of files; module level so process pool workers can run it.
+
+    Returns `(index, memo_key, matches, complete)` for each file scanned.
+    """
+    regex = re.compile(pattern)
+    results = []
+    for idx, path, display_name, key in batch:
+        if stop is not None and stop.is_set():
+            break
+        file_matches = _search_file(Path(path), regex, display_name, max_matches, stop)
+        complete = stop is None or not stop.is_set()
+        results.append((idx, key, file_matches, complete))
+    return results
+
+
+def _search_files(
+    files: list[tuple[Path, str]], regex: re.Pattern, max_matches: int, workers: int
+) -> list[str]:
+    """Search many files concurrently, stopping all work once enough matches exist.
+
+    Files are dispatched to the pool in batches, a few at a time, so reaching
+    `max_matches` stops further dispatch; thread workers also abort their
+    current batch. Files whose size and mtime show they were already fully
+    scanned without a match for this pattern are skipped. Results keep the
+    order of `files`.
+    """
+    memo = _no_match_files(regex.pattern)
+
+    def unscanned():
+        # Stat lazily so an early stop doesn't pay for files never reached
+        for idx, (file, display_name) in enumerate(files):
+            try:
+                stat = file.stat()
+            except OSError:
+                continue
+            key = (str(file), stat.st_size, stat.st_mtime_ns)
+            with _no_match_lock:
+                if key in memo:
+                    continue
+            yield idx, str(file), display_name, key
+
+    pending = unscanned()
+    batches = iter(lambda: list(islice(pending, GREP_BATCH_SIZE)), [])
+    found: dict = {}
+    total = 0
+
+    def record(batch_results) -> None:
+        nonlocal total
+        for idx, key, file_matches, complete in batch_results:
+            if file_matches:
+                found[idx] = file_matches
+                total += len(file_matches)
+            elif complete:
+                # Only a complete scan proves the file has no match
+                with _no_match_lock:
+                    memo.add(key)
+
+    if workers <= 1 or len(files) <= GREP_BATCH_SIZE:
+        for batch in batches:
+            record(_scan_batch(batch, regex.pattern, max_matches))
+            if total >= max_matches:
+                break
+    else:
+        executor = _get_grep_executor()
+        # Process workers cannot share an Event; they stop between batches
+        stop = None if isinstance(executor, ProcessPoolExecutor) else threading.Event()
+        in_flight = set()
+
+        def submit_next() -> None:
+            batch = next(batches, None)
+            if batch is not None:
+                in_flight.add(
+                    executor.submit(
+                        _scan_batch, batch, regex.pattern, max_matches, stop
+                    )
+                )
+
+        for _ in range(workers * 2):
+            submit_next()
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                record(future.result())
+            if total >= max_matches:
+                if stop is not None:
+                    stop.set()
+                for future in in_flight:
+                    future.cancel()
+                break
+            for _ in done:
+                submit_next()
+
+    matches = []
+    for idx in sorted(found):
+        matches.extend(found[idx][: max_matches - len(matches)])
+        if len(matches) >= max_matches:
+            break
+    return matches
+
+
 def _search_file(
-    file_path: Path, regex: re.Pattern, display_name: str, max_matches: int
+    file_path: Path,
+    regex: re.Pattern,
+    display_name: str,
+    max_matches: int,
+    stop: threading.Event | None = None,
 ) -> list[str]:
     """Helper function to search for pattern in a single file."""
     matches = []
     try:
         with open(file_path, "r", encoding="utf-8") as f:
-            for line_num, line in enumerate(f, 1):
+            prefilter = _prefilter(regex.pattern)
+            if prefilter is not None and (
+                file_path.stat().st_size <= GREP_PREFILTER_MAX_BYTES
+            ):
+                text = f.read()
+                if not prefilter.search(text):
+                    return matches
+                # Same lines as iterating the file: splitlines() would also
+                # break on \x0c (pdfminer's page break) and other separators
+                lines = io.StringIO(text)
+            else:
+                lines = f
+            for line_num, line in enumerate(lines, 1):
                 if regex.search(line):
                     matches.append(f"{display_name}:{line_num}:{line.rstrip()}")
 
                     if len(matches) >= max_matches:
                         break
+                if stop is not None and line_num % 1024 == 0 and stop.is_set():
+                    break
     except UnicodeDecodeError:
         pass
     except PermissionError:
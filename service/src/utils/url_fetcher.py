@@ -0,0 +1,211 @@
+"""Async fetch stage for URL ingestion.
+
+All page fetches share one ``httpx.AsyncClient`` (keep-alive connection pool,
+HTTP/2 when the optional ``h2`` package is installed) and are bounded by a
+global and a per-host concurrency limit, so a large batch of links runs in
+parallel without hammering any single site. The fetched HTML is handed to the
+per-site processors in ``url_helper``; sources read by blocking code (the
+GitHub API and the YouTube, Wikipedia and X SDKs) run in worker threads under
+the per-host limit. Pages go through the conditional-request cache in
+``http_cache``.
+
+Each request also takes a token from its host's bucket in ``rate_limiter``.
+A request waiting for a throttled host holds only that host's slot, so other
+hosts keep their share of the global limit. A request answered with 429
+pauses the host and is retried.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import logging
+import os
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+from urllib.parse import urlparse
+
+import httpx
+from dotenv import load_dotenv
+
+from .http_cache import get_http_cache
+from .rate_limiter import (
+    RATE_LIMIT_MAX_RETRIES,
+    RateLimited,
+    get_host_scheduler,
+    is_throttled,
+    retry_after_seconds,
+)
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+URL_FETCH_CONCURRENCY = int(os.getenv("URL_FETCH_CONCURRENCY", "16"))
+URL_FETCH_PER_HOST = int(os.getenv("URL_FETCH_PER_HOST", "4"))
+URL_FETCH_TIMEOUT = float(os.getenv("URL_FETCH_TIMEOUT", "30"))
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+BROWSER_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+
+@dataclass
+class FetchResult:
+    """Outcome of one fetch; `error` is set instead of raising."""
+
+    url: str
+    text: str = ""
+    status_code: Optional[int] = None
+    error: Optional[str] = None
+    # Key of the page in the HTTP cache, when it was cacheable
+    cache_key: Optional[str] = None
+    # Served from the cache (fresh, or revalidated with a 304)
+    from_cache: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class UrlFetcher:
+    """Shared HTTP client with global and per-host concurrency limits."""
+
+    def __init__(
+        self,
+        concurrency: int = URL_FETCH_CONCURRENCY,
+        per_host: int = URL_FETCH_PER_HOST,
+        timeout: float = URL_FETCH_TIMEOUT,
+    ):
+        self.per_host = max(1, per_host)
+        self.cache = get_http_cache()
+        self.scheduler = get_host_scheduler()
+        self._global = asyncio.Semaphore(max(1, concurrency))
+        self._hosts: dict = defaultdict(lambda: asyncio.Semaphore(self.per_host))
+        self.client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            headers=BROWSER_HEADERS,
+            follow_redirects=True,
+            timeout=httpx.Timeout(timeout, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=max(1, concurrency),
+                max_keepalive_connections=max(1, concurrency),
+            ),
+        )
+
+    @asynccontextmanager
+    async def slot(self, url: str) -> AsyncIterator[None]:
+        """Hold one per-host and one global slot for the duration of the block.
+
+        A token from the host's rate limit is taken first, so the global slot
+        is only taken once the host allows the request.
+
+        Raises:
+            RateLimited: If the host is throttled for too long.
+        """
+        async with self._hosts[self._host(url)]:
+            await self.scheduler.acquire_async(url)
+            async with self._global:
+                yield
+
+    @staticmethod
+    def _host(url: str) -> str:
+        return (urlparse(url).hostname or "").lower()
+
+    async def fetch(self, url: str, headers: Optional[dict] = None) -> FetchResult:
+        """GET a URL as text through the HTTP cache.
+
+        A fresh cached page is returned without a request; a stale one is
+        revalidated with a conditional GET.
+        """
+        entry = await asyncio.to_thread(self.cache.lookup, url, headers)
+        if entry is not None and entry.fresh:
+            text = await asyncio.to_thread(self.cache.read, entry)
+            if text is not None:
+                return FetchResult(url, text, 200, cache_key=entry.key, from_cache=True)
+
+        for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+            try:
+                async with self.slot(url):
+                    response = await self.client.get(
+                        url,
+                        headers={**(headers or {}), **(entry.validators() if entry else {})},
+                    )
+                    if response.status_code == 304 and entry is not None:
+                        text = await asyncio.to_thread(self.cache.read, entry)
+                        if text is not None:
+                            await asyncio.to_thread(
+                                self.cache.refresh, entry, response.headers
+                            )
+                            return FetchResult(
+                                url, text, 200, cache_key=entry.key, from_cache=True
+                            )
+                        # Evicted while revalidating
+                        response = await self.client.get(url, headers=headers)
+                if (
+                    is_throttled(response.status_code, response.headers)
+                    and attempt < RATE_LIMIT_MAX_RETRIES
+                ):
+                    self.scheduler.penalize(
+                        url, retry_after_seconds(response.headers), attempt
+                    )
+                    continue
+                response.raise_for_status()
+                break
+            except RateLimited as e:
+                return FetchResult(url, status_code=429, error=f"Request failed - {e}")
+            except httpx.HTTPStatusError as e:
+                return FetchResult(
+                    url, status_code=e.response.status_code, error=f"Request failed - {e}"
+                )
+            except httpx.HTTPError as e:
+                return FetchResult(url, error=f"Request failed - {type(e).__name__}: {e}")
+        key = await asyncio.to_thread(
+            self.cache.store, url, headers, response.headers, response.text
+        )
+        return FetchResult(
+            url, text=response.text, status_code=response.status_code, cache_key=key
+        )
+
+    async def run_blocking(self, url: str, fn, *args):
+        """Run a blocking SDK call for `url` in a thread under the per-host limit.
+
+        The SDK calls take their own rate-limit tokens, for the API hosts
+        they actually reach, and may sleep in the thread until the host
+        allows them. They don't use the shared client, so no global slot is
+        held, and a throttled API can't stall fetches to other hosts.
+        """
+        async with self._hosts[self._host(url)]:
+            return await asyncio.to_thread(fn, *args)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+_fetcher: Optional[UrlFetcher] = None
+
+
+def get_url_fetcher() -> UrlFetcher:
+    """Return the process-wide fetcher, creating it on first use.
+
+    Must be called from the event loop that will use it.
+    """
+    global _fetcher
+    if _fetcher is None:
+        _fetcher = UrlFetcher()
+    return _fetcher
+
+
+async def close_url_fetcher() -> None:
+    global _fetcher
+    if _fetcher is not None:
+        fetcher, _fetcher = _fetcher, None
+        await fetcher.close()
@@ -1,18 +1,79 @@
 import re
 import os
-from urllib.parse import urlparse, urljoin
+import json
+import hashlib
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlparse, urljoin
 import requests
 from bs4 import BeautifulSoup
-from github import Github
 from youtube_transcript_api import YouTubeTranscriptApi
 from markdownify import markdownify as md
 import wikipedia
 import tweepy
 from dotenv import load_dotenv
 
+from .http_cache import get_http_cache
+from .rate_limiter import (
+    RATE_LIMIT_MAX_RETRIES,
+    RateLimited,
+    get_host_scheduler,
+    is_throttled,
+    retry_after_seconds,
+)
+from .url_fetcher import BROWSER_HEADERS, get_url_fetcher
+
 load_dotenv()
 BEARER_TOKEN = os.getenv("X_BEARER_TOKEN")
 
+# Optional; raises the GitHub API limit from 60 to 5,000 requests per hour
+GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
+# Levels of the repository tree rendered, and entries rendered at most
+GITHUB_TREE_MAX_DEPTH = int(os.getenv("GITHUB_TREE_MAX_DEPTH", "2"))
+GITHUB_TREE_MAX_ENTRIES = int(os.getenv("GITHUB_TREE_MAX_ENTRIES", "2000"))
+# Source/doc files included besides the README (0 includes none)
+GITHUB_MAX_FILES = int(os.getenv("GITHUB_MAX_FILES", "0"))
+GITHUB_MAX_FILE_KB = int(os.getenv("GITHUB_MAX_FILE_KB", "64"))
+GITHUB_FILE_EXTENSIONS = {
+    ext.strip().lower().lstrip(".")
+    for ext in os.getenv(
+        "GITHUB_FILE_EXTENSIONS", "md,rst,txt,py,js,ts,go,rs,java,toml,yaml,yml"
+    ).split(",")
+    if ext.strip()
+}
+
+GITHUB_API_URL = "https://api.github.com"
+GITHUB_RAW_URL = "https://raw.githubusercontent.com"
+
+REDDIT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+}
+
+_local = threading.local()
+
+
+def _session() -> requests.Session:
+    """Per-thread keep-alive session for the synchronous fetch paths."""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session()
+        session.headers.update(BROWSER_HEADERS)
+    return session
+
+
+def _get(url: str, **kwargs) -> requests.Response:
+    """GET on the thread's session under the host's rate limit, retrying 429s."""
+    scheduler = get_host_scheduler()
+    for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+        scheduler.acquire(url)
+        response = _session().get(url, **kwargs)
+        if attempt == RATE_LIMIT_MAX_RETRIES or not is_throttled(
+            response.status_code, response.headers
+        ):
+            return response
+        scheduler.penalize(url, retry_after_seconds(response.headers), attempt)
+
 
 def detect_url_type(url):
     if "github.com" in url:
@@ -31,15 +92,16 @@ def detect_url_type(url):
         return "web"
 
 
-def process_linkedin_url(url):
+def process_linkedin_url(url, html=None):
     is_post = any(path in url for path in ["/posts/", "/feed/update/"])
     is_doc = any(path in url for path in ["/help/", "/business/"])
 
     if not is_post and is_doc:
         print(f"INFO: LinkedIn URL looks like documentation. Treating as web content.")
-        return process_web_url(url)
+        return process_web_url(url, html=html)
     try:
-        html = fetch_with_requests(url)
+        if html is None:
+            html = fetch_with_requests(url)
         if html.startswith("Error:"):
             return html
 
@@ -59,111 +121,123 @@ def process_linkedin_url(url):
         return f"Error processing LinkedIn URL: {e}"
 
 
-def process_reddit_url(url: str) -> str:
+def _reddit_post_from_json(data) -> str:
+    """Format a post from Reddit's `.json` API response."""
+    post_data = data[0]["data"]["children"][0]["data"]
+    title = post_data.get("title", "No title found")
+    body = post_data.get("selftext", "")
+    author = post_data.get("author", "")
+    subreddit = post_data.get("subreddit", "")
+    score = post_data.get("score", 0)
+
+    # Format output
+    result = [f"# {title}"]
+    meta = []
+    if author:
+        meta.append(f"Posted by u/{author}")
+    if subreddit:
+        meta.append(f"in r/{subreddit}")
+    if score:
+        meta.append(f"({score} points)")
+    if meta:
+        result.append(" ".join(meta))
+
+    result.append("")  # blank line
+    result.append(body if body else "(No body text found)")
+
+    return "\n".join(result)
+
+
+def _reddit_post_from_html(html: str) -> str:
+    """Format a post scraped from a Reddit page."""
+    soup = BeautifulSoup(html, "lxml")
+
+    # Extract title
+    title_tag = soup.find("h1")
+    title = title_tag.get_text(strip=True) if title_tag else "No title found"
+
+    # Extract body - try multiple selectors
+    body = ""
+
+    # New Reddit layout
+    body_tag = soup.find("div", {"data-test-id": "post-content"})
+    if body_tag:
+        body = body_tag.get_text(separator="\n", strip=True)
+    else:
+        # Try shreddit-post element
+        body_tag = soup.find("div", {"slot": "text-body"})
+        if body_tag:
+            body = body_tag.get_text(separator="\n", strip=True)
+        else:
+            # Old Reddit layout
+            body_tag = soup.find("div", class_="expando")
+            if body_tag:
+                body = body_tag.get_text(separator="\n", strip=True)
+            else:
+                # Try usertext-body
+                body_tag = soup.find("div", class_="usertext-body")
+                if body_tag:
+                    body = body_tag.get_text(separator="\n", strip=True)
+
+    # Extract metadata
+    author = ""
+    author_tag = soup.find("a", href=lambda x: x and "/user/" in x)
+    if author_tag:
+        author = author_tag.get_text(strip=True)
+
+    subreddit = ""
+    sub_tag = soup.find("a", href=lambda x: x and x.startswith("/r/"))
+    if sub_tag:
+        subreddit = sub_tag.get_text(strip=True)
+
+    # Format output
+    result = [f"# {title}"]
+    meta = []
+    if author:
+        meta.append(f"Posted by {author}")
+    if subreddit:
+        meta.append(f"in {subreddit}")
+    if meta:
+        result.append(" ".join(meta))
+
+    result.append("")  # blank line
+    result.append(body if body else "(No body text found)")
+
+    return "\n".join(result)
+
+
+def process_reddit_url(url: str, post_json=None, html=None) -> str:
     if "/comments/" not in url:
         print(
             f"INFO: Reddit URL is not a post (missing '/comments/'). Treating as web content."
         )
-        return process_web_url(url)
+        return process_web_url(url, html=html)
 
     try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-        }
-
         # Try JSON API first (most reliable)
-        json_url = url.rstrip("/") + ".json"
-        try:
-            resp = requests.get(json_url, headers=headers, timeout=10)
-            resp.raise_for_status()
-            data = resp.json()
-
-            # Extract from JSON structure
-            post_data = data[0]["data"]["children"][0]["data"]
-            title = post_data.get("title", "No title found")
-            body = post_data.get("selftext", "")
-            author = post_data.get("author", "")
-            subreddit = post_data.get("subreddit", "")
-            score = post_data.get("score", 0)
-
-            # Format output
-            result = [f"# {title}"]
-            meta = []
-            if author:
-                meta.append(f"Posted by u/{author}")
-            if subreddit:
-                meta.append(f"in r/{subreddit}")
-            if score:
-                meta.append(f"({score} points)")
-            if meta:
-                result.append(" ".join(meta))
-
-            result.append("")  # blank line
-            result.append(body if body else "(No body text found)")
-
-            return "\n".join(result)
-
-        except (requests.RequestException, KeyError, IndexError, ValueError):
-            # JSON fetch failed, try HTML scraping
-            pass
+        if post_json is None and html is None:
+            json_url = url.rstrip("/") + ".json"
+            try:
+                resp = _get(json_url, headers=REDDIT_HEADERS, timeout=10)
+                resp.raise_for_status()
+                post_json = resp.json()
+            except (requests.RequestException, ValueError):
+                # JSON fetch failed, try HTML scraping
+                pass
+        if post_json is not None:
+            try:
+                return _reddit_post_from_json(post_json)
+            except (KeyError, IndexError, TypeError):
+                pass
 
         # Fallback to HTML scraping
-        resp = requests.get(url, headers=headers, timeout=10)
-        resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, "lxml")
-
-        # Extract title
-        title_tag = soup.find("h1")
-        title = title_tag.get_text(strip=True) if title_tag else "No title found"
-
-        # Extract body - try multiple selectors
-        body = ""
-
-        # New Reddit layout
-        body_tag = soup.find("div", {"data-test-id": "post-content"})
-        if body_tag:
-            body = body_tag.get_text(separator="\n", strip=True)
-        else:
-            # Try shreddit-post element
-            body_tag = soup.find("div", {"slot": "text-body"})
-            if body_tag:
-                body = body_tag.get_text(separator="\n", strip=True)
-            else:
-                # Old Reddit layout
-                body_tag = soup.find("div", class_="expando")
-                if body_tag:
-                    body = body_tag.get_text(separator="\n", strip=True)
-                else:
-                    # Try usertext-body
-                    body_tag = soup.find("div", class_="usertext-body")
-                    if body_tag:
-                        body = body_tag.get_text(separator="\n", strip=True)
-
-        # Extract metadata
-        author = ""
-        author_tag = soup.find("a", href=lambda x: x and "/user/" in x)
-        if author_tag:
-            author = author_tag.get_text(strip=True)
-
-        subreddit = ""
-        sub_tag = soup.find("a", href=lambda x: x and x.startswith("/r/"))
-        if sub_tag:
-            subreddit = sub_tag.get_text(strip=True)
-
-        # Format output
-        result = [f"# {title}"]
-        meta = []
-        if author:
-            meta.append(f"Posted by {author}")
-        if subreddit:
-            meta.append(f"in {subreddit}")
-        if meta:
-            result.append(" ".join(meta))
-
-        result.append("")  # blank line
-        result.append(body if body else "(No body text found)")
-
-        return "\n".join(result)
+        if html is None:
+            resp = _get(url, headers=REDDIT_HEADERS, timeout=10)
+            resp.raise_for_status()
+            html = resp.text
+        elif html.startswith("Error:"):
+            return html
+        return _reddit_post_from_html(html)
 
     except requests.RequestException as e:
         return f"Error: Network request failed - {e}"
@@ -185,6 +259,8 @@ def process_wikipedia_url(url):
         # Retrieve the page content using the wikipedia library
         # auto_suggest=False prevents correcting the title if it's slightly wrong,
         # which is usually what we want when the URL is given directly.
+        # Loading the page, its summary and its content are three requests
+        get_host_scheduler().acquire("wikipedia.org", tokens=3)
         page = wikipedia.page(title, auto_suggest=False, redirect=True)
 
         markdown = f"# Wikipedia: {page.title}\n\n"
@@ -226,7 +302,10 @@ def process_x_url(url):
         client = tweepy.Client(BEARER_TOKEN)
 
         # 3. Fetch Tweet Data (V2 API)
-        response = client.get_tweet(
+        response = get_host_scheduler().call(
+            "api.twitter.com",
+            client.get_tweet,
+            retry_on=(tweepy.errors.TooManyRequests,),
             id=tweet_id,
             # Request necessary fields
             tweet_fields=["created_at", "public_metrics"],
@@ -278,13 +357,14 @@ def process_x_url(url):
         )
 
 
-def process_web_url(url, timeout=30):
+def process_web_url(url, timeout=30, html=None):
     """
     Extract webpage HTML and convert to markdown.
 
     Args:
         url (str): The URL to process
         timeout (int): Request timeout in seconds
+        html (str): Already fetched HTML (or an "Error:" string); fetched when None
 
     Returns:
         str: Markdown content or error message
@@ -296,7 +376,7 @@ def process_web_url(url, timeout=30):
             return "Error: Invalid URL format"
 
         # Get HTML content
-        html_content = fetch_with_requests(url, timeout)
+        html_content = html if html is not None else fetch_with_requests(url, timeout)
 
         if html_content.startswith("Error:"):
             return html_content
@@ -314,29 +394,32 @@ def process_web_url(url, timeout=30):
 
 
 def fetch_with_requests(url, timeout=30):
-    """Fetch HTML using requests with enhanced headers."""
+    """Fetch HTML using requests with enhanced headers, through the HTTP cache."""
     try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/120.0.0.0 Safari/537.36",
-            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-            "Accept-Language": "en-US,en;q=0.9",
-            "Connection": "keep-alive",
-        }
-
-        session = requests.Session()
-        response = session.get(
-            url, headers=headers, timeout=timeout, allow_redirects=True
+        cache = get_http_cache()
+        entry = cache.lookup(url)
+        cached = cache.read(entry) if entry is not None else None
+        if cached is not None and entry.fresh:
+            return cached
+
+        response = _get(
+            url,
+            headers=entry.validators() if cached is not None else None,
+            timeout=timeout,
+            allow_redirects=True,
         )
+        if response.status_code == 304 and cached is not None:
+            cache.refresh(entry, response.headers)
+            return cached
         response.raise_for_status()
 
         # Ensure proper encoding
         response.encoding = response.apparent_encoding or "utf-8"
 
+        cache.store(url, None, response.headers, response.text)
         return response.text
 
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, RateLimited) as e:
         return f"Error: Request failed - {str(e)}"
 
 
@@ -362,51 +445,201 @@ def html_to_markdown(html, base_url=None):
         return f"Error: Markdown conversion failed - {str(e)}"
 
 
-def get_repo_tree(repo, path="", depth=0, max_depth=2):
-    """Recursively fetch repo contents up to max_depth and return as Markdown."""
-    try:
-        contents = repo.get_contents(path)
-    except Exception:
-        return ""
+def _github_headers(accept: str = "application/vnd.github+json") -> dict:
+    headers = {"Accept": accept}
+    if GITHUB_TOKEN:
+        headers["Authorization"] = f"Bearer {GITHUB_TOKEN}"
+    return headers
+
+
+def _github_get(url: str, accept: str = "application/vnd.github+json"):
+    """GET a GitHub API URL through the HTTP cache.
+
+    Unchanged resources are answered from disk while fresh, or revalidated
+    with a conditional request; GitHub does not count 304s against the
+    rate limit.
 
+    Returns:
+        The response body and its HTTP cache key (None if not cached)
+    """
+    headers = _github_headers(accept)
+    cache = get_http_cache()
+    entry = cache.lookup(url, headers)
+    cached = cache.read(entry) if entry is not None else None
+    if cached is not None and entry.fresh:
+        return cached, entry.key
+
+    response = _get(
+        url,
+        headers={**headers, **(entry.validators() if cached is not None else {})},
+        timeout=30,
+    )
+    if response.status_code == 304 and cached is not None:
+        cache.refresh(entry, response.headers)
+        return cached, entry.key
+    response.raise_for_status()
+    return response.text, cache.store(url, headers, response.headers, response.text)
+
+
+def _github_raw(owner: str, repo: str, sha: str, path: str) -> str:
+    """A file of the repository at commit `sha`, or "" if it is binary.
+
+    Raw file downloads are not served by the API and don't use its quota.
+    """
+    response = _get(
+        f"{GITHUB_RAW_URL}/{owner}/{repo}/{sha}/{quote(path)}",
+        headers=_github_headers("*/*"),
+        timeout=30,
+    )
+    response.raise_for_status()
+    if b"\0" in response.content[:8192]:
+        return ""
+    return response.content.decode("utf-8", errors="replace")
+
+
+def render_repo_tree(
+    entries, max_depth=GITHUB_TREE_MAX_DEPTH, max_entries=GITHUB_TREE_MAX_ENTRIES
+):
+    """Render the entries of a recursive git tree as a nested Markdown list."""
+    paths = sorted(
+        (entry["path"].split("/") for entry in entries),
+        key=lambda parts: [part.lower() for part in parts],
+    )
+    paths = [parts for parts in paths if len(parts) <= max_depth + 1]
     tree_md = ""
-    for content in contents:
-        indent = "  " * depth
-        tree_md += f"{indent}- {content.name}\n"
-        if content.type == "dir" and depth < max_depth:
-            tree_md += get_repo_tree(repo, content.path, depth + 1, max_depth)
+    for parts in paths[:max_entries]:
+        tree_md += f"{'  ' * (len(parts) - 1)}- {parts[-1]}\n"
+    if len(paths) > max_entries:
+        tree_md += f"- *... {len(paths) - max_entries} more entries*\n"
     return tree_md
 
 
+def _github_render_settings() -> str:
+    settings = (
+        GITHUB_TREE_MAX_DEPTH,
+        GITHUB_TREE_MAX_ENTRIES,
+        GITHUB_MAX_FILES,
+        GITHUB_MAX_FILE_KB,
+        sorted(GITHUB_FILE_EXTENSIONS),
+    )
+    return hashlib.sha256(json.dumps(settings).encode("utf-8")).hexdigest()[:16]
+
+
+def _find_readme(entries):
+    readmes = [
+        entry["path"]
+        for entry in entries
+        if entry["type"] == "blob"
+        and "/" not in entry["path"]
+        and entry["path"].lower().startswith("readme")
+    ]
+    # Prefer README.md over README.rst, README.txt, ...
+    readmes.sort(key=lambda path: (path.lower() != "readme.md", path.lower()))
+    return readmes[0] if readmes else None
+
+
+def _select_repo_files(entries, skip=None):
+    """Pick up to `GITHUB_MAX_FILES` source/doc files, shallowest first."""
+    if GITHUB_MAX_FILES <= 0:
+        return []
+    candidates = [
+        entry["path"]
+        for entry in entries
+        if entry["type"] == "blob"
+        and entry["path"] != skip
+        and entry.get("size", 0) <= GITHUB_MAX_FILE_KB * 1024
+        and entry["path"].rsplit(".", 1)[-1].lower() in GITHUB_FILE_EXTENSIONS
+    ]
+    candidates.sort(key=lambda path: (path.count("/"), path.lower()))
+    return candidates[:GITHUB_MAX_FILES]
+
+
 def process_github_url(url):
+    """Convert a GitHub repository to Markdown (README, structure, selected files).
+
+    The repository is read at the head commit of its default branch, with at
+    most three API requests:
+
+    - the head commit SHA
+    - the repository metadata
+    - the whole file tree, in one recursive trees call
+
+    README and any selected files are then downloaded from
+    raw.githubusercontent.com. The Markdown is cached against the tree of
+    that commit. As long as the default branch hasn't moved, a repeated
+    ingestion costs one conditional request (a free 304) and returns the same
+    Markdown, so the stored analysis is reused.
+    """
     try:
         # Extract user/repo
         parts = url.split("github.com/")[1].split("/")
         user, repo_name = parts[0], parts[1].replace(".git", "")
-
-        g = Github()  # unauthenticated (60 req/hr)
-        repo = g.get_repo(f"{user}/{repo_name}")
+        if not user or not repo_name:
+            raise IndexError
+        api = f"{GITHUB_API_URL}/repos/{user}/{repo_name}"
+
+        sha, _ = _github_get(f"{api}/commits/HEAD", accept="application/vnd.github.sha")
+        sha = sha.strip()
+        # The fragment is not sent; it keys the cached tree, and the Markdown
+        # stored with it, by the settings the Markdown is rendered with
+        tree_url = f"{api}/git/trees/{sha}?recursive=1#{_github_render_settings()}"
+        cache = get_http_cache()
+        tree_entry = cache.lookup(tree_url, _github_headers())
+        if tree_entry is not None:
+            markdown = cache.get_markdown(tree_entry.key)
+            if markdown is not None:
+                return markdown
+
+        repo = json.loads(_github_get(api)[0])
+        tree_text, tree_key = _github_get(tree_url)
+        tree = json.loads(tree_text)
+        entries = tree.get("tree", [])
 
         markdown_output = f"# Repository: {user}/{repo_name}\n\n"
         markdown_output += f"**URL:** https://github.com/{user}/{repo_name}\n\n"
         markdown_output += (
-            f"**Description:** {repo.description or '*No description*'}\n\n"
+            f"**Description:** {repo.get('description') or '*No description*'}\n\n"
+        )
+        markdown_output += (
+            f"**Commit:** `{sha[:12]}` ({repo.get('default_branch') or 'HEAD'})\n\n"
         )
         markdown_output += "---\n\n"
 
         # Add README
-        try:
-            readme = repo.get_readme()
-            readme_content = readme.decoded_content.decode("utf-8")
+        readme_path = _find_readme(entries)
+        selected = _select_repo_files(entries, skip=readme_path)
+        paths = ([readme_path] if readme_path else []) + selected
+        files = {}
+        if paths:
+            with ThreadPoolExecutor(max_workers=min(8, len(paths))) as executor:
+                contents = executor.map(
+                    lambda path: _github_raw(user, repo_name, sha, path), paths
+                )
+                files = dict(zip(paths, contents))
+
+        if readme_path and files.get(readme_path):
             markdown_output += "## README\n\n"
-            markdown_output += readme_content + "\n\n"
-        except Exception:
+            markdown_output += files[readme_path] + "\n\n"
+        else:
             markdown_output += "## README\n\n*No README found*\n\n"
 
         # Add repo structure
         markdown_output += "## Repository Structure\n\n"
-        markdown_output += get_repo_tree(repo)
-
+        markdown_output += render_repo_tree(entries)
+        if tree.get("truncated"):
+            markdown_output += "\n*The tree is too large and was truncated by GitHub.*\n"
+
+        selected = [path for path in selected if files.get(path)]
+        if selected:
+            markdown_output += "\n## Files\n\n"
+            for path in selected:
+                ext = path.rsplit(".", 1)[-1].lower() if "." in path else ""
+                fence = "````" if "```" in files[path] else "```"
+                markdown_output += (
+                    f"### {path}\n\n{fence}{ext}\n{files[path].rstrip()}\n{fence}\n\n"
+                )
+
+        cache.put_markdown(tree_key, markdown_output)
         return markdown_output
 
     except IndexError:
@@ -429,6 +662,8 @@ def process_youtube_url(url):
         if not video_id:
             return "Error: Could not extract video ID from URL"
 
+        # The watch page, then the captions
+        get_host_scheduler().acquire("youtube.com", tokens=2)
         transcript = YouTubeTranscriptApi.get_transcript(video_id)
 
         markdown = f"# YouTube Transcript: {video_id}\n\n"
@@ -476,3 +711,56 @@ def url_to_markdown(url):
         return process_wikipedia_url(url)
     else:
         raise ValueError("Unknown URL type")
+
+
+async def _fetch_html(url: str, headers=None) -> str:
+    """Fetch a page on the shared async client; errors come back as "Error:" strings."""
+    result = await get_url_fetcher().fetch(url, headers=headers)
+    return result.text if result.ok else f"Error: {result.error}"
+
+
+async def _reddit_to_markdown_async(url: str) -> str:
+    fetcher = get_url_fetcher()
+    result = await fetcher.fetch(url.rstrip("/") + ".json", headers=REDDIT_HEADERS)
+    if result.ok:
+        try:
+            post_json = json.loads(result.text)
+            return await asyncio.to_thread(process_reddit_url, url, post_json)
+        except (ValueError, KeyError, IndexError, TypeError):
+            pass
+    html = await _fetch_html(url, headers=REDDIT_HEADERS)
+    return await asyncio.to_thread(process_reddit_url, url, None, html)
+
+
+async def url_to_markdown_async(url):
+    """Async variant of `url_to_markdown` for batch ingestion.
+
+    Pages are fetched on the shared pooled client and parsed in a worker
+    thread by the same per-site processors; SDK-backed sources run their
+    blocking calls in a thread under the fetcher's concurrency limits.
+    """
+    url_type = detect_url_type(url)
+    is_reddit_post = url_type == "reddit" and "/comments/" in url
+    if url_type in ("web", "linkedin") or (url_type == "reddit" and not is_reddit_post):
+        parsed = urlparse(url)
+        if not parsed.scheme or not parsed.netloc:
+            return "Error: Invalid URL format"
+        result = await get_url_fetcher().fetch(url)
+        if not result.ok:
+            return f"Error: {result.error}"
+        # An unchanged page keeps the markdown converted from it last time
+        cache = get_http_cache()
+        if result.from_cache:
+            markdown = await asyncio.to_thread(cache.get_markdown, result.cache_key)
+            if markdown is not None:
+                return markdown
+        if url_type == "linkedin":
+            markdown = await asyncio.to_thread(process_linkedin_url, url, result.text)
+        else:
+            markdown = await asyncio.to_thread(process_web_url, url, 30, result.text)
+        if not markdown.startswith("Error"):
+            await asyncio.to_thread(cache.put_markdown, result.cache_key, markdown)
+        return markdown
+    if is_reddit_post:
+        return await _reddit_to_markdown_async(url)
+    return await get_url_fetcher().run_blocking(url, url_to_markdown, url)
@@ -0,0 +1,362 @@
+"""Local embedding index over the markdown chunks of a user's processed files.
+
+Each ``uploads/<user_id>/processed/<category>`` directory gets a vector store
+under ``uploads/<user_id>/vectors/<category>/``:
+
+- ``vectors-<generation>.f32``: row-major float32 matrix, memory-mapped on read
+- ``chunks-<generation>.json``: id map from matrix row to file, lines and offsets
+- ``manifest.json``: current generation, dimension and per-file size/mtime
+
+Writers build a new generation and then atomically replace the manifest, so
+readers in other processes (the MCP tool servers) always see a matching
+matrix and id map. Files are chunked as they are read and a new generation is
+written one batch of embeddings at a time, so syncing a very large file does
+not hold its text, chunks or vectors in memory.
+
+Embeddings come from a pluggable function mapping a list of texts to an
+``(n, dim)`` array. The default is a deterministic feature-hashing embedding
+that needs no network or model download; set ``EMBEDDING_FUNCTION`` to
+``module:callable`` to use a real local model instead.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import importlib
+import json
+import logging
+import os
+import re
+import uuid
+from pathlib import Path
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    from .chunker import iter_chunks
+except ImportError:  # Launched as a standalone script by the agent
+    from chunker import iter_chunks
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+EmbeddingFunction = Callable[[Sequence[str]], np.ndarray]
+
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "512"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+# Rows of unchanged files copied into a new generation at a time
+_COPY_ROWS = 4096
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def hashing_embedding(texts: Sequence[str], dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """Embed texts by signed feature hashing of word unigrams and bigrams.
+
+    Deterministic across processes and fully offline, which makes it a sane
+    default and a stand-in for tests; it captures lexical rather than deep
+    semantic similarity.
+    """
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        words = [w.lower() for w in _WORD_RE.findall(text)]
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            sign = 1.0 if value & 1 else -1.0
+            matrix[row, (value >> 1) % dim] += sign
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+_embedding_function: Optional[EmbeddingFunction] = None
+
+
+def get_embedding_function() -> EmbeddingFunction:
+    """Return the configured embedding function (``EMBEDDING_FUNCTION`` or hashing)."""
+    global _embedding_function
+    if _embedding_function is None:
+        target = os.getenv("EMBEDDING_FUNCTION")
+        if target:
+            module_name, _, attr = target.partition(":")
+            _embedding_function = getattr(importlib.import_module(module_name), attr)
+        else:
+            _embedding_function = hashing_embedding
+    return _embedding_function
+
+
+def set_embedding_function(fn: Optional[EmbeddingFunction]) -> None:
+    """Override the embedding function (None restores the configured default)."""
+    global _embedding_function
+    _embedding_function = fn
+
+
+def _batched(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _embedding_name(fn: EmbeddingFunction) -> str:
+    return f"{getattr(fn, '__module__', '')}.{getattr(fn, '__qualname__', repr(fn))}"
+
+
+class VectorIndex:
+    """Memory-mapped embedding matrix plus id map for one category of files."""
+
+    def __init__(
+        self,
+        root_dir: Path,
+        index_dir: Path,
+        embed: Optional[EmbeddingFunction] = None,
+    ):
+        self.root_dir = Path(root_dir)
+        self.index_dir = Path(index_dir)
+        self._embed = embed
+
+    @classmethod
+    def for_category(
+        cls, user_dir: Path, category: str, embed: Optional[EmbeddingFunction] = None
+    ) -> "VectorIndex":
+        """Build the index handle for ``uploads/<user_id>`` and a category."""
+        user_dir = Path(user_dir)
+        return cls(
+            user_dir / "processed" / category, user_dir / "vectors" / category, embed
+        )
+
+    @property
+    def embed(self) -> EmbeddingFunction:
+        return self._embed or get_embedding_function()
+
+    def _read_manifest(self) -> dict:
+        try:
+            with open(self.index_dir / "manifest.json", "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _load(self, manifest: dict):
+        """Return ``(matrix, chunks)`` for the manifest's generation."""
+        generation = manifest.get("generation")
+        count = manifest.get("count", 0)
+        if not generation or not count:
+            return np.zeros((0, manifest.get("dim", 0)), dtype=np.float32), []
+        matrix = np.memmap(
+            self.index_dir / f"vectors-{generation}.f32",
+            dtype=np.float32,
+            mode="r",
+            shape=(count, manifest["dim"]),
+        )
+        with open(
+            self.index_dir / f"chunks-{generation}.json", "r", encoding="utf-8"
+        ) as f:
+            chunks = json.load(f)
+        return matrix, chunks
+
+    def _lock(self):
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        handle = open(self.index_dir / ".lock", "w")
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        return handle
+
+    def _embed_texts(self, texts: List[str]) -> np.ndarray:
+        parts = [
+            np.asarray(
+                self.embed(texts[i : i + EMBEDDING_BATCH_SIZE]), dtype=np.float32
+            )
+            for i in range(0, len(texts), EMBEDDING_BATCH_SIZE)
+        ]
+        return np.vstack(parts) if parts else np.zeros((0, 0), dtype=np.float32)
+
+    def _chunk_file(self, rel_path: str, full_path: Path) -> Iterator[tuple]:
+        """Yield ``(id_map_entry, text_to_embed)`` pairs for one file as it is read."""
+        with open(full_path, "r", encoding="utf-8") as f:
+            for chunk in iter_chunks(f):
+                yield (
+                    {
+                        "path": rel_path,
+                        "heading": chunk.heading,
+                        "start_line": chunk.start_line,
+                        "end_line": chunk.end_line,
+                        "start_offset": chunk.start_offset,
+                        "end_offset": chunk.end_offset,
+                    },
+                    f"{chunk.heading}\n{chunk.text}",
+                )
+
+    def _files_on_disk(self) -> dict:
+        if not self.root_dir.is_dir():
+            return {}
+        root = self.root_dir.resolve()
+        return {
+            file.relative_to(root).as_posix(): file
+            for file in root.rglob("*.md")
+            if file.is_file()
+        }
+
+    def sync(self, remove: Iterable[str] = ()) -> None:
+        """Re-embed new or changed `.md` files and drop deleted ones.
+
+        Only files whose size or mtime changed are re-chunked and re-embedded;
+        rows for unchanged files are copied over from the previous generation.
+        """
+        removed = {Path(p).as_posix() for p in remove}
+        with self._lock():
+            manifest = self._read_manifest()
+            embed_name = _embedding_name(self.embed)
+            if manifest.get("embedding") != embed_name:
+                # A different embedding function invalidates every stored vector
+                manifest = {}
+
+            on_disk = {
+                path: file
+                for path, file in self._files_on_disk().items()
+                if path not in removed
+            }
+            known = manifest.get("files", {})
+            stats = {path: file.stat() for path, file in on_disk.items()}
+            changed = {
+                path
+                for path in on_disk
+                if known.get(path) != [stats[path].st_size, stats[path].st_mtime_ns]
+            }
+            if not changed and known.keys() == on_disk.keys():
+                return
+
+            old_matrix, old_chunks = self._load(manifest)
+            keep_rows = [
+                row
+                for row, chunk in enumerate(old_chunks)
+                if chunk["path"] in on_disk and chunk["path"] not in changed
+            ]
+            dim = old_matrix.shape[1] if keep_rows else None
+            generation = uuid.uuid4().hex
+            vectors_path = self.index_dir / f"vectors-{generation}.f32"
+            chunks_path = self.index_dir / f"chunks-{generation}.json"
+            count = 0
+
+            # The matrix and id map are written as they are produced, so only
+            # one batch of chunks and vectors is in memory at a time
+            vectors_file = open(vectors_path, "wb")
+            chunks_file = open(chunks_path, "wb")
+
+            def write(entries: List[dict], vectors: np.ndarray) -> None:
+                nonlocal count
+                for entry in entries:
+                    chunks_file.write(b"," if count else b"[")
+                    entry_json = json.dumps(entry, ensure_ascii=False)
+                    chunks_file.write(entry_json.encode("utf-8"))
+                    count += 1
+                vectors_file.write(
+                    np.ascontiguousarray(vectors, dtype=np.float32).tobytes()
+                )
+
+            try:
+                with vectors_file, chunks_file:
+                    for rows in _batched(keep_rows, _COPY_ROWS):
+                        write([old_chunks[row] for row in rows], old_matrix[rows])
+                    for path in sorted(changed):
+                        start = (count, vectors_file.tell(), chunks_file.tell())
+                        chunks = self._chunk_file(path, on_disk[path])
+                        try:
+                            for batch in _batched(chunks, EMBEDDING_BATCH_SIZE):
+                                vectors = np.asarray(
+                                    self.embed([text for _, text in batch]),
+                                    dtype=np.float32,
+                                )
+                                if dim is None:
+                                    dim = vectors.shape[1]
+                                elif vectors.shape[1] != dim:
+                                    raise ValueError(
+                                        f"Embedding dimension {vectors.shape[1]} "
+                                        f"does not match the index's {dim}"
+                                    )
+                                write([entry for entry, _ in batch], vectors)
+                        except (UnicodeDecodeError, OSError):
+                            # Not text (or gone): recorded without chunks, and
+                            # whatever was written for it is dropped again
+                            count, vectors_end, chunks_end = start
+                            vectors_file.seek(vectors_end)
+                            vectors_file.truncate()
+                            chunks_file.seek(chunks_end)
+                            chunks_file.truncate()
+                    chunks_file.write(b"]" if count else b"[]")
+            except BaseException:
+                vectors_path.unlink(missing_ok=True)
+                chunks_path.unlink(missing_ok=True)
+                raise
+            del old_matrix
+
+            if dim is None:
+                dim = manifest.get("dim", EMBEDDING_DIM)
+            if not count:
+                vectors_path.unlink(missing_ok=True)
+                chunks_path.unlink(missing_ok=True)
+
+            new_manifest = {
+                "generation": generation if count else None,
+                "count": count,
+                "dim": dim,
+                "embedding": embed_name,
+                "files": {
+                    path: [stats[path].st_size, stats[path].st_mtime_ns]
+                    for path in on_disk
+                },
+            }
+            tmp_path = self.index_dir / f"manifest.{generation}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(new_manifest, f)
+            os.replace(tmp_path, self.index_dir / "manifest.json")
+
+            # Old generations are unlinked; open memory maps stay valid on POSIX
+            for stale in self.index_dir.glob("*-*.*"):
+                if generation not in stale.name and stale.suffix in (".f32", ".json"):
+                    stale.unlink(missing_ok=True)
+
+    def remove_files(self, paths: Iterable[str]) -> None:
+        """Drop files (category-relative paths) from the index."""
+        self.sync(remove=paths)
+
+    def search(self, query: str, limit: int = 5) -> List[dict]:
+        """Return the top ``limit`` chunks by cosine similarity, best first."""
+        for attempt in range(2):
+            manifest = self._read_manifest()
+            try:
+                matrix, chunks = self._load(manifest)
+                break
+            except FileNotFoundError:
+                # A writer swapped generations between reading the manifest
+                # and opening its files; the new manifest is already in place.
+                if attempt:
+                    raise
+        if not chunks:
+            return []
+
+        query_vector = self._embed_texts([query])[0]
+        scores = np.asarray(matrix @ query_vector)
+        limit = min(limit, len(chunks))
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        results = []
+        for row in top:
+            chunk = chunks[row]
+            try:
+                with open(self.root_dir / chunk["path"], "r", encoding="utf-8") as f:
+                    text = f.read(chunk["end_offset"])[chunk["start_offset"] :]
+            except (OSError, UnicodeDecodeError):
+                text = ""
+            results.append({**chunk, "text": text.strip(), "score": float(scores[row])})
+        return results
@@ -0,0 +1,53 @@
+"""Standalone ingestion worker.
+
+Runs queued upload and URL jobs outside the API process::
+
+    python -m src.worker [--concurrency N]
+
+Set ``JOB_EMBEDDED_WORKERS=false`` on the API when running these.
+"""
+
+import argparse
+import asyncio
+import logging
+import signal
+
+from .utils.conversion_pool import close_conversion_pool
+from .utils.db import FirestoreHelper
+from .utils.job_worker import JOB_WORKERS, JobWorker
+from .utils.llm import close_llm_clients, start_llm_clients
+from .utils.status_buffer import StatusBuffer
+from .utils.url_fetcher import close_url_fetcher
+
+logger = logging.getLogger(__name__)
+
+
+async def main(concurrency: int) -> None:
+    start_llm_clients()
+    db = StatusBuffer(FirestoreHelper())
+    worker = JobWorker(db, concurrency=concurrency)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, lambda: asyncio.create_task(worker.stop()))
+    try:
+        await worker.run()
+    finally:
+        db.close()
+        await close_llm_clients()
+        await close_url_fetcher()
+        close_conversion_pool()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s - %(message)s"
+    )
+    parser = argparse.ArgumentParser(description="Run queued ingestion jobs.")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=JOB_WORKERS,
+        help="Jobs to run at a time (default: JOB_WORKERS)",
+    )
+    cli_args = parser.parse_args()
+    asyncio.run(main(cli_args.concurrency))
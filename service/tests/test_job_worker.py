@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+import pytest
+
+from src.utils import job_worker
+from src.utils.job_queue import SqliteJobQueue
+
+
+class RecordingDb:
+    def __init__(self):
+        self.finished = []
+
+    def finish_process(self, process_id):
+        self.finished.append(process_id)
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    queue = SqliteJobQueue(tmp_path / "queue.sqlite3", lease_seconds=0.2)
+    monkeypatch.setattr(job_worker, "get_job_queue", lambda: queue)
+    monkeypatch.setenv("CEREBRAS_API_KEY", "test")
+    return queue
+
+
+def test_job_is_finished_when_worker_stops_after_last_item(queue, tmp_path):
+    queue.enqueue("p1", "files", "u1", [{"path": "a.pdf"}, {"path": "b.pdf"}])
+
+    # The first worker completes every item, then dies before releasing
+    job = queue.claim("dead-worker")
+    for item in job.items:
+        queue.complete_item(job.id, item.index)
+    assert queue.claim("other-worker") is None
+
+    time.sleep(0.3)
+
+    db = RecordingDb()
+    worker = job_worker.JobWorker(db)
+    worker.helper._uploads_dir = tmp_path / "uploads"
+    processing_dir = tmp_path / "uploads" / "u1" / "processing" / "p1"
+    processing_dir.mkdir(parents=True)
+
+    job = queue.claim(worker.owner)
+    assert job is not None
+    assert job.process_id == "p1"
+    assert job.items == []
+
+    asyncio.run(worker._process(job))
+
+    assert db.finished == ["p1"]
+    assert not processing_dir.exists()
+    assert queue.stats()["jobs"]["done"] == 1
+    assert queue.claim(worker.owner) is None